@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
+
+    def ready(self):
+        # Счётчики соединений должны видеть запросы с первого.
+        from foodgram import db_pool  # noqa: F401
@@ -0,0 +1,346 @@
+"""Асинхронные реализации самых нагруженных GET-эндпоинтов.
+
+Подключаются в api/urls.py при ASYNC_READ_PATH=true (профиль ASGI)
+и отдают тот же JSON, что и вьюсеты DRF, но читают базу через
+асинхронный ORM без переключения на поток на каждый запрос.
+"""
+import asyncio
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import AnonymousUser
+from django.core.files.storage import default_storage
+from django.db.models import Count, F, Window
+from django.db.models.functions import RowNumber
+from django.http import HttpResponse
+from django_filters.utils import translate_validation
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import (APIException, AuthenticationFailed,
+                                       NotAuthenticated, NotFound, Throttled)
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from foodgram.db_router import reading_replica
+from recipes.images import srcset
+from recipes.models import (Favorite, Ingredient, IngredientToRecipe, Recipe,
+                            ShopList, Tag)
+from users.models import Follow, User
+from users.serializers import recipes_limit
+
+from .fieldsets import FIELDS_PARAM, OMIT_PARAM
+from .filters import RecipeFilter
+from .mixins import IDS_PARAM
+from .pagination import CustomPagination, estimated_count
+from .renderers import ORJSONRenderer
+
+USER_FIELDS = ('username', 'email', 'id', 'first_name', 'last_name')
+TAG_FIELDS = ('id', 'name', 'color', 'slug')
+RECIPE_FIELDS = ('id', 'author_id', 'name', 'image', 'image_variants',
+                 'text', 'cooking_time')
+
+
+def read_path(async_view, sync_view):
+    """GET-запросы отдаёт асинхронной реализации, остальные методы,
+       браузерный API DRF, выборку полей и пакетное чтение по ids -
+       исходному вьюсету."""
+    async def view(request, *args, **kwargs):
+        if (request.method == 'GET'
+                and 'text/html' not in request.headers.get('Accept', '')
+                and FIELDS_PARAM not in request.GET
+                and OMIT_PARAM not in request.GET
+                and IDS_PARAM not in request.GET):
+            return await async_view(request, *args, **kwargs)
+        return await sync_to_async(sync_view)(request, *args, **kwargs)
+
+    view.csrf_exempt = True
+    return view
+
+
+def api_response(view):
+    """Аутентифицирует и ограничивает частоту запросов, а исключения DRF
+       переводит в JSON-ответ, как это делает вьюсет."""
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        try:
+            request.user = await get_user(request)
+            # Хранилище бакетов может быть внешним кешем: сетевой вызов
+            # не должен блокировать цикл событий.
+            await sync_to_async(check_throttles)(request)
+            with reading_replica(request):
+                data = await view(request, *args, **kwargs)
+        except APIException as error:
+            # Как exception_handler DRF: ошибки полей отдаются как есть.
+            response = json_response(
+                error.detail if isinstance(error.detail, (list, dict))
+                else {'detail': error.detail},
+                status=error.status_code
+            )
+            if isinstance(error, (NotAuthenticated, AuthenticationFailed)):
+                response['WWW-Authenticate'] = 'Token'
+            if isinstance(error, Throttled) and error.wait:
+                response['Retry-After'] = '%d' % error.wait
+            return response
+        return json_response(data)
+
+    return wrapper
+
+
+def check_throttles(request):
+    """Те же ограничения частоты, что и у вьюсетов DRF."""
+    durations = []
+    for throttle_class in api_settings.DEFAULT_THROTTLE_CLASSES:
+        throttle = throttle_class()
+        if not throttle.allow_request(request, None):
+            durations.append(throttle.wait())
+    if durations:
+        raise Throttled(max(
+            (duration for duration in durations if duration is not None),
+            default=None
+        ))
+
+
+def json_response(data, status=200):
+    return HttpResponse(
+        ORJSONRenderer().render(data), status=status,
+        content_type='application/json'
+    )
+
+
+async def get_user(request):
+    """Асинхронный аналог TokenAuthentication."""
+    auth = request.headers.get('Authorization', '').split()
+    if not auth or auth[0].lower() != 'token':
+        return AnonymousUser()
+    if len(auth) != 2:
+        raise AuthenticationFailed('Недопустимый заголовок токена.')
+    try:
+        token = await Token.objects.select_related('user').aget(key=auth[1])
+    except Token.DoesNotExist:
+        raise AuthenticationFailed('Недопустимый токен.')
+    if not token.user.is_active:
+        raise AuthenticationFailed('Пользователь неактивен или удален.')
+    return token.user
+
+
+async def values(queryset, *fields):
+    return [row async for row in queryset.values(*fields)]
+
+
+async def values_set(queryset, field):
+    return {
+        value async for value in queryset.values_list(field, flat=True)
+    }
+
+
+async def set_of():
+    return set()
+
+
+def paginate(request, queryset):
+    """Параметры страницы как у CustomPagination."""
+    paginator = CustomPagination()
+    try:
+        limit = int(request.GET.get(paginator.page_size_query_param))
+    except (TypeError, ValueError):
+        limit = paginator.page_size
+    try:
+        page = int(request.GET.get(paginator.page_query_param, 1))
+    except ValueError:
+        raise NotFound('Неправильная страница')
+    if page < 1 or limit < 1:
+        raise NotFound('Неправильная страница')
+    offset = (page - 1) * limit
+    return page, limit, queryset[offset:offset + limit]
+
+
+def page_response(request, page, limit, count, approximate, results):
+    """Тело страницы как у CustomPagination.get_paginated_response."""
+    url = request.build_absolute_uri()
+    next_url = previous_url = None
+    if page * limit < count:
+        next_url = replace_query_param(url, 'page', page + 1)
+    if page == 2:
+        previous_url = remove_query_param(url, 'page')
+    elif page > 2:
+        previous_url = replace_query_param(url, 'page', page - 1)
+    data = {'count': count}
+    if approximate:
+        data['count_approximate'] = True
+    return {
+        **data, 'next': next_url, 'previous': previous_url,
+        'results': results,
+    }
+
+
+async def serialize_recipes(request, user, recipes):
+    """Собирает представление RecipeReadSerializer для страницы рецептов:
+       связанные данные выбираются параллельными запросами по id."""
+    recipe_ids = [recipe['id'] for recipe in recipes]
+    author_ids = {recipe['author_id'] for recipe in recipes}
+    authenticated = user.is_authenticated
+    tags, ingredients, authors, favorites, cart, following = (
+        await asyncio.gather(
+            values(
+                Tag.objects.filter(recipes__id__in=recipe_ids),
+                *TAG_FIELDS, 'recipes__id'
+            ),
+            values(
+                IngredientToRecipe.objects.filter(
+                    recipe_id__in=recipe_ids
+                ).order_by('id'),
+                'recipe_id', 'ingredient_id', 'ingredient__name',
+                'ingredient__measurement_unit', 'amount'
+            ),
+            values(User.objects.filter(id__in=author_ids), *USER_FIELDS),
+            values_set(Favorite.objects.filter(
+                user_id=user.id, recipe_id__in=recipe_ids
+            ), 'recipe_id') if authenticated else set_of(),
+            values_set(ShopList.objects.filter(
+                user_id=user.id, recipe_id__in=recipe_ids
+            ), 'recipe_id') if authenticated else set_of(),
+            values_set(Follow.objects.filter(
+                username_id=user.id, author_id__in=author_ids
+            ), 'author_id') if authenticated else set_of(),
+        )
+    )
+    recipe_tags = {recipe_id: [] for recipe_id in recipe_ids}
+    for tag in tags:
+        recipe_tags[tag.pop('recipes__id')].append(tag)
+    recipe_ingredients = {recipe_id: [] for recipe_id in recipe_ids}
+    for item in ingredients:
+        recipe_ingredients[item['recipe_id']].append({
+            'id': item['ingredient_id'],
+            'name': item['ingredient__name'],
+            'measurement_unit': item['ingredient__measurement_unit'],
+            'amount': item['amount'],
+        })
+    authors = {
+        author['id']: {**author, 'is_subscribed': author['id'] in following}
+        for author in authors
+    }
+    return [
+        {
+            'id': recipe['id'],
+            'tags': recipe_tags[recipe['id']],
+            'author': authors[recipe['author_id']],
+            'ingredients': recipe_ingredients[recipe['id']],
+            'is_favorited': recipe['id'] in favorites,
+            'is_in_shopping_cart': recipe['id'] in cart,
+            'name': recipe['name'],
+            'image': image_url(recipe['image'], request),
+            'image_srcset': srcset(
+                recipe['image_variants'], request.build_absolute_uri
+            ),
+            'text': recipe['text'],
+            'cooking_time': recipe['cooking_time'],
+        }
+        for recipe in recipes
+    ]
+
+
+def image_url(name, request=None):
+    if not name:
+        return None
+    url = default_storage.url(name)
+    return request.build_absolute_uri(url) if request else url
+
+
+def filter_recipes(request):
+    """Неверные фильтры - 400, как у DjangoFilterBackend."""
+    filterset = RecipeFilter(
+        request.GET, Recipe.objects.all(), request=request
+    )
+    if not filterset.is_valid():
+        raise translate_validation(filterset.errors)
+    return filterset.qs
+
+
+@api_response
+async def recipe_list(request):
+    queryset = await sync_to_async(filter_recipes)(request)
+    page, limit, page_queryset = paginate(request, queryset)
+    (count, approximate), recipes = await asyncio.gather(
+        sync_to_async(estimated_count)(queryset),
+        values(page_queryset, *RECIPE_FIELDS)
+    )
+    if not recipes and page != 1:
+        raise NotFound('Неправильная страница')
+    return page_response(
+        request, page, limit, count, approximate,
+        await serialize_recipes(request, request.user, recipes)
+    )
+
+
+@api_response
+async def recipe_detail(request, pk):
+    user = request.user
+    try:
+        recipe = await Recipe.objects.values(*RECIPE_FIELDS).aget(pk=pk)
+    except Recipe.DoesNotExist:
+        raise NotFound()
+    return (await serialize_recipes(request, user, [recipe]))[0]
+
+
+@api_response
+async def tag_list(request):
+    return await values(Tag.objects.all(), *TAG_FIELDS)
+
+
+@api_response
+async def ingredient_list(request):
+    ingredients = Ingredient.objects.all()
+    name = request.GET.get('name')
+    if name:
+        ingredients = ingredients.filter(name__istartswith=name)
+    return await values(ingredients, 'id', 'name', 'measurement_unit')
+
+
+@api_response
+async def subscriptions(request):
+    """Число и последние рецепты авторов страницы - двумя запросами,
+       как в UserViewSet.with_recipes."""
+    user = request.user
+    if not user.is_authenticated:
+        raise NotAuthenticated()
+    limit_recipes = recipes_limit(request.GET)
+    queryset = User.objects.filter(following__username=user)
+    page, limit, page_queryset = paginate(request, queryset)
+    (count, approximate), authors = await asyncio.gather(
+        sync_to_async(estimated_count)(queryset),
+        values(
+            page_queryset.annotate(
+                recipes_count=Count('recipes', distinct=True)
+            ),
+            'email', 'id', 'username', 'first_name', 'last_name',
+            'recipes_count'
+        ),
+    )
+    if not authors and page != 1:
+        raise NotFound('Неправильная страница')
+    recipes = Recipe.objects.filter(
+        author_id__in=[author['id'] for author in authors]
+    )
+    if limit_recipes:
+        recipes = recipes.annotate(row=Window(
+            RowNumber(), partition_by=F('author'),
+            order_by=F('pub_date').desc()
+        )).filter(row__lte=limit_recipes)
+    author_recipes = {author['id']: [] for author in authors}
+    for recipe in await values(
+        recipes, 'author_id', 'id', 'name', 'image', 'image_variants',
+        'cooking_time'
+    ):
+        author_recipes[recipe['author_id']].append({
+            'id': recipe['id'],
+            'name': recipe['name'],
+            'image': image_url(recipe['image']),
+            'image_srcset': srcset(recipe['image_variants']),
+            'cooking_time': recipe['cooking_time'],
+        })
+    return page_response(
+        request, page, limit, count, approximate,
+        [
+            {**author, 'recipes': author_recipes[author['id']]}
+            for author in authors
+        ]
+    )
@@ -0,0 +1,28 @@
+from drf_extra_fields.fields import Base64FieldMixin
+from rest_framework import serializers
+
+# Сигнатуры в начале файла; у WebP - 'RIFF', размер и 'WEBP'.
+SIGNATURES = (
+    (b'\xff\xd8\xff', 'jpeg'),
+    (b'\x89PNG\r\n\x1a\n', 'png'),
+    (b'GIF87a', 'gif'),
+    (b'GIF89a', 'gif'),
+)
+
+
+class Base64ImageField(Base64FieldMixin, serializers.FileField):
+    """Изображение в base64, которое сохраняется как есть. В отличие
+       от Base64ImageField из drf_extra_fields, Pillow не открывает файл
+       в запросе: тип определяется по сигнатуре, а декодирование
+       и копии делает фоновая обработка recipes.images."""
+    ALLOWED_TYPES = ('jpeg', 'png', 'gif', 'webp')
+    INVALID_FILE_MESSAGE = 'Загрузите корректное изображение.'
+    INVALID_TYPE_MESSAGE = 'Не удалось определить тип изображения.'
+
+    def get_file_extension(self, filename, decoded_file):
+        for signature, extension in SIGNATURES:
+            if decoded_file.startswith(signature):
+                return extension
+        if decoded_file[:4] == b'RIFF' and decoded_file[8:12] == b'WEBP':
+            return 'webp'
+        return None
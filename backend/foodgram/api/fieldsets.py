@@ -0,0 +1,58 @@
+from rest_framework.exceptions import ValidationError
+
+FIELDS_PARAM = 'fields'
+OMIT_PARAM = 'omit'
+
+
+def parse_fields(value):
+    return {name.strip() for name in value.split(',') if name.strip()}
+
+
+def requested_fields(request, available):
+    """Поля ответа по ?fields= и ?omit=; None - отдавать все поля."""
+    params = request.query_params
+    if FIELDS_PARAM not in params and OMIT_PARAM not in params:
+        return None
+    fields = parse_fields(params.get(FIELDS_PARAM, '')) or set(available)
+    omit = parse_fields(params.get(OMIT_PARAM, ''))
+    unknown = (fields | omit) - set(available)
+    if unknown:
+        raise ValidationError({
+            FIELDS_PARAM: f'Неизвестные поля: {", ".join(sorted(unknown))}'
+        })
+    return fields - omit
+
+
+class SparseFieldsetMixin:
+    """Сериализатор, который принимает fields - набор оставляемых полей."""
+
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+
+class SparseFieldsetViewMixin:
+    """Передаёт в сериализатор поля, запрошенные в GET-запросе.
+
+    get_queryset вьюсета по requested_fields решает, какие связанные
+    данные выбирать: для неотданных полей запросы не нужны.
+    """
+
+    def requested_fields(self, serializer_class=None):
+        serializer_class = serializer_class or self.get_serializer_class()
+        if (self.request.method != 'GET'
+                or not issubclass(serializer_class, SparseFieldsetMixin)):
+            return None
+        return requested_fields(self.request, serializer_class.Meta.fields)
+
+    def wants(self, name, serializer_class=None):
+        fields = self.requested_fields(serializer_class)
+        return fields is None or name in fields
+
+    def get_serializer(self, *args, **kwargs):
+        fields = self.requested_fields()
+        if fields is not None:
+            kwargs.setdefault('fields', fields)
+        return super().get_serializer(*args, **kwargs)
@@ -1,7 +1,9 @@
+from django.db.models import Exists, OuterRef
 from django_filters.rest_framework import FilterSet, filters
 from rest_framework.filters import SearchFilter
 
-from recipes.models import Ingredient, Recipe, Tag
+from recipes.models import Ingredient, Recipe, Tag, TagToRecipe
+from recipes.search import search_recipes
 
 
 class IngredientFilter(SearchFilter):
@@ -17,15 +19,31 @@ class RecipeFilter(FilterSet):
         field_name='tags__slug',
         to_field_name='slug',
         queryset=Tag.objects.all(),
+        method='filter_tags',
     )
     is_favorited = filters.NumberFilter(method='filter_is_favorited')
     is_in_shopping_cart = filters.NumberFilter(
         method='filter_is_in_shopping_cart'
     )
+    search = filters.CharFilter(method='filter_search')
+    ordering = filters.ChoiceFilter(
+        choices=(('trending', 'trending'),),
+        method='filter_ordering'
+    )
 
     class Meta:
         model = Recipe
-        fields = ('tags', 'author', 'is_favorited', 'is_in_shopping_cart',)
+        fields = ('tags', 'author', 'is_favorited', 'is_in_shopping_cart',
+                  'search', 'ordering',)
+
+    def filter_tags(self, queryset, name, value):
+        # Полусоединение вместо JOIN: рецепт с несколькими выбранными
+        # тегами попадает в выборку один раз и без DISTINCT.
+        if not value:
+            return queryset
+        return queryset.filter(Exists(TagToRecipe.objects.filter(
+            tag__in=value, recipe=OuterRef('pk')
+        )))
 
     def filter_is_favorited(self, queryset, name, value):
         if value and self.request.user.is_authenticated:
@@ -36,3 +54,16 @@ class RecipeFilter(FilterSet):
         if value and self.request.user.is_authenticated:
             return queryset.filter(shopping_list__user=self.request.user)
         return queryset
+
+    def filter_search(self, queryset, name, value):
+        value = value.strip()
+        if not value:
+            return queryset
+        return search_recipes(queryset, value)
+
+    def filter_ordering(self, queryset, name, value):
+        if value == 'trending':
+            return queryset.filter(score__isnull=False).order_by(
+                '-score__score', '-pub_date'
+            )
+        return queryset
@@ -0,0 +1,61 @@
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+
+from foodgram.db_router import can_read_replica, replica_reads
+from foodgram.settings import BATCH_IDS_LIMIT
+from recipes.utils import filter_in_order
+
+IDS_PARAM = 'ids'
+
+
+def parse_ids(value):
+    """Список id из ?ids=1,2,3 без повторов, в порядке запроса."""
+    try:
+        ids = list(dict.fromkeys(
+            int(pk) for pk in value.split(',') if pk.strip()
+        ))
+    except ValueError:
+        raise ValidationError(
+            {IDS_PARAM: 'Ожидается список целых чисел через запятую.'}
+        )
+    if len(ids) > BATCH_IDS_LIMIT:
+        raise ValidationError(
+            {IDS_PARAM: f'Можно запросить не больше {BATCH_IDS_LIMIT} id.'}
+        )
+    return ids
+
+
+class BatchListMixin:
+    """list с ?ids= отдаёт без пагинации объекты с этими id в порядке
+       запроса одним запросом IN; отсутствующие id пропускаются."""
+
+    def list(self, request, *args, **kwargs):
+        if IDS_PARAM not in request.query_params:
+            return super().list(request, *args, **kwargs)
+        queryset = filter_in_order(
+            self.filter_queryset(self.get_queryset()),
+            parse_ids(request.query_params[IDS_PARAM])
+        )
+        serializer = self.get_serializer(queryset, many=True)
+        return Response(serializer.data)
+
+
+class ReplicaReadMixin:
+    """Безопасные запросы вьюсета читают с реплики, если она настроена
+       и пользователь не закреплён за основной базой после записи.
+       Действия из primary_actions всегда идут в основную базу."""
+    replica_token = None
+    primary_actions = ()
+
+    def initial(self, request, *args, **kwargs):
+        self.replica_token = replica_reads.set(
+            self.action not in self.primary_actions
+            and can_read_replica(request)
+        )
+        super().initial(request, *args, **kwargs)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        if self.replica_token is not None:
+            replica_reads.reset(self.replica_token)
+            self.replica_token = None
+        return super().finalize_response(request, response, *args, **kwargs)
@@ -1,6 +1,114 @@
+import json
+from base64 import b64decode, b64encode
+from binascii import Error as DecodeError
+from hashlib import md5
+
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+from foodgram.invalidation import cached
+from foodgram.settings import (PAGINATION_COUNT_CACHE_TTL,
+                               PAGINATION_EXACT_COUNT_LIMIT)
+
+
+def estimated_count(queryset):
+    """Число строк выборки и признак того, что оно приблизительное.
+
+    До PAGINATION_EXACT_COUNT_LIMIT строк считает точно, COUNT по
+    подзапросу с LIMIT. Дальше PostgreSQL отдаёт оценку планировщика
+    из EXPLAIN, остальные СУБД - точный COUNT, закешированный на
+    PAGINATION_COUNT_CACHE_TTL секунд или до изменения модели.
+    """
+    queryset = queryset.order_by()
+    count = queryset[:PAGINATION_EXACT_COUNT_LIMIT + 1].count()
+    if count <= PAGINATION_EXACT_COUNT_LIMIT:
+        return count, False
+    if connections[queryset.db].vendor == 'postgresql':
+        plan = json.loads(queryset.explain(format='json'))
+        return max(int(plan[0]['Plan']['Plan Rows']), count), True
+    return cached(
+        f'count:{md5(str(queryset.query).encode()).hexdigest()}',
+        (queryset.model._meta.label_lower,), queryset.count,
+        PAGINATION_COUNT_CACHE_TTL
+    ), True
+
+
+class EstimatedCountPaginator(Paginator):
+    count_approximate = False
+
+    @cached_property
+    def count(self):
+        if not hasattr(self.object_list, 'order_by'):
+            return len(self.object_list)
+        count, self.count_approximate = estimated_count(self.object_list)
+        return count
 
 
 class CustomPagination(PageNumberPagination):
     page_size = 6
     page_size_query_param = 'limit'
+    django_paginator_class = EstimatedCountPaginator
+
+    def get_paginated_response(self, data):
+        """При приблизительном count добавляет count_approximate."""
+        response = super().get_paginated_response(data)
+        if self.page.paginator.count_approximate:
+            response.data = {
+                'count': response.data['count'],
+                'count_approximate': True,
+                **response.data,
+            }
+        return response
+
+
+class FeedCursorPagination:
+    """Курсорная пагинация ленты по позиции (pub_date, id рецепта)."""
+    cursor_query_param = 'cursor'
+    page_size = 6
+    page_size_query_param = 'limit'
+    max_page_size = 100
+    invalid_cursor_message = 'Неверный курсор'
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(page_size, 1), self.max_page_size)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            pub_date, recipe_id = b64decode(
+                encoded.encode()
+            ).decode().split('|')
+            position = parse_datetime(pub_date), int(recipe_id)
+        except (DecodeError, UnicodeDecodeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if position[0] is None:
+            raise NotFound(self.invalid_cursor_message)
+        return position
+
+    def encode_cursor(self, position):
+        pub_date, recipe_id = position
+        return b64encode(
+            f'{pub_date.isoformat()}|{recipe_id}'.encode()
+        ).decode()
+
+    def get_paginated_response(self, request, data, next_position):
+        next_url = None
+        if next_position:
+            next_url = replace_query_param(
+                request.build_absolute_uri(),
+                self.cursor_query_param,
+                self.encode_cursor(next_position)
+            )
+        return Response({'next': next_url, 'results': data})
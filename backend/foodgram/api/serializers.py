@@ -1,11 +1,14 @@
 from django.db import transaction
-from drf_extra_fields.fields import Base64ImageField
 from rest_framework import serializers
 
+from recipes.images import srcset
 from recipes.models import (Favorite, Ingredient, IngredientToRecipe, Recipe,
-                            ShopList, Tag)
+                            ShoppingListJob, ShopList, Tag)
 from users.serializers import UserSerializer
 
+from .fields import Base64ImageField
+from .fieldsets import SparseFieldsetMixin
+
 
 class TagSerializer(serializers.ModelSerializer):
     """Серилизатор для модели Tag."""
@@ -52,7 +55,7 @@ class IngredientRecipeForCreateSerializer(serializers.ModelSerializer):
         fields = ('id', 'amount',)
 
 
-class RecipeReadSerializer(serializers.ModelSerializer):
+class RecipeReadSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """ Сериализатор просмотра рецепта """
     tags = TagSerializer(read_only=False, many=True)
     author = UserSerializer(read_only=True)
@@ -62,24 +65,35 @@ class RecipeReadSerializer(serializers.ModelSerializer):
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
     image = Base64ImageField(max_length=None)
+    image_srcset = serializers.SerializerMethodField()
 
     class Meta:
         model = Recipe
         fields = ('id', 'tags', 'author', 'ingredients',
                   'is_favorited', 'is_in_shopping_cart',
-                  'name', 'image', 'text', 'cooking_time'
+                  'name', 'image', 'image_srcset', 'text', 'cooking_time'
                   )
 
     def get_ingredients(self, obj):
         ingredients = IngredientToRecipe.objects.filter(recipe=obj)
         return IngredientRecipeSerializer(ingredients, many=True).data
 
+    def get_image_srcset(self, obj):
+        request = self.context.get('request')
+        return srcset(
+            obj.image_variants, request and request.build_absolute_uri
+        )
+
     def get_is_favorited(self, obj):
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         request = self.context.get('request')
         return (request.user.is_authenticated
                 and obj.favorites.filter(user=request.user).exists())
 
     def get_is_in_shopping_cart(self, obj):
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         request = self.context.get('request')
         return (request.user.is_authenticated
                 and obj.shopping_list.filter(user=request.user).exists())
@@ -181,12 +195,36 @@ class CreateRecipeSerializer(serializers.ModelSerializer):
             return recipe
 
     def update(self, recipe, validated_data):
+        if 'image' in validated_data:
+            validated_data['image_variants'] = None
         ingredients = validated_data.pop('ingredients')
         tags = validated_data.pop('tags')
-        IngredientToRecipe.objects.filter(recipe=recipe).delete()
-        self.create_ingredients(recipe, ingredients)
-        recipe.tags.set(tags)
-        return super().update(recipe, validated_data)
+        with transaction.atomic():
+            # Рецепт сохраняется первым: save() записал бы прочитанный
+            # до изменения состава флаг similar_computed.
+            recipe = super().update(recipe, validated_data)
+            self.update_ingredients(recipe, ingredients)
+            recipe.tags.set(tags)
+            return recipe
+
+    def update_ingredients(self, recipe, ingredients):
+        """Пересоздаёт связи, только если изменился состав: изменение
+           количеств не сбрасывает рассчитанные похожие рецепты."""
+        current = {
+            item.ingredient_id: item
+            for item in IngredientToRecipe.objects.filter(recipe=recipe)
+        }
+        amounts = {item['id'].id: item['amount'] for item in ingredients}
+        if current.keys() != amounts.keys():
+            IngredientToRecipe.objects.filter(recipe=recipe).delete()
+            self.create_ingredients(recipe, ingredients)
+            return
+        changed = []
+        for ingredient_id, item in current.items():
+            if item.amount != amounts[ingredient_id]:
+                item.amount = amounts[ingredient_id]
+                changed.append(item)
+        IngredientToRecipe.objects.bulk_update(changed, ['amount'])
 
     def to_representation(self, instance):
         return RecipeReadSerializer(instance, context={
@@ -250,3 +288,11 @@ class ShopListSerializer(serializers.ModelSerializer):
             instance.recipe,
             context={'request': self.context.get('request')}
         ).data
+
+
+class ShoppingListJobSerializer(serializers.ModelSerializer):
+    """Сериализатор статуса фоновой генерации списка покупок."""
+
+    class Meta:
+        fields = ('id', 'status', 'error', 'created', 'finished')
+        model = ShoppingListJob
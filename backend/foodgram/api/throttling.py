@@ -0,0 +1,192 @@
+"""Ограничение частоты запросов ведрами токенов.
+
+По умолчанию ведра лежат в словаре процесса: состояние - кортеж
+(токены, время обновления, время полного наполнения), чтение
+и запись идут под блокировкой. Для общего лимита на все воркеры
+THROTTLE_CACHE задаёт алиас кеша из CACHES; там get/set двух воркеров
+перетирали бы друг друга, поэтому ведро заменяет скользящее окно
+из счётчиков cache.add и cache.incr, которые атомарны в общих кешах.
+"""
+import time
+from threading import Lock
+
+from django.core.cache import caches
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+from foodgram.settings import THROTTLE_CACHE, THROTTLE_MAX_KEYS
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+class LocalBucketStore:
+    """Ведра в памяти процесса."""
+
+    def __init__(self, max_keys):
+        self.buckets = {}
+        self.max_keys = max_keys
+        self.lock = Lock()
+
+    def take(self, key, capacity, period, now):
+        """Берёт токен; возвращает (разрешено, токенов осталось)."""
+        rate = capacity / period
+        with self.lock:
+            state = self.buckets.get(key)
+            if state is None:
+                tokens = capacity
+            else:
+                tokens = min(capacity, state[0] + (now - state[1]) * rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            if len(self.buckets) >= self.max_keys and key not in self.buckets:
+                self.prune(now)
+            self.buckets[key] = (tokens, now, now + (capacity - tokens) / rate)
+        return allowed, tokens
+
+    def prune(self, now):
+        """Удаляет полные ведра: без них состояние не меняется. Если
+           места всё равно нет, удаляет половину самых старых ключей."""
+        items = list(self.buckets.items())
+        stale = [key for key, state in items if state[2] <= now]
+        if len(items) - len(stale) >= self.max_keys:
+            stale = [key for key, _ in items[:len(items) // 2]]
+        for key in stale:
+            self.buckets.pop(key, None)
+
+
+class CacheBucketStore:
+    """Скользящее окно в общем кеше Django: счётчики запросов текущего
+       и прошлого периода, прошлый учитывается с долей оставшегося
+       в окне времени."""
+
+    def __init__(self, cache):
+        self.cache = cache
+
+    def take(self, key, capacity, period, now):
+        window, elapsed = divmod(now / period, 1)
+        current = f'{key}:{int(window)}'
+        self.cache.add(current, 0, period * 2)
+        try:
+            count = self.cache.incr(current)
+        except ValueError:
+            # Счётчик вытеснен между add и incr.
+            self.cache.add(current, 1, period * 2)
+            count = 1
+        previous = self.cache.get(f'{key}:{int(window) - 1}', 0)
+        used = previous * (1 - elapsed) + count
+        if used <= capacity:
+            return True, capacity - used
+        # Отклонённый запрос не расходует лимит.
+        try:
+            self.cache.decr(current)
+        except ValueError:
+            pass
+        return False, capacity - used + 1
+
+
+store = None
+
+
+def get_store():
+    global store
+    if store is None:
+        store = (CacheBucketStore(caches[THROTTLE_CACHE]) if THROTTLE_CACHE
+                 else LocalBucketStore(THROTTLE_MAX_KEYS))
+    return store
+
+
+def parse_rate(rate):
+    """'100/min' -> (100, 60), как SimpleRateThrottle.parse_rate."""
+    num, period = rate.split('/')
+    return int(num), {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}[period[0]]
+
+
+def record_rate_limit(request, limit, remaining, reset):
+    """Запоминает самый строгий из сработавших лимитов для заголовков
+       RateLimitHeadersMiddleware."""
+    request = getattr(request, '_request', request)
+    current = getattr(request, 'rate_limit', None)
+    if current is None or remaining < current[1]:
+        request.rate_limit = (limit, remaining, reset)
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """Ведро на scope и клиента: вмещает столько запросов, сколько
+       разрешено за период, и равномерно пополняется за период."""
+    scope = None
+
+    def __init__(self):
+        self.capacity, self.period = parse_rate(
+            api_settings.DEFAULT_THROTTLE_RATES[self.scope]
+        )
+        self.wait_time = None
+
+    def get_cache_key(self, request, view):
+        raise NotImplementedError
+
+    def client_key(self, request):
+        if request.user.is_authenticated:
+            return f'user:{request.user.pk}'
+        return f'ip:{self.get_ident(request)}'
+
+    def allow_request(self, request, view):
+        key = self.get_cache_key(request, view)
+        if key is None:
+            return True
+        key = f'throttle:{self.scope}:{key}'
+        allowed, tokens = get_store().take(
+            key, self.capacity, self.period, time.time()
+        )
+        rate = self.capacity / self.period
+        self.wait_time = None if allowed else (1 - tokens) / rate
+        record_rate_limit(request, self.capacity, max(int(tokens), 0),
+                          (self.capacity - tokens) / rate)
+        return allowed
+
+    def wait(self):
+        return self.wait_time
+
+
+class AnonBucketThrottle(TokenBucketThrottle):
+    scope = 'anon'
+
+    def get_cache_key(self, request, view):
+        if request.user.is_authenticated:
+            return None
+        return self.get_ident(request)
+
+
+class UserBucketThrottle(TokenBucketThrottle):
+    scope = 'user'
+
+    def get_cache_key(self, request, view):
+        if not request.user.is_authenticated:
+            return None
+        return request.user.pk
+
+
+class WriteBucketThrottle(TokenBucketThrottle):
+    """Отдельный лимит на изменяющие запросы."""
+    scope = 'write'
+
+    def get_cache_key(self, request, view):
+        if request.method in SAFE_METHODS:
+            return None
+        return self.client_key(request)
+
+
+class DownloadBucketThrottle(TokenBucketThrottle):
+    """Лимит на генерацию PDF списка покупок."""
+    scope = 'download'
+
+    def get_cache_key(self, request, view):
+        return self.client_key(request)
+
+
+class ExportBucketThrottle(TokenBucketThrottle):
+    """Лимит на выгрузку рецептов в NDJSON, отдельный от PDF."""
+    scope = 'export'
+
+    def get_cache_key(self, request, view):
+        return self.client_key(request)
@@ -1,9 +1,12 @@
 from django.urls import include, path
 from rest_framework import routers
 
+from foodgram.settings import ASYNC_READ_PATH
 from users.views import UserViewSet
 
-from .views import IngredientViewSet, RecipeViewSet, TagViewSet
+from . import async_views
+from .async_views import read_path
+from .views import IngredientViewSet, RecipeViewSet, TagViewSet, db_metrics
 
 router = routers.DefaultRouter()
 
@@ -13,7 +16,36 @@ router.register('tags', TagViewSet, basename='tags')
 router.register('ingredients', IngredientViewSet, basename='ingredients')
 
 urlpatterns = [
+    path('metrics/db/', db_metrics),
+    path('sync/', RecipeViewSet.as_view({'get': 'sync'})),
     path('', include(router.urls)),
     path('', include('djoser.urls')),
     path('auth/', include('djoser.urls.authtoken')),
 ]
+
+if ASYNC_READ_PATH:
+    urlpatterns = [
+        path('recipes/', read_path(
+            async_views.recipe_list,
+            RecipeViewSet.as_view({'get': 'list', 'post': 'create'})
+        )),
+        path('recipes/<int:pk>/', read_path(
+            async_views.recipe_detail,
+            RecipeViewSet.as_view({
+                'get': 'retrieve', 'put': 'update',
+                'patch': 'partial_update', 'delete': 'destroy'
+            })
+        )),
+        path('tags/', read_path(
+            async_views.tag_list,
+            TagViewSet.as_view({'get': 'list', 'post': 'create'})
+        )),
+        path('ingredients/', read_path(
+            async_views.ingredient_list,
+            IngredientViewSet.as_view({'get': 'list'})
+        )),
+        path('users/subscriptions/', read_path(
+            async_views.subscriptions,
+            UserViewSet.as_view({'get': 'subscriptions'})
+        )),
+    ] + urlpatterns
@@ -1,34 +1,54 @@
-from django.db.models import Sum
-from django.http.response import HttpResponse
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Prefetch
+from django.http.response import HttpResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
+from django.urls import reverse
 from django_filters.rest_framework import DjangoFilterBackend
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
-from reportlab.pdfgen import canvas
-from rest_framework import status, viewsets
-from rest_framework.decorators import action
-from rest_framework.permissions import (IsAuthenticated,
+from rest_framework import serializers, status, viewsets
+from rest_framework.decorators import action, api_view, permission_classes
+from rest_framework.permissions import (IsAdminUser, IsAuthenticated,
                                         IsAuthenticatedOrReadOnly)
 from rest_framework.response import Response
 
-from foodgram.settings import NAME_SHOPPING_CART_PDF
+from foodgram.db_pool import connection_metrics
+from foodgram.settings import NAME_SHOPPING_CART_PDF, SHOPPING_LIST_ASYNC
 
-from recipes.models import (Favorite, Ingredient, IngredientToRecipe, Recipe,
-                            ShopList, Tag)
+from recipes.changes import changes_since, latest_token
+from recipes.feed import read_feed
+from recipes.ingredient_index import ingredient_index
+from recipes.models import (Change, Favorite, Ingredient, IngredientToRecipe,
+                            Recipe, ShopList, ShoppingListJob, Tag)
+from recipes.shopping_list import (create_pdf, enqueue,
+                                   shopping_list_ingredients)
+from recipes.transfer import export_lines
+from recipes.trending import bump
+from recipes.utils import filter_in_order
+from users.models import Follow, User
+from users.serializers import RecipeBriefSerializer
 
+from .fieldsets import SparseFieldsetViewMixin
 from .filters import IngredientFilter, RecipeFilter
-from .pagination import CustomPagination
+from .mixins import BatchListMixin, ReplicaReadMixin
+from .pagination import CustomPagination, FeedCursorPagination
 from .permissions import AuthorPermission
 from .serializers import (CreateRecipeSerializer, FavoriteSerializer,
                           IngredientSerializer, RecipeReadSerializer,
-                          ShopListSerializer, TagSerializer,
-                          RecipeBriefSerializer)
+                          ShoppingListJobSerializer, ShopListSerializer,
+                          TagSerializer)
+from .throttling import (DownloadBucketThrottle, ExportBucketThrottle,
+                         UserBucketThrottle)
 
 
 CONTENT_TYPE = 'application/pdf'
+NAME_RECIPES_EXPORT = 'recipes.ndjson'
+SYNC_SECTIONS = {
+    Change.FAVORITE: 'favorites',
+    Change.SHOPPING_CART: 'shopping_cart',
+    Change.SUBSCRIPTION: 'subscriptions',
+}
 
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientViewSet(ReplicaReadMixin, viewsets.ReadOnlyModelViewSet):
     """Вьюсет для IngredientSerializer."""
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
@@ -38,7 +58,7 @@ class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
     pagination_class = None
 
 
-class TagViewSet(viewsets.ModelViewSet):
+class TagViewSet(ReplicaReadMixin, viewsets.ModelViewSet):
     """Вьюсет для TagSerializer."""
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
@@ -46,7 +66,8 @@ class TagViewSet(viewsets.ModelViewSet):
     pagination_class = None
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(ReplicaReadMixin, BatchListMixin, SparseFieldsetViewMixin,
+                    viewsets.ModelViewSet):
     """Вьюсет для RecipeSerializer."""
     queryset = Recipe.objects.all()
     serializer_class = CreateRecipeSerializer
@@ -54,12 +75,58 @@ class RecipeViewSet(viewsets.ModelViewSet):
     pagination_class = CustomPagination
     filter_backends = (DjangoFilterBackend, )
     filterset_class = RecipeFilter
+    # Выгрузка ставит задание под select_for_update, а статус задания
+    # только что записан: реплика могла его ещё не получить.
+    primary_actions = ('download_shopping_list', 'shopping_list_job')
 
     def get_serializer_class(self):
         if self.request.method in ('POST', 'PATCH', 'DELETE'):
             return CreateRecipeSerializer
         return RecipeReadSerializer
 
+    def get_queryset(self):
+        """Для чтения выбирает связанные данные только тех полей,
+           что попадут в ответ."""
+        queryset = super().get_queryset()
+        if self.request.method != 'GET':
+            return queryset
+        user = self.request.user
+        if self.wants('author'):
+            authors = User.objects.all()
+            if user.is_authenticated:
+                authors = authors.annotate(is_subscribed=Exists(
+                    Follow.objects.filter(
+                        username=user, author=OuterRef('pk')
+                    )
+                ))
+            queryset = queryset.prefetch_related(
+                Prefetch('author', queryset=authors)
+            )
+        if self.wants('tags'):
+            queryset = queryset.prefetch_related('tags')
+        if self.wants('ingredients'):
+            queryset = queryset.prefetch_related(Prefetch(
+                'ingredienttorecipe',
+                queryset=IngredientToRecipe.objects.select_related(
+                    'ingredient'
+                ).order_by('id')
+            ))
+        if user.is_authenticated:
+            for name, model in (('is_favorited', Favorite),
+                                ('is_in_shopping_cart', ShopList)):
+                if self.wants(name):
+                    queryset = queryset.annotate(**{name: Exists(
+                        model.objects.filter(
+                            user=user, recipe=OuterRef('pk')
+                        )
+                    )})
+        deferred = [
+            column for column, field in (('text', 'text'),
+                                         ('image_variants', 'image_srcset'))
+            if not self.wants(field)
+        ]
+        return queryset.defer(*deferred) if deferred else queryset
+
     def add_or_del_object(self, model, pk, serializer, errors):
         recipe = get_object_or_404(Recipe, id=pk)
         serializer = serializer(
@@ -67,43 +134,22 @@ class RecipeViewSet(viewsets.ModelViewSet):
         )
         if self.request.method == 'POST':
             serializer.is_valid(raise_exception=True)
-            serializer.save()
+            with transaction.atomic():
+                serializer.save()
+            bump(recipe.id, model)
             serializer = RecipeBriefSerializer(recipe)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         object = model.objects.filter(user=self.request.user, recipe=recipe)
-        if not object.exists():
+        created = object.values_list('created', flat=True).first()
+        if created is None:
             return Response(
                 {'errors': errors},
                 status=status.HTTP_400_BAD_REQUEST
             )
         object.delete()
+        bump(recipe.id, model, added=False, created=created)
         return Response(status=status.HTTP_204_NO_CONTENT)
 
-    @staticmethod
-    def creating_pdf(dictionary, pdf_file):
-        begin_position_x, begin_position_y = 30, 730
-        pdfmetrics.registerFont(TTFont('DejaVuSerif', 'DejaVuSerif.ttf'))
-        pdf_file.setFont('DejaVuSerif', 25)
-        pdf_file.setTitle('Список покупок')
-        pdf_file.drawString(
-            begin_position_x, begin_position_y + 40, 'Список покупок: ')
-        pdf_file.setFont('DejaVuSerif', 18)
-        for number, item in enumerate(dictionary, start=1):
-            if begin_position_y < 100:
-                begin_position_y = 730
-                pdf_file.showPage()
-                pdf_file.setFont('DejaVuSerif', 18)
-            pdf_file.drawString(
-                begin_position_x,
-                begin_position_y,
-                f'{number}: {item["ingredient__name"]} - '
-                f'{item["ingredient_total"]}'
-                f'{item["ingredient__measurement_unit"]}'
-            )
-            begin_position_y -= 30
-        pdf_file.showPage()
-        return pdf_file.save()
-
     @action(
         detail=True,
         methods=('POST', 'DELETE'),
@@ -126,28 +172,184 @@ class RecipeViewSet(viewsets.ModelViewSet):
         errors = 'У вас нет данного рецепта в списке покупок'
         return self.add_or_del_object(ShopList, pk, ShopListSerializer, errors)
 
+    @action(
+        detail=True,
+        url_path='similar',
+        url_name='similar',
+    )
+    def similar(self, request, pk):
+        recipes = self.get_queryset().filter(
+            similar_for__recipe_id=pk
+        ).order_by('-similar_for__score')
+        if not recipes and not Recipe.objects.filter(id=pk).exists():
+            return Response(status=status.HTTP_404_NOT_FOUND)
+        serializer = self.get_serializer(recipes, many=True)
+        return Response(serializer.data)
+
+    @action(
+        detail=False,
+        url_path='feed',
+        url_name='feed',
+        permission_classes=(IsAuthenticated,)
+    )
+    def feed(self, request):
+        paginator = FeedCursorPagination()
+        limit = paginator.get_page_size(request)
+        page = read_feed(
+            request.user, limit, paginator.decode_cursor(request)
+        )
+        recipes = filter_in_order(
+            self.get_queryset(), [recipe_id for _, recipe_id in page]
+        )
+        serializer = self.get_serializer(recipes, many=True)
+        return paginator.get_paginated_response(
+            request, serializer.data,
+            page[-1] if len(page) == limit else None
+        )
+
+    @action(
+        detail=False,
+        url_path='by_ingredients',
+        url_name='by_ingredients',
+    )
+    def by_ingredients(self, request):
+        try:
+            ingredients = [
+                int(ingredient_id) for ingredient_id
+                in request.query_params.get('have', '').split(',')
+                if ingredient_id
+            ]
+            max_missing = request.query_params.get('max_missing')
+            if max_missing is not None:
+                max_missing = int(max_missing)
+        except ValueError:
+            return Response(
+                {'errors': 'Параметры have и max_missing должны быть '
+                           'целыми числами'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        recipes = filter_in_order(
+            self.filter_queryset(self.get_queryset()),
+            ingredient_index.match(ingredients, max_missing)
+        )
+        page = self.paginate_queryset(recipes)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    def sync(self, request):
+        """GET /api/sync/?since=<токен>: изменения рецептов после токена,
+           а для пользователя ещё его избранного, корзины и подписок.
+           Без since отдаёт только текущий токен."""
+        since = request.query_params.get('since')
+        if since is None:
+            rows, token, has_more = [], latest_token(), False
+        elif not since.isdigit():
+            return Response(
+                {'errors': 'Параметр since должен быть токеном из '
+                           'предыдущего ответа'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        else:
+            rows, token, has_more = changes_since(request.user, int(since))
+        # Важна только последняя запись об объекте.
+        latest = {(kind, object_id): deleted
+                  for _, kind, object_id, deleted, _ in rows}
+        changes = {kind: ([], []) for kind, _ in Change.KINDS}
+        for (kind, object_id), deleted in latest.items():
+            changes[kind][deleted].append(object_id)
+        updated, deleted = changes.pop(Change.RECIPE)
+        recipes = self.get_queryset().filter(id__in=updated)
+        data = {
+            'token': str(token),
+            'has_more': has_more,
+            'recipes': {
+                'updated': self.get_serializer(
+                    recipes if updated else [], many=True
+                ).data,
+                'deleted': deleted,
+            },
+        }
+        if request.user.is_authenticated:
+            for kind, (added, removed) in changes.items():
+                data[SYNC_SECTIONS[kind]] = {
+                    'added': added, 'removed': removed
+                }
+        return Response(data)
+
     @action(
         detail=False,
         url_path='download_shopping_cart',
         url_name='download_shopping_cart',
-        permission_classes=(IsAuthenticated,)
+        permission_classes=(IsAuthenticated,),
+        throttle_classes=(UserBucketThrottle, DownloadBucketThrottle)
     )
     def download_shopping_list(self, request):
-        ingredients = IngredientToRecipe.objects.filter(
-            recipe__shopping_list__user=request.user
-        ).values(
-            'ingredient__name', 'ingredient__measurement_unit'
-        ).order_by(
-            'ingredient__name'
-        ).annotate(ingredient_total=Sum('amount'))
-
+        # ?async=0 и ?async=false - синхронная выгрузка, мусор - 400.
+        run_async = serializers.BooleanField().to_internal_value(
+            request.query_params.get('async', False)
+        )
+        if SHOPPING_LIST_ASYNC or run_async:
+            return self.shopping_list_job_response(
+                request, enqueue(request.user)
+            )
         response = HttpResponse(content_type=CONTENT_TYPE)
         response['Content-Disposition'] = (
             f'attachment; filename={NAME_SHOPPING_CART_PDF}')
-        pdf_file = canvas.Canvas(response)
-        self.creating_pdf(ingredients, pdf_file)
+        create_pdf(shopping_list_ingredients(request.user), response)
         return response
 
+    @action(
+        detail=False,
+        url_path='export',
+        url_name='export',
+        permission_classes=(IsAuthenticated,),
+        throttle_classes=(UserBucketThrottle, ExportBucketThrottle)
+    )
+    def export(self, request):
+        """Рецепты в NDJSON потоком, с фильтрами списка рецептов."""
+        response = StreamingHttpResponse(
+            export_lines(self.filter_queryset(Recipe.objects.all())),
+            content_type='application/x-ndjson'
+        )
+        response['Content-Disposition'] = (
+            f'attachment; filename={NAME_RECIPES_EXPORT}')
+        return response
+
+    @action(
+        detail=False,
+        url_path=r'download_shopping_cart/(?P<job_id>\d+)',
+        url_name='shopping_cart_job',
+        permission_classes=(IsAuthenticated,)
+    )
+    def shopping_list_job(self, request, job_id):
+        job = get_object_or_404(
+            ShoppingListJob, id=job_id, user=request.user
+        )
+        return self.shopping_list_job_response(request, job)
+
+    @staticmethod
+    def shopping_list_job_response(request, job):
+        """Готовый файл отдаётся редиректом, иначе - статус задания
+           и адрес для повторного опроса."""
+        if job.status == ShoppingListJob.DONE:
+            return Response(
+                status=status.HTTP_303_SEE_OTHER,
+                headers={'Location': request.build_absolute_uri(
+                    job.file.url
+                )}
+            )
+        url = request.build_absolute_uri(reverse(
+            'recipes-shopping_cart_job', kwargs={'job_id': job.id}
+        ))
+        serializer = ShoppingListJobSerializer(job)
+        return Response(
+            {**serializer.data, 'url': url},
+            status=(status.HTTP_200_OK
+                    if job.status == ShoppingListJob.FAILED
+                    else status.HTTP_202_ACCEPTED),
+            headers={'Location': url}
+        )
+
 
 class FavoriteViewSet(viewsets.ModelViewSet):
     serializer_class = FavoriteSerializer
@@ -157,3 +359,10 @@ class FavoriteViewSet(viewsets.ModelViewSet):
         recipe_id = self.kwargs.get('recipe_id')
         recipe = get_object_or_404(Recipe, id=recipe_id)
         return recipe.favorites.all()
+
+
+@api_view(['GET'])
+@permission_classes((IsAdminUser, ))
+def db_metrics(request):
+    """Соединения с базой в процессе, который обработал запрос."""
+    return Response(connection_metrics())
@@ -0,0 +1,428 @@
+"""Нагрузочный тест по сценариям пользователей с отчётом по SLO.
+
+В отличие от остальных замеров идёт по HTTP на работающий стенд: runserver,
+gunicorn или docker-compose с nginx и PostgreSQL. Каждый виртуальный
+пользователь входит под своей учётной записью loadtest-<n>@example.com
+(созданной при первом запуске) и по кругу выбирает сценарий:
+- листает /api/recipes/ с фильтром по тегу;
+- открывает карточки рецептов;
+- добавляет рецепт в избранное и убирает;
+- собирает корзину, скачивает список покупок и очищает корзину;
+- ищет ингредиенты по мере набора названия.
+
+Для каждого эндпоинта выводит запросы в секунду, долю ошибок, p50, p95
+и p99 и сверяет их с SLO (DEFAULT_SLO, переопределяется --slo из JSON
+с теми же ключами). С --baseline сравнивает с сохранённым прогоном
+и считает регрессией ухудшение больше --tolerance. Код выхода 1, если
+нарушен SLO или есть регрессия.
+
+    python benchmarks/load_test.py --url http://127.0.0.1:8000 --users 20
+    python benchmarks/load_test.py --url http://localhost --users 100 \\
+        --duration 120 --save-baseline baseline.json
+    python benchmarks/load_test.py --url http://localhost --users 100 \\
+        --duration 120 --baseline baseline.json --slo slo.json
+
+Лимиты запросов стенда нужно поднять (THROTTLE_USER_RATE,
+THROTTLE_WRITE_RATE, THROTTLE_DOWNLOAD_RATE), иначе ответы 429
+попадут в ошибки.
+"""
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import sys
+import time
+from urllib.parse import quote, urlsplit
+
+PASSWORD = 'Load-test-password-1'
+SEARCH_WORDS = ('помидоры', 'сыр', 'молоко', 'яйца', 'картофель', 'мука')
+PAGE_SIZE = 6
+# Задание на список покупок опрашивается, пока не будет готово.
+JOB_POLL_INTERVAL = 0.2
+JOB_POLL_LIMIT = 50
+
+DEFAULT_SLO = {
+    '*': {'p95': 300, 'p99': 800, 'error_rate': 0.01},
+    'GET /api/recipes/download_shopping_cart/': {'p95': 1500, 'p99': 3000},
+}
+
+
+class Client:
+    """HTTP/1.1 с keep-alive поверх asyncio: одно соединение на
+       виртуального пользователя, как у браузера с одной вкладкой."""
+
+    def __init__(self, url, timeout):
+        parts = urlsplit(url)
+        self.host = parts.netloc
+        self.address = (parts.hostname, parts.port or 80)
+        self.timeout = timeout
+        self.token = None
+        self.reader = self.writer = None
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.reader = self.writer = None
+
+    async def request(self, method, path, body=None):
+        """(статус, заголовки, тело); тело JSON разбирается."""
+        try:
+            return await asyncio.wait_for(
+                self.exchange(method, path, body), self.timeout
+            )
+        except BaseException:
+            # Ответ мог остаться недочитанным: соединение не годится.
+            await self.close()
+            raise
+
+    async def exchange(self, method, path, body):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(
+                *self.address
+            )
+        payload = b'' if body is None else json.dumps(body).encode()
+        headers = (
+            f'{method} {path} HTTP/1.1\r\nHost: {self.host}\r\n'
+            'Accept: application/json\r\n'
+            f'Content-Length: {len(payload)}\r\n'
+        )
+        if body is not None:
+            headers += 'Content-Type: application/json\r\n'
+        if self.token:
+            headers += f'Authorization: Token {self.token}\r\n'
+        self.writer.write((headers + '\r\n').encode() + payload)
+        await self.writer.drain()
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise ConnectionError('Сервер закрыл соединение')
+        response_headers = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b'\r\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            response_headers[name.strip().lower()] = value.strip()
+        if response_headers.get('transfer-encoding') == 'chunked':
+            content = await self.read_chunked()
+        else:
+            content = await self.reader.readexactly(
+                int(response_headers.get('content-length', 0))
+            )
+        if response_headers.get('connection', '').lower() == 'close':
+            await self.close()
+        if response_headers.get('content-type', '').startswith(
+            'application/json'
+        ) and content:
+            content = json.loads(content)
+        return int(status_line.split()[1]), response_headers, content
+
+    async def read_chunked(self):
+        chunks = []
+        while True:
+            size = int((await self.reader.readline()).split(b';')[0], 16)
+            if not size:
+                await self.reader.readline()
+                return b''.join(chunks)
+            chunks.append(await self.reader.readexactly(size))
+            await self.reader.readline()
+
+
+class Stats:
+    def __init__(self):
+        self.latencies = {}
+        self.errors = {}
+
+    def record(self, name, seconds, ok):
+        self.latencies.setdefault(name, []).append(seconds)
+        self.errors.setdefault(name, 0)
+        if not ok:
+            self.errors[name] += 1
+
+    def summary(self, duration):
+        """{эндпоинт: {rps, error_rate, p50, p95, p99, requests}},
+           задержки в миллисекундах."""
+        result = {}
+        for name, latencies in sorted(self.latencies.items()):
+            if len(latencies) > 1:
+                quantiles = statistics.quantiles(latencies, n=100)
+            else:
+                quantiles = latencies * 99
+            result[name] = {
+                'requests': len(latencies),
+                'rps': len(latencies) / duration,
+                'error_rate': self.errors[name] / len(latencies),
+                'p50': quantiles[49] * 1000,
+                'p95': quantiles[94] * 1000,
+                'p99': quantiles[98] * 1000,
+            }
+        return result
+
+
+class VirtualUser:
+    def __init__(self, number, args, stats):
+        self.number = number
+        self.client = Client(args.url, args.timeout)
+        self.stats = stats
+        self.random = random.Random(number)
+        self.think = args.think
+        self.tags = []
+        self.recipe_ids = []
+        self.words = list(SEARCH_WORDS)
+
+    async def call(self, name, method, path, body=None, expected=(200,)):
+        start = time.perf_counter()
+        try:
+            status, headers, content = await self.client.request(
+                method, path, body
+            )
+        except (OSError, asyncio.IncompleteReadError,
+                asyncio.TimeoutError, ValueError):
+            self.stats.record(name, time.perf_counter() - start, False)
+            return None, {}, None
+        self.stats.record(name, time.perf_counter() - start,
+                          status in expected)
+        return status, headers, content
+
+    async def login(self):
+        """Вход без замера; учётная запись создаётся, если её нет."""
+        email = f'loadtest-{self.number}@example.com'
+        await self.client.request('POST', '/api/users/', {
+            'email': email, 'username': f'loadtest-{self.number}',
+            'first_name': 'Нагрузка', 'last_name': str(self.number),
+            'password': PASSWORD,
+        })
+        status, _, content = await self.client.request(
+            'POST', '/api/auth/token/login/',
+            {'email': email, 'password': PASSWORD}
+        )
+        if status != 200:
+            raise RuntimeError(f'{email}: вход не удался ({status})')
+        self.client.token = content['auth_token']
+        _, _, content = await self.client.request('GET', '/api/tags/')
+        self.tags = [tag['slug'] for tag in content or ()]
+
+    async def pick_recipe(self):
+        if not self.recipe_ids:
+            await self.browse()
+        return self.random.choice(self.recipe_ids) if self.recipe_ids else None
+
+    async def browse(self):
+        path = f'/api/recipes/?limit={PAGE_SIZE}'
+        if self.tags:
+            path += f'&tags={self.random.choice(self.tags)}'
+        for page in range(1, self.random.randint(1, 3) + 1):
+            status, _, content = await self.call(
+                'GET /api/recipes/?tags', 'GET', f'{path}&page={page}'
+            )
+            if status != 200:
+                return
+            self.recipe_ids = [
+                recipe['id'] for recipe in content['results']
+            ] or self.recipe_ids
+            if not content.get('next'):
+                return
+
+    async def detail(self):
+        for _ in range(self.random.randint(1, 3)):
+            recipe_id = await self.pick_recipe()
+            if recipe_id is None:
+                return
+            status, _, content = await self.call(
+                'GET /api/recipes/{id}/', 'GET', f'/api/recipes/{recipe_id}/'
+            )
+            if status == 200:
+                self.words.extend(
+                    item['name'] for item in content['ingredients']
+                )
+                del self.words[:-50]
+
+    async def toggle(self, section):
+        recipe_id = await self.pick_recipe()
+        if recipe_id is None:
+            return
+        path = f'/api/recipes/{recipe_id}/{section}/'
+        name = f'/api/recipes/{{id}}/{section}/'
+        await self.call(f'POST {name}', 'POST', path, expected=(201,))
+        await self.call(f'DELETE {name}', 'DELETE', path, expected=(204,))
+
+    async def favorite(self):
+        await self.toggle('favorite')
+
+    async def shopping_cart(self):
+        recipe_ids = set()
+        for _ in range(self.random.randint(1, 3)):
+            recipe_id = await self.pick_recipe()
+            if recipe_id is None or recipe_id in recipe_ids:
+                continue
+            status, _, _ = await self.call(
+                'POST /api/recipes/{id}/shopping_cart/', 'POST',
+                f'/api/recipes/{recipe_id}/shopping_cart/', expected=(201,)
+            )
+            if status == 201:
+                recipe_ids.add(recipe_id)
+        await self.download()
+        for recipe_id in recipe_ids:
+            await self.call(
+                'DELETE /api/recipes/{id}/shopping_cart/', 'DELETE',
+                f'/api/recipes/{recipe_id}/shopping_cart/', expected=(204,)
+            )
+
+    async def download(self):
+        """Синхронная выгрузка отдаёт PDF, фоновая - задание, которое
+           опрашивается до редиректа на готовый файл."""
+        status, headers, _ = await self.call(
+            'GET /api/recipes/download_shopping_cart/', 'GET',
+            '/api/recipes/download_shopping_cart/', expected=(200, 202, 303)
+        )
+        for _ in range(JOB_POLL_LIMIT):
+            if status != 202:
+                return
+            await asyncio.sleep(JOB_POLL_INTERVAL)
+            status, headers, _ = await self.call(
+                'GET /api/recipes/download_shopping_cart/{job}/', 'GET',
+                urlsplit(headers['location']).path, expected=(202, 303)
+            )
+
+    async def search(self):
+        word = self.random.choice(self.words)
+        for length in range(1, min(len(word), 4) + 1):
+            await self.call(
+                'GET /api/ingredients/?name', 'GET',
+                f'/api/ingredients/?name={quote(word[:length])}'
+            )
+
+    async def run(self, journeys, deadline):
+        names, weights = zip(*journeys)
+        while time.monotonic() < deadline:
+            journey = self.random.choices(names, weights)[0]
+            await getattr(self, journey)()
+            if self.think:
+                await asyncio.sleep(self.random.expovariate(1 / self.think))
+
+
+# Доли сценариев: чтение преобладает над записью.
+JOURNEYS = (
+    ('browse', 40),
+    ('detail', 30),
+    ('search', 15),
+    ('favorite', 10),
+    ('shopping_cart', 5),
+)
+
+
+async def load(args, stats):
+    users = [VirtualUser(number, args, stats) for number in range(args.users)]
+    for user in users:
+        await user.login()
+    if not any(user.tags for user in users):
+        print('На стенде нет тегов: рецепты листаются без фильтра.')
+    deadline = time.monotonic() + args.ramp + args.duration
+
+    async def start(user, delay):
+        await asyncio.sleep(delay)
+        try:
+            await user.run(JOURNEYS, deadline)
+        finally:
+            await user.client.close()
+
+    await asyncio.gather(*(
+        start(user, args.ramp * number / args.users)
+        for number, user in enumerate(users)
+    ))
+
+
+def load_slo(path):
+    slo = {name: dict(limits) for name, limits in DEFAULT_SLO.items()}
+    if path:
+        with open(path) as file:
+            for name, limits in json.load(file).items():
+                slo.setdefault(name, {}).update(limits)
+    return slo
+
+
+def check_slo(name, metrics, slo):
+    limits = {**slo['*'], **slo.get(name, {})}
+    return [
+        f'{metric} {metrics[metric]:.{3 if metric == "error_rate" else 0}f}'
+        f' > {limit}'
+        for metric, limit in limits.items() if metrics[metric] > limit
+    ]
+
+
+def compare(name, metrics, baseline, tolerance):
+    """Ухудшения относительно прогона из baseline больше tolerance."""
+    base = baseline.get(name)
+    if base is None:
+        return []
+    problems = [
+        f'{metric} {base[metric]:.0f} -> {metrics[metric]:.0f} ms'
+        for metric in ('p50', 'p95', 'p99')
+        if metrics[metric] > base[metric] * (1 + tolerance)
+    ]
+    if metrics['rps'] < base['rps'] * (1 - tolerance):
+        problems.append(f'rps {base["rps"]:.1f} -> {metrics["rps"]:.1f}')
+    if metrics['error_rate'] > base['error_rate'] + 0.001:
+        problems.append(
+            f'ошибки {base["error_rate"]:.3f} -> {metrics["error_rate"]:.3f}'
+        )
+    return problems
+
+
+def report(summary, slo, baseline, tolerance):
+    print(f'{"эндпоинт":48} {"запросов":>8} {"rps":>7} {"ошибки":>7} '
+          f'{"p50":>7} {"p95":>7} {"p99":>7}')
+    failures = []
+    for name, metrics in summary.items():
+        print(
+            f'{name:48} {metrics["requests"]:8} {metrics["rps"]:7.1f} '
+            f'{metrics["error_rate"] * 100:6.2f}% {metrics["p50"]:7.1f} '
+            f'{metrics["p95"]:7.1f} {metrics["p99"]:7.1f}'
+        )
+        for problem in check_slo(name, metrics, slo):
+            failures.append(f'SLO {name}: {problem}')
+        for problem in compare(name, metrics, baseline, tolerance):
+            failures.append(f'Регрессия {name}: {problem}')
+    total = sum(metrics['requests'] for metrics in summary.values())
+    errors = sum(metrics['requests'] * metrics['error_rate']
+                 for metrics in summary.values())
+    print(f'Всего {total} запросов, ошибок {errors:.0f}.')
+    for failure in failures:
+        print(failure)
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--url', default='http://127.0.0.1:8000')
+    parser.add_argument('--users', type=int, default=20,
+                        help='Число виртуальных пользователей.')
+    parser.add_argument('--duration', type=float, default=60)
+    parser.add_argument('--ramp', type=float, default=5,
+                        help='За сколько секунд подключаются пользователи.')
+    parser.add_argument('--think', type=float, default=0.5,
+                        help='Средняя пауза между сценариями, секунд.')
+    parser.add_argument('--timeout', type=float, default=30)
+    parser.add_argument('--slo', help='JSON с порогами по эндпоинтам.')
+    parser.add_argument('--baseline', help='Прогон для сравнения.')
+    parser.add_argument('--tolerance', type=float, default=0.1)
+    parser.add_argument('--save-baseline', help='Куда сохранить прогон.')
+    args = parser.parse_args()
+
+    stats = Stats()
+    asyncio.run(load(args, stats))
+    # Во время разгона работает в среднем половина пользователей.
+    summary = stats.summary(args.duration + args.ramp / 2)
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+    failures = report(summary, load_slo(args.slo), baseline, args.tolerance)
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as file:
+            json.dump(summary, file, ensure_ascii=False, indent=2)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,155 @@
+"""Сравнение WSGI и ASGI на горячих GET-эндпоинтах.
+
+Поднимает gunicorn по очереди с профилями foodgram/gunicorn_wsgi.py
+и foodgram/gunicorn_asgi.py на одной и той же базе из .env и держит
+заданное число одновременных соединений keep-alive. Для каждого
+эндпоинта выводит запросы в секунду, p50 и p99.
+
+    python benchmarks/read_path.py --concurrency 256 --duration 20
+
+С --url сервер не запускается, нагрузка идёт на уже работающий.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+from urllib.parse import urlsplit
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+PROFILES = (
+    ('wsgi', 'foodgram/gunicorn_wsgi.py', 'foodgram.wsgi:application'),
+    ('asgi', 'foodgram/gunicorn_asgi.py', 'foodgram.asgi:application'),
+)
+PATHS = (
+    '/api/recipes/',
+    '/api/recipes/?limit=6&page=2',
+    '/api/tags/',
+    '/api/ingredients/?name=а',
+)
+
+
+async def request(reader, writer, host, path, token):
+    headers = f'GET {path} HTTP/1.1\r\nHost: {host}\r\n'
+    headers += 'Accept: application/json\r\n'
+    if token:
+        headers += f'Authorization: Token {token}\r\n'
+    writer.write((headers + '\r\n').encode())
+    await writer.drain()
+    status_line = await reader.readline()
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b''):
+            break
+        name, _, value = line.decode().partition(':')
+        if name.lower() == 'content-length':
+            length = int(value)
+    await reader.readexactly(length)
+    return int(status_line.split()[1])
+
+
+async def client(url, path, token, deadline, latencies, errors):
+    parts = urlsplit(url)
+    reader, writer = await asyncio.open_connection(
+        parts.hostname, parts.port or 80
+    )
+    try:
+        while time.monotonic() < deadline:
+            start = time.perf_counter()
+            status = await request(reader, writer, parts.netloc, path, token)
+            latencies.append(time.perf_counter() - start)
+            if status >= 400:
+                errors.append(status)
+    finally:
+        writer.close()
+
+
+async def load(url, path, concurrency, duration, token):
+    latencies, errors = [], []
+    deadline = time.monotonic() + duration
+    results = await asyncio.gather(
+        *(client(url, path, token, deadline, latencies, errors)
+          for _ in range(concurrency)),
+        return_exceptions=True,
+    )
+    failures = [result for result in results if result is not None]
+    return latencies, len(errors) + len(failures)
+
+
+def report(profile, path, latencies, errors, duration):
+    if len(latencies) < 2:
+        print(f'{profile:5} {path:32} нет успешных ответов, ошибок: {errors}')
+        return
+    quantiles = statistics.quantiles(latencies, n=100)
+    print(
+        f'{profile:5} {path:32} {len(latencies) / duration:9.1f} rps  '
+        f'p50 {quantiles[49] * 1000:7.1f} ms  '
+        f'p99 {quantiles[98] * 1000:7.1f} ms  ошибок {errors}'
+    )
+
+
+def wait_ready(url, timeout=30):
+    parts = urlsplit(url)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            asyncio.run(asyncio.wait_for(asyncio.open_connection(
+                parts.hostname, parts.port
+            ), 1))
+            return
+        except (OSError, asyncio.TimeoutError):
+            time.sleep(0.2)
+    raise RuntimeError(f'Сервер {url} не запустился')
+
+
+def run(url, args):
+    for path in args.paths:
+        latencies, errors = asyncio.run(load(
+            url, path, args.concurrency, args.duration, args.token
+        ))
+        yield path, latencies, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--url', help='Адрес уже запущенного сервера.')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--concurrency', type=int, default=256)
+    parser.add_argument('--duration', type=float, default=20)
+    parser.add_argument('--token', help='Токен для авторизованных запросов.')
+    parser.add_argument('--paths', nargs='+', default=PATHS)
+    args = parser.parse_args()
+
+    if args.url:
+        for path, latencies, errors in run(args.url, args):
+            report('-', path, latencies, errors, args.duration)
+        return
+
+    url = f'http://127.0.0.1:{args.port}'
+    for profile, config, application in PROFILES:
+        env = {**os.environ, 'GUNICORN_BIND': f'127.0.0.1:{args.port}',
+               'GUNICORN_WORKERS': str(args.workers),
+               # Замеряется пропускная способность, а не лимиты.
+               'THROTTLE_ANON_RATE': '1000000/s',
+               'THROTTLE_USER_RATE': '1000000/s'}
+        server = subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn', '-c', config, application,
+             '--log-level', 'warning'],
+            cwd=BASE_DIR, env=env,
+        )
+        try:
+            wait_ready(url)
+            for path, latencies, errors in run(url, args):
+                report(profile, path, latencies, errors, args.duration)
+        finally:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+"""Время рендеринга и размер ответа /api/recipes/?limit=100.
+
+Сравнивает стандартный JSONRenderer DRF с ORJSONRenderer на одних и тех
+же данных страницы и выводит размер тела без сжатия, с gzip и brotli,
+как их отдаёт CompressionMiddleware.
+
+    python benchmarks/render.py --seed 100 --repeat 200
+
+С --seed на время замера создаются синтетические рецепты; транзакция
+затем откатывается, база из .env не меняется.
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import django
+from django.db import transaction
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'foodgram.settings')
+django.setup()
+
+from rest_framework.renderers import JSONRenderer  # noqa: E402
+from rest_framework.test import APIRequestFactory  # noqa: E402
+
+from api.renderers import ORJSONRenderer  # noqa: E402
+from api.views import RecipeViewSet  # noqa: E402
+from foodgram.middleware import compress  # noqa: E402
+from recipes.models import (Ingredient, IngredientToRecipe, Recipe,  # noqa
+                            Tag, TagToRecipe)
+from users.models import User  # noqa: E402
+
+PATH = '/api/recipes/?limit=100'
+
+
+def seed(count):
+    author = User.objects.create(
+        username='bench', email='bench@example.com',
+        first_name='Бенч', last_name='Маркович'
+    )
+    tag = Tag.objects.create(name='Бенч', color='#E26C2D', slug='bench')
+    ingredients = Ingredient.objects.bulk_create(
+        Ingredient(name=f'Ингредиент {i}', measurement_unit='г')
+        for i in range(10)
+    )
+    for i in range(count):
+        recipe = Recipe.objects.create(
+            author=author, name=f'Рецепт {i}', cooking_time=10 + i % 50,
+            text=f'Шаг {i}. ' + 'Нарезать, перемешать и подавать. ' * 5,
+            # Файл не нужен: рендерится только URL изображения.
+            image='recipes/image/bench.png', image_variants={},
+        )
+        TagToRecipe.objects.create(tag=tag, recipe=recipe)
+        IngredientToRecipe.objects.bulk_create(
+            IngredientToRecipe(recipe=recipe, ingredient=ingredient,
+                               amount=100 + j)
+            for j, ingredient in enumerate(ingredients[:5 + i % 5])
+        )
+
+
+def page_data():
+    request = APIRequestFactory().get(PATH, SERVER_NAME='localhost')
+    response = RecipeViewSet.as_view({'get': 'list'})(request)
+    return response.data
+
+
+def measure(function, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        timings.append(time.perf_counter() - start)
+    return result, statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    with transaction.atomic():
+        if args.seed:
+            seed(args.seed)
+        data = page_data()
+        transaction.set_rollback(True)
+
+    print(f'{PATH}: рецептов на странице {len(data["results"])}')
+    for name, renderer in (('json', JSONRenderer()),
+                           ('orjson', ORJSONRenderer())):
+        content, render_time = measure(
+            lambda: renderer.render(data), args.repeat
+        )
+        print(f'{name:7} рендеринг {render_time * 1000:8.3f} ms  '
+              f'{len(content):8} байт')
+    for encoding in ('gzip', 'br'):
+        compressed, compress_time = measure(
+            lambda: compress(content, encoding), args.repeat
+        )
+        print(f'{encoding:7} сжатие    {compress_time * 1000:8.3f} ms  '
+              f'{len(compressed):8} байт')
+
+
+if __name__ == '__main__':
+    main()
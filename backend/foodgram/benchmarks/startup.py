@@ -0,0 +1,82 @@
+"""Время запуска: manage.py check и холодный старт воркера.
+
+Каждый замер - отдельный процесс Python на базе из .env. Холодный старт
+воркера - загрузка WSGI-приложения и первый запрос через него, как у
+свежего воркера gunicorn; с --warmup между ними выполняется прогрев
+recipes.warmup, как в хуке post_worker_init.
+
+    python benchmarks/startup.py --repeat 10
+    python benchmarks/startup.py --repeat 10 --warmup
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+PATHS = ('/api/recipes/', '/api/tags/', '/api/ingredients/?name=а')
+
+WORKER = '''
+import json, os, sys, time
+start = time.perf_counter()
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'foodgram.settings')
+from django.core.wsgi import get_wsgi_application
+application = get_wsgi_application()
+from django.test import RequestFactory
+timings = {'загрузка': time.perf_counter() - start}
+if sys.argv[1] == 'warmup':
+    mark = time.perf_counter()
+    from recipes.warmup import warmup
+    warmup()
+    timings['прогрев'] = time.perf_counter() - mark
+for path in sys.argv[2:]:
+    environ = RequestFactory(SERVER_NAME='localhost').get(path).environ
+    for attempt in ('первый', 'второй'):
+        mark = time.perf_counter()
+        response = application(environ, lambda status, headers: None)
+        b''.join(response)
+        response.close()
+        timings[f'{attempt} {path}'] = time.perf_counter() - mark
+print(json.dumps(timings))
+'''
+
+
+def run(command):
+    start = time.perf_counter()
+    result = subprocess.run(
+        command, cwd=BASE_DIR, capture_output=True, text=True, check=True
+    )
+    return time.perf_counter() - start, result.stdout
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--warmup', action='store_true')
+    parser.add_argument('--path', action='append', dest='paths')
+    args = parser.parse_args()
+
+    checks = [
+        run([sys.executable, 'manage.py', 'check'])[0]
+        for _ in range(args.repeat)
+    ]
+    print(f'manage.py check{"":23} {statistics.median(checks) * 1000:8.1f} ms')
+
+    samples = {}
+    for _ in range(args.repeat):
+        total, output = run([
+            sys.executable, '-c', WORKER,
+            'warmup' if args.warmup else 'cold', *(args.paths or PATHS)
+        ])
+        samples.setdefault('процесс целиком', []).append(total)
+        for name, seconds in json.loads(output).items():
+            samples.setdefault(name, []).append(seconds)
+    for name, values in samples.items():
+        print(f'{name:38} {statistics.median(values) * 1000:8.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,239 @@
+"""Пул соединений с базой внутри процесса и метрики соединений.
+
+Под ASGI синхронный код каждого запроса выполняется в новом потоке, а
+соединения Django привязаны к потоку: постоянные соединения
+(CONN_MAX_AGE) там не переиспользуются. Бэкенд foodgram.pooled_postgresql
+на закрытии соединения в конце запроса возвращает его в общий пул
+процесса, а следующий запрос берёт его оттуда без нового подключения.
+
+Метрики считаются в каждом процессе отдельно; их отдаёт
+/api/metrics/db/ того воркера, который обработал запрос.
+"""
+import os
+import threading
+import time
+from collections import Counter
+
+from django.core.signals import request_started
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+pools = {}
+pools_lock = threading.Lock()
+counters = Counter()
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+def ping(raw):
+    cursor = raw.cursor()
+    try:
+        cursor.execute('SELECT 1')
+    finally:
+        cursor.close()
+
+
+class ConnectionPool:
+    """Не более max_size соединений на процесс. Свободные соединения
+       отдаются в порядке LIFO, чтобы лишние старели и закрывались
+       по max_age, а не держались открытыми по очереди."""
+
+    def __init__(self, max_size, timeout, max_age, health_checks):
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_age = max_age
+        self.health_checks = health_checks
+        self.condition = threading.Condition()
+        self.idle = []
+        self.opened_at = {}
+        self.size = 0
+        self.in_use = 0
+        self.waiting = 0
+        self.stats = Counter()
+        self.wait_max = 0.0
+
+    def acquire(self, connect):
+        deadline = time.monotonic() + self.timeout
+        while True:
+            raw = self.checkout(deadline)
+            if raw is None:
+                return self.open(connect)
+            if not self.health_checks or self.is_usable(raw):
+                self.stats['reused'] += 1
+                return raw
+            self.release(raw, reusable=False)
+
+    def checkout(self, deadline):
+        """Свободное соединение или None, если занято место под новое."""
+        start = time.monotonic()
+        with self.condition:
+            while not self.idle and self.size >= self.max_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.stats['timeouts'] += 1
+                    raise PoolTimeout(
+                        f'Нет свободного соединения за {self.timeout} с: '
+                        f'занято {self.in_use} из {self.max_size}'
+                    )
+                self.waiting += 1
+                self.condition.wait(remaining)
+                self.waiting -= 1
+            waited = time.monotonic() - start
+            self.stats['acquired'] += 1
+            self.stats['wait_seconds'] += waited
+            self.wait_max = max(self.wait_max, waited)
+            self.in_use += 1
+            if self.idle:
+                return self.idle.pop()
+            self.size += 1
+            return None
+
+    def open(self, connect):
+        try:
+            raw = connect()
+        except Exception:
+            with self.condition:
+                self.size -= 1
+                self.in_use -= 1
+                self.condition.notify()
+            raise
+        self.opened_at[id(raw)] = time.monotonic()
+        self.stats['created'] += 1
+        return raw
+
+    def release(self, raw, reusable=True):
+        opened_at = self.opened_at.get(id(raw), 0)
+        if reusable and self.max_age is not None:
+            reusable = time.monotonic() - opened_at < self.max_age
+        if reusable:
+            try:
+                # Незавершённая транзакция не должна достаться
+                # следующему запросу.
+                raw.rollback()
+            except Exception:
+                reusable = False
+        if not reusable:
+            self.opened_at.pop(id(raw), None)
+            self.stats['closed'] += 1
+            try:
+                raw.close()
+            except Exception:
+                pass
+        with self.condition:
+            self.in_use -= 1
+            if reusable:
+                self.idle.append(raw)
+            else:
+                self.size -= 1
+            self.condition.notify()
+
+    @staticmethod
+    def is_usable(raw):
+        try:
+            ping(raw)
+        except Exception:
+            return False
+        return True
+
+    def metrics(self):
+        with self.condition:
+            acquired = self.stats['acquired']
+            return {
+                'pool_size': self.max_size,
+                'open': self.size,
+                'in_use': self.in_use,
+                'idle': len(self.idle),
+                'waiting': self.waiting,
+                'saturation': round(self.in_use / self.max_size, 3),
+                'acquired': acquired,
+                'created': self.stats['created'],
+                'reused': self.stats['reused'],
+                'closed': self.stats['closed'],
+                'timeouts': self.stats['timeouts'],
+                'reuse_rate': round(
+                    self.stats['reused'] / acquired, 3
+                ) if acquired else None,
+                'wait_avg_ms': round(
+                    self.stats['wait_seconds'] / acquired * 1000, 3
+                ) if acquired else None,
+                'wait_max_ms': round(self.wait_max * 1000, 3),
+            }
+
+
+def get_pool(alias, settings_dict):
+    pool = pools.get(alias)
+    if pool is None:
+        with pools_lock:
+            pool = pools.get(alias)
+            if pool is None:
+                options = settings_dict.get('POOL', {})
+                pool = pools[alias] = ConnectionPool(
+                    max_size=options.get('MAX_SIZE', 10),
+                    timeout=options.get('TIMEOUT', 5),
+                    max_age=options.get('MAX_AGE'),
+                    health_checks=settings_dict['CONN_HEALTH_CHECKS'],
+                )
+    return pool
+
+
+class PooledConnectionMixin:
+    """Берёт сырое соединение из пула процесса и возвращает его туда
+       вместо закрытия. В DATABASES у алиаса должен быть CONN_MAX_AGE=0:
+       Django закрывает соединение в конце запроса, а живёт оно в пуле."""
+
+    @property
+    def pool(self):
+        return get_pool(self.alias, self.settings_dict)
+
+    def get_new_connection(self, conn_params):
+        try:
+            return self.pool.acquire(
+                lambda: super(PooledConnectionMixin, self).get_new_connection(
+                    conn_params
+                )
+            )
+        except PoolTimeout as error:
+            raise self.Database.OperationalError(str(error)) from error
+
+    def _close(self):
+        if self.connection is not None:
+            self.pool.release(
+                self.connection,
+                reusable=not self.errors_occurred or self.is_usable()
+            )
+
+
+def count_request(**kwargs):
+    counters['requests'] += 1
+
+
+def count_connection(sender, connection, **kwargs):
+    counters[f'connections:{connection.alias}'] += 1
+
+
+request_started.connect(count_request)
+connection_created.connect(count_connection)
+
+
+def connection_metrics():
+    """Метрики соединений процесса по алиасам баз."""
+    requests = counters['requests']
+    databases = {}
+    for alias in connections:
+        settings_dict = connections.settings[alias]
+        metrics = {
+            'conn_max_age': settings_dict['CONN_MAX_AGE'],
+            'health_checks': settings_dict['CONN_HEALTH_CHECKS'],
+        }
+        databases[alias] = metrics
+        if alias in pools:
+            metrics.update(pools[alias].metrics())
+            continue
+        created = metrics['created'] = counters[f'connections:{alias}']
+        if requests:
+            # Без пула соединение переиспользуется, если запрос не открыл
+            # новое; запросы без обращения к базе завышают оценку.
+            metrics['reuse_rate'] = round(max(0, 1 - created / requests), 3)
+    return {'pid': os.getpid(), 'requests': requests, 'databases': databases}
@@ -0,0 +1,71 @@
+"""Чтение с реплики для безопасных запросов к горячим вьюсетам.
+
+Вьюсет с ReplicaReadMixin включает чтение с реплики на время GET-запроса,
+если она настроена и пользователь не закреплён за основной базой.
+ReplicaPinMiddleware закрепляет пользователя на REPLICA_PIN_SECONDS после
+успешного изменяющего запроса. Метка ставится в подписанную cookie,
+которую клиент пришлёт любому воркеру, и в кеш по умолчанию - для
+клиентов без cookie она действует во всех воркерах, если кеш общий.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.core.cache import cache
+from django.db import connections
+
+from foodgram.settings import REPLICA_PIN_SECONDS
+
+REPLICA = 'replica'
+PIN_COOKIE = 'replica_pin'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+replica_reads = ContextVar('replica_reads', default=False)
+
+
+def pin_key(user):
+    return f'replica-pin:{user.pk}'
+
+
+def pin_to_primary(user, response):
+    cache.set(pin_key(user), True, REPLICA_PIN_SECONDS)
+    response.set_signed_cookie(
+        PIN_COOKIE, str(user.pk), salt=PIN_COOKIE,
+        max_age=REPLICA_PIN_SECONDS, httponly=True, samesite='Lax'
+    )
+
+
+def is_pinned(request, user):
+    # Срок cookie проверяется по времени подписи, а не только браузером.
+    if request.get_signed_cookie(
+        PIN_COOKIE, default=None, salt=PIN_COOKIE,
+        max_age=REPLICA_PIN_SECONDS
+    ) == str(user.pk):
+        return True
+    return bool(cache.get(pin_key(user)))
+
+
+def can_read_replica(request):
+    if request.method not in SAFE_METHODS or REPLICA not in connections:
+        return False
+    user = request.user
+    return not (user.is_authenticated and is_pinned(request, user))
+
+
+@contextmanager
+def reading_replica(request):
+    token = replica_reads.set(can_read_replica(request))
+    try:
+        yield
+    finally:
+        replica_reads.reset(token)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        return REPLICA if replica_reads.get() else 'default'
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
@@ -0,0 +1,31 @@
+"""Профиль запуска под ASGI с асинхронными GET-эндпоинтами.
+
+gunicorn -c foodgram/gunicorn_asgi.py foodgram.asgi:application
+"""
+import multiprocessing
+import os
+
+# Кеш в памяти у каждого воркера свой: инвалидация рассылается
+# остальным через сокеты в этом каталоге.
+INVALIDATION_CHANNEL = os.getenv(
+    'INVALIDATION_CHANNEL', '/tmp/foodgram-invalidation'
+)
+
+bind = os.getenv('GUNICORN_BIND', '0:8000')
+workers = int(os.getenv('GUNICORN_WORKERS', multiprocessing.cpu_count()))
+worker_class = 'uvicorn.workers.UvicornWorker'
+keepalive = 5
+# Под ASGI постоянные соединения Django не переиспользуются между
+# запросами, поэтому соединения держит пул процесса.
+raw_env = [
+    'ASYNC_READ_PATH=true',
+    f'DB_POOL_SIZE={os.getenv("DB_POOL_SIZE", 10)}',
+    f'INVALIDATION_CHANNEL={INVALIDATION_CHANNEL}',
+]
+
+
+def post_worker_init(worker):
+    # Django уже настроен: хук вызывается после загрузки приложения.
+    from recipes.warmup import warmup_worker
+
+    warmup_worker(worker.log)
@@ -0,0 +1,26 @@
+"""Профиль запуска под WSGI (по умолчанию в Dockerfile).
+
+gunicorn -c foodgram/gunicorn_wsgi.py foodgram.wsgi:application
+"""
+import multiprocessing
+import os
+
+# Кеш в памяти у каждого воркера свой: инвалидация рассылается
+# остальным через сокеты в этом каталоге.
+INVALIDATION_CHANNEL = os.getenv(
+    'INVALIDATION_CHANNEL', '/tmp/foodgram-invalidation'
+)
+
+bind = os.getenv('GUNICORN_BIND', '0:8000')
+workers = int(os.getenv('GUNICORN_WORKERS', multiprocessing.cpu_count()))
+worker_class = 'gthread'
+threads = int(os.getenv('GUNICORN_THREADS', 4))
+keepalive = 5
+raw_env = [f'INVALIDATION_CHANNEL={INVALIDATION_CHANNEL}']
+
+
+def post_worker_init(worker):
+    # Django уже настроен: хук вызывается после загрузки приложения.
+    from recipes.warmup import warmup_worker
+
+    warmup_worker(worker.log)
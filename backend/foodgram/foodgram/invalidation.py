@@ -0,0 +1,341 @@
+"""Инвалидация кешей по тегам зависимостей.
+
+Изменение модели превращается в набор тегов: модель целиком
+('recipes.recipe'), объект ('recipes.recipe:5') и зависимые данные
+('users.user:3:favorites'). Теги копятся до фиксации транзакции и затем
+публикуются один раз: у каждого тега в кеше меняется версия, а ключи,
+собранные versioned_key из прежних версий, становятся недостижимы.
+Откат транзакции ничего не публикует.
+
+Правила register(модель, поля, теги) задаются приложениями. Сохранение
+и удаление ловят сигналы, массовые операции - InvalidatingQuerySet,
+который нужно сделать менеджером модели. Каждый тег зависит ещё и от
+тега семейства ('recipes.recipe:*'): массовое обновление больше
+INVALIDATION_ROW_LIMIT строк инвалидирует семейства, не читая строки.
+
+Кеш по умолчанию живёт в памяти процесса, поэтому публикация
+рассылается и остальным воркерам хоста через INVALIDATION_CHANNEL -
+каталог Unix-сокетов, по одному на процесс. Это локальная замена
+pub/sub внешнего брокера с тем же интерфейсом send/listen.
+"""
+import atexit
+import logging
+import os
+import socket
+import threading
+import time
+from hashlib import md5
+
+import orjson
+from django.core.cache import caches
+from django.db import connections, models, transaction
+from django.db.models.signals import post_delete, post_save
+
+from foodgram.settings import (INVALIDATION_CACHE, INVALIDATION_CHANNEL,
+                               INVALIDATION_ROW_LIMIT)
+
+VERSION_PREFIX = 'version:'
+# Теги одной датаграммы; большие публикации делятся на несколько.
+TAGS_PER_MESSAGE = 200
+MISSING = object()
+
+logger = logging.getLogger(__name__)
+rules = {}
+
+
+def cache():
+    return caches[INVALIDATION_CACHE]
+
+
+def bump(tags):
+    """Новые версии тегов. Время в наносекундах, а не счётчик: версия,
+       вытесненная из кеша, не вернётся к старому значению."""
+    version = time.time_ns()
+    cache().set_many(
+        {VERSION_PREFIX + tag: version for tag in tags}, timeout=None
+    )
+
+
+def family(tag):
+    """'recipes.recipe:5' и 'users.user:3:favorites' - из семейств
+       'recipes.recipe:*' и 'users.user:*'."""
+    return tag.split(':', 1)[0] + ':*'
+
+
+def versions(tags):
+    keys = [VERSION_PREFIX + tag for tag in tags]
+    found = cache().get_many(keys)
+    missing = {key: time.time_ns() for key in keys if key not in found}
+    if missing:
+        cache().set_many(missing, timeout=None)
+        found.update(missing)
+    return [found[key] for key in keys]
+
+
+def versioned_key(key, tags):
+    """Ключ кеша, который меняется при инвалидации любого из тегов.
+       Версии читаются до вычисления значения: запись, посчитанная
+       по данным до изменения, ляжет под уже устаревший ключ."""
+    tags = sorted(set(tags) | {family(tag) for tag in tags})
+    digest = md5(
+        '|'.join(f'{tag}={version}' for tag, version in zip(
+            tags, versions(tags)
+        )).encode()
+    ).hexdigest()
+    return f'{key}:{digest}'
+
+
+def cached(key, tags, compute, timeout=None):
+    full_key = versioned_key(key, tags)
+    value = cache().get(full_key, MISSING)
+    if value is MISSING:
+        value = compute()
+        cache().set(full_key, value, timeout)
+    return value
+
+
+def unlink(path):
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+
+class LocalChannel:
+    """Без рассылки: инвалидация только в текущем процессе."""
+
+    def send(self, tags):
+        pass
+
+    def listen(self, receive):
+        pass
+
+
+class SocketChannel:
+    """Датаграммы Unix-сокетов в общем каталоге: процесс слушает
+       сокет <pid>.sock и рассылает публикации всем остальным."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.pid = None
+        self.sender = None
+
+    def path(self, pid):
+        return os.path.join(self.directory, f'{pid}.sock')
+
+    def send(self, tags):
+        if self.sender is None or self.pid != os.getpid():
+            self.pid = os.getpid()
+            self.sender = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            # Публикация идёт в on_commit запроса: зависший получатель
+            # с полной очередью не должен его останавливать.
+            self.sender.setblocking(False)
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return
+        tags = sorted(tags)
+        messages = [
+            orjson.dumps(tags[start:start + TAGS_PER_MESSAGE])
+            for start in range(0, len(tags), TAGS_PER_MESSAGE)
+        ]
+        own = f'{self.pid}.sock'
+        for name in names:
+            if name == own or not name.endswith('.sock'):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                for message in messages:
+                    self.sender.sendto(message, path)
+            except (ConnectionRefusedError, FileNotFoundError):
+                # Процесс завершился, не убрав сокет.
+                unlink(path)
+            except BlockingIOError:
+                # Очередь получателя переполнена: он завис, и ждать
+                # его нельзя.
+                logger.warning('Инвалидация не доставлена в %s', path)
+
+    def listen(self, receive):
+        os.makedirs(self.directory, exist_ok=True)
+        path = self.path(os.getpid())
+        unlink(path)
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        listener.bind(path)
+        atexit.register(unlink, path)
+
+        def run():
+            # Ошибка одного сообщения не останавливает приём, а если
+            # поток всё же завершится, сокет удаляется: иначе остальные
+            # слали бы в него, не зная, что он никем не читается.
+            try:
+                while True:
+                    message = listener.recv(65536)
+                    try:
+                        receive(orjson.loads(message))
+                    except Exception:
+                        logger.exception('Ошибка обработки инвалидации')
+            finally:
+                listener.close()
+                unlink(path)
+
+        threading.Thread(
+            target=run, name='cache-invalidation', daemon=True
+        ).start()
+
+
+class InvalidationBus:
+    def __init__(self, channel):
+        self.channel = channel
+        self.subscribers = []
+
+    def subscribe(self, callback, remote_only=False):
+        """callback(теги) после публикации; с remote_only - только для
+           публикаций других процессов."""
+        self.subscribers.append((callback, remote_only))
+
+    def publish(self, tags):
+        bump(tags)
+        self.notify(tags, remote=False)
+        self.channel.send(tags)
+
+    def receive(self, tags):
+        bump(tags)
+        try:
+            self.notify(tags, remote=True)
+        finally:
+            # Подписчики читали базу в потоке канала.
+            connections.close_all()
+
+    def notify(self, tags, remote):
+        for callback, remote_only in self.subscribers:
+            if remote or not remote_only:
+                callback(tags)
+
+    def listen(self):
+        """Начинает принимать публикации других процессов; вызывается
+           в воркере после fork."""
+        self.channel.listen(self.receive)
+
+
+bus = InvalidationBus(
+    SocketChannel(INVALIDATION_CHANNEL) if INVALIDATION_CHANNEL
+    else LocalChannel()
+)
+
+
+class PendingTags:
+    """Теги транзакции; публикуются одним вызовом после фиксации."""
+
+    def __init__(self):
+        self.tags = set()
+
+    def publish(self):
+        bus.publish(self.tags)
+
+
+def invalidate(tags, using='default'):
+    tags = set(tags)
+    if not tags:
+        return
+    connection = connections[using]
+    if not connection.in_atomic_block:
+        bus.publish(tags)
+        return
+    pending = getattr(connection, 'pending_invalidation', None)
+    # Откат (в том числе до точки сохранения) убирает колбэк
+    # из run_on_commit - тогда копим теги заново.
+    if pending is None or not any(
+        callback == pending.publish
+        for _, callback, _ in connection.run_on_commit
+    ):
+        pending = connection.pending_invalidation = PendingTags()
+        transaction.on_commit(pending.publish, using=using)
+    pending.tags.update(tags)
+
+
+def model_tags(model, rows):
+    """Теги строк модели: rows - кортежи значений полей правила."""
+    fields, extra, _ = rules[model]
+    label = model._meta.label_lower
+    tags = {label}
+    for row in rows:
+        # bulk_create с ignore_conflicts не возвращает pk.
+        if row[0] is not None:
+            tags.add(f'{label}:{row[0]}')
+        tags.update(extra(*row))
+    return tags
+
+
+def family_tags(model):
+    """Теги для изменения неизвестного набора строк модели."""
+    label = model._meta.label_lower
+    return {label, f'{label}:*', *(
+        f'{name}:*' for name in rules[model][2]
+    )}
+
+
+def instance_row(model, instance):
+    return tuple(getattr(instance, field) for field in rules[model][0])
+
+
+def on_save(sender, instance, using, **kwargs):
+    invalidate(model_tags(sender, [instance_row(sender, instance)]), using)
+
+
+def on_delete(sender, instance, using, **kwargs):
+    invalidate(model_tags(sender, [instance_row(sender, instance)]), using)
+
+
+def register(model, fields=('pk',), tags=lambda *row: (), families=()):
+    """Правило инвалидации модели. fields - поля строки, первое - pk;
+       tags(*значения полей) - зависимые теги помимо модели и объекта,
+       families - их семейства ('users.user' для 'users.user:3:recipes').
+    """
+    rules[model] = (fields, tags, families)
+    post_save.connect(on_save, sender=model,
+                      dispatch_uid=f'invalidate-save-{model._meta.label}')
+    post_delete.connect(on_delete, sender=model,
+                        dispatch_uid=f'invalidate-del-{model._meta.label}')
+
+
+class InvalidatingQuerySet(models.QuerySet):
+    """Массовые операции, минующие сигналы, тоже инвалидируют кеш.
+       delete() отдельно не нужен: при подписчиках post_delete Django
+       удаляет построчно и шлёт сигналы."""
+
+    def rows(self, objs):
+        return [instance_row(self.model, obj) for obj in objs]
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = super().bulk_create(objs, *args, **kwargs)
+        if self.model in rules:
+            invalidate(model_tags(self.model, self.rows(objs)), self.db)
+        return objs
+
+    def bulk_update(self, objs, *args, **kwargs):
+        objs = list(objs)
+        updated = super().bulk_update(objs, *args, **kwargs)
+        if self.model in rules:
+            invalidate(model_tags(self.model, self.rows(objs)), self.db)
+        return updated
+
+    def update(self, **kwargs):
+        if self.model not in rules:
+            return super().update(**kwargs)
+        fields = rules[self.model][0]
+        # Затронутые строки нужно знать до изменения, а если меняются
+        # поля правила - и после. Большие обновления не читаются.
+        rows = list(self.values_list(*fields)[:INVALIDATION_ROW_LIMIT + 1])
+        updated = super().update(**kwargs)
+        if len(rows) > INVALIDATION_ROW_LIMIT:
+            invalidate(family_tags(self.model), self.db)
+            return updated
+        changed = {
+            self.model._meta.get_field(name).attname for name in kwargs
+        }
+        if changed & set(fields):
+            rows += self.model._base_manager.using(self.db).filter(
+                pk__in=[row[0] for row in rows]
+            ).values_list(*fields)
+        invalidate(model_tags(self.model, rows), self.db)
+        return updated
@@ -0,0 +1,118 @@
+import gzip
+import math
+
+from django.db import connections
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+
+from foodgram.db_router import REPLICA, SAFE_METHODS, pin_to_primary
+from foodgram.settings import COMPRESSION_MIN_SIZE
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_TYPES = (
+    'application/json', 'application/javascript', 'application/xml',
+    'image/svg+xml', 'text/',
+)
+BROTLI_QUALITY = 5
+GZIP_LEVEL = 6
+
+
+def accepted_encodings(header):
+    """Кодировки из Accept-Encoding с ненулевым q."""
+    accepted = {}
+    for item in header.split(','):
+        coding, *params = (part.strip() for part in item.split(';'))
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition('=')
+            if name.strip() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if coding:
+            accepted[coding.lower()] = quality
+    wildcard = accepted.pop('*', 0.0)
+    return {
+        coding: accepted.get(coding, wildcard)
+        for coding in ('br', 'gzip')
+        if accepted.get(coding, wildcard) > 0
+    }
+
+
+def choose_encoding(header):
+    accepted = accepted_encodings(header)
+    if brotli is None:
+        accepted.pop('br', None)
+    if not accepted:
+        return None
+    # При равном q предпочитаем brotli: он плотнее на JSON.
+    return max(accepted, key=lambda coding: (accepted[coding], coding == 'br'))
+
+
+def compress(content, encoding):
+    if encoding == 'br':
+        return brotli.compress(content, quality=BROTLI_QUALITY)
+    return gzip.compress(content, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+class CompressionMiddleware(MiddlewareMixin):
+    """Сжимает текстовые ответы brotli или gzip по Accept-Encoding.
+
+    Ответы меньше COMPRESSION_MIN_SIZE байт отдаются как есть: на них
+    заголовки и время сжатия дороже выигрыша.
+    """
+
+    def process_response(self, request, response):
+        if (response.streaming
+                or response.has_header('Content-Encoding')
+                or len(response.content) < COMPRESSION_MIN_SIZE
+                or not response.get('Content-Type', '').startswith(
+                    COMPRESSIBLE_TYPES)):
+            return response
+        patch_vary_headers(response, ('Accept-Encoding',))
+        encoding = choose_encoding(
+            request.META.get('HTTP_ACCEPT_ENCODING', '')
+        )
+        if encoding is None:
+            return response
+        compressed = compress(response.content, encoding)
+        if len(compressed) >= len(response.content):
+            return response
+        response.content = compressed
+        response['Content-Length'] = str(len(compressed))
+        response['Content-Encoding'] = encoding
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        return response
+
+
+class RateLimitHeadersMiddleware(MiddlewareMixin):
+    """Заголовки X-RateLimit-* по самому строгому лимиту запроса."""
+
+    def process_response(self, request, response):
+        rate_limit = getattr(request, 'rate_limit', None)
+        if rate_limit is not None:
+            limit, remaining, reset = rate_limit
+            response['X-RateLimit-Limit'] = str(limit)
+            response['X-RateLimit-Remaining'] = str(remaining)
+            response['X-RateLimit-Reset'] = str(math.ceil(reset))
+        return response
+
+
+class ReplicaPinMiddleware(MiddlewareMixin):
+    """После успешной записи пользователь читает с основной базы."""
+
+    def process_response(self, request, response):
+        user = getattr(request, 'user', None)
+        if (request.method not in SAFE_METHODS
+                and response.status_code < 400
+                and user is not None and user.is_authenticated
+                and REPLICA in connections):
+            pin_to_primary(user, response)
+        return response
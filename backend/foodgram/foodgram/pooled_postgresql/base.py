@@ -0,0 +1,18 @@
+"""PostgreSQL с пулом соединений процесса, см. foodgram.db_pool."""
+from django.db.backends.postgresql import base
+
+from foodgram.db_pool import PooledConnectionMixin
+
+
+class DatabaseWrapper(PooledConnectionMixin, base.DatabaseWrapper):
+
+    def get_new_connection(self, conn_params):
+        connection = super().get_new_connection(conn_params)
+        # Уровень изоляции выставляет только подключение; для соединения
+        # из пула восстанавливаем его по OPTIONS так же.
+        self.isolation_level = base.IsolationLevel(
+            self.settings_dict['OPTIONS'].get(
+                'isolation_level', base.IsolationLevel.READ_COMMITTED
+            )
+        )
+        return connection
@@ -32,6 +32,9 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'foodgram.middleware.CompressionMiddleware',
+    'foodgram.middleware.RateLimitHeadersMiddleware',
+    'foodgram.middleware.ReplicaPinMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -60,6 +63,11 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'foodgram.wsgi.application'
 
+ASGI_APPLICATION = 'foodgram.asgi.application'
+
+# Асинхронные реализации GET-эндпоинтов для запуска под ASGI.
+ASYNC_READ_PATH = os.getenv('ASYNC_READ_PATH', 'false').lower() == 'true'
+
 DATABASES = {
     'default': {
         'ENGINE': os.getenv('DB_ENGINE'),
@@ -67,10 +75,52 @@ DATABASES = {
         'USER': os.getenv('POSTGRES_USER'),
         'PASSWORD': os.getenv('POSTGRES_PASSWORD'),
         'HOST': os.getenv('DB_HOST'),
-        'PORT': os.getenv('DB_PORT')
+        'PORT': os.getenv('DB_PORT'),
+        # Постоянные соединения: секунды жизни, 0 - закрывать после
+        # запроса. Проверка перед первым запросом отбрасывает соединение,
+        # разорванное базой за время простоя.
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', 60)),
+        'CONN_HEALTH_CHECKS': os.getenv(
+            'DB_CONN_HEALTH_CHECKS', 'true'
+        ).lower() == 'true',
     }
 }
 
+# Пул соединений процесса для ASGI-воркеров (только PostgreSQL):
+# DB_POOL_SIZE соединений на процесс, 0 - без пула. Соединение из пула
+# живёт DB_CONN_MAX_AGE секунд (0 - без ограничения), запрос ждёт
+# свободное не дольше DB_POOL_TIMEOUT секунд.
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 0))
+if DB_POOL_SIZE and DATABASES['default']['ENGINE'] in (
+        'django.db.backends.postgresql',
+        'django.db.backends.postgresql_psycopg2'):
+    DATABASES['default'].update({
+        'ENGINE': 'foodgram.pooled_postgresql',
+        'CONN_MAX_AGE': 0,
+        'POOL': {
+            'MAX_SIZE': DB_POOL_SIZE,
+            'TIMEOUT': float(os.getenv('DB_POOL_TIMEOUT', 5)),
+            'MAX_AGE': DATABASES['default']['CONN_MAX_AGE'] or None,
+        },
+    })
+
+# Реплика для чтения: задаётся DB_REPLICA_HOST (PostgreSQL) или
+# DB_REPLICA_NAME (например, второй файл SQLite для локальной проверки).
+if os.getenv('DB_REPLICA_HOST') or os.getenv('DB_REPLICA_NAME'):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'NAME': os.getenv('DB_REPLICA_NAME', DATABASES['default']['NAME']),
+        'HOST': os.getenv('DB_REPLICA_HOST', DATABASES['default']['HOST']),
+        'PORT': os.getenv('DB_REPLICA_PORT', DATABASES['default']['PORT']),
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['foodgram.db_router.ReplicaRouter']
+
+# Сколько секунд после записи пользователь читает с основной базы,
+# чтобы видеть свои изменения несмотря на отставание реплики.
+REPLICA_PIN_SECONDS = int(os.getenv('REPLICA_PIN_SECONDS', 5))
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -103,12 +153,23 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Уменьшенные копии изображений рецептов генерируются в фоне
+# пулом потоков процесса; оставшиеся - командой process_recipe_images.
+IMAGE_VARIANTS_INLINE = (
+    os.getenv('IMAGE_VARIANTS_INLINE', 'true').lower() == 'true'
+)
+IMAGE_VARIANTS_WORKERS = int(os.getenv('IMAGE_VARIANTS_WORKERS', 2))
+
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 AUTH_USER_MODEL = 'users.User'
 
 REST_FRAMEWORK = {
+    # Число прокси перед приложением (nginx): клиент для лимитов
+    # берётся из X-Forwarded-For с учётом только их записей, подделанный
+    # клиентом заголовок не меняет ключ. 0 - без прокси (runserver).
+    'NUM_PROXIES': int(os.getenv('NUM_PROXIES', 1)),
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
@@ -116,10 +177,99 @@ REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'rest_framework.authentication.TokenAuthentication',
     ],
+
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+
+    'DEFAULT_PARSER_CLASSES': [
+        'api.parsers.ORJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
+
+    'DEFAULT_THROTTLE_CLASSES': [
+        'api.throttling.AnonBucketThrottle',
+        'api.throttling.UserBucketThrottle',
+        'api.throttling.WriteBucketThrottle',
+    ],
+
+    'DEFAULT_THROTTLE_RATES': {
+        'anon': os.getenv('THROTTLE_ANON_RATE', '120/min'),
+        'user': os.getenv('THROTTLE_USER_RATE', '1200/min'),
+        'write': os.getenv('THROTTLE_WRITE_RATE', '60/min'),
+        'download': os.getenv('THROTTLE_DOWNLOAD_RATE', '10/hour'),
+        'export': os.getenv('THROTTLE_EXPORT_RATE', '20/hour'),
+    },
 }
 
+# Алиас из CACHES для общих на все воркеры лимитов; пустой - ведра
+# токенов в памяти каждого процесса.
+THROTTLE_CACHE = os.getenv('THROTTLE_CACHE', '')
+THROTTLE_MAX_KEYS = int(os.getenv('THROTTLE_MAX_KEYS', 100000))
+
+# Больше этого числа строк count в пагинации приблизительный.
+PAGINATION_EXACT_COUNT_LIMIT = int(
+    os.getenv('PAGINATION_EXACT_COUNT_LIMIT', 10000)
+)
+PAGINATION_COUNT_CACHE_TTL = int(os.getenv('PAGINATION_COUNT_CACHE_TTL', 60))
+
+# Алиас из CACHES для версий тегов инвалидации и закешированных по ним
+# данных.
+INVALIDATION_CACHE = os.getenv('INVALIDATION_CACHE', 'default')
+# Каталог Unix-сокетов для рассылки инвалидации воркерам хоста; пустой -
+# инвалидация только в своём процессе.
+INVALIDATION_CHANNEL = os.getenv('INVALIDATION_CHANNEL', '')
+# Больше этого числа строк update() инвалидирует модель и зависимые
+# семейства тегов целиком, не читая строки.
+INVALIDATION_ROW_LIMIT = int(os.getenv('INVALIDATION_ROW_LIMIT', 1000))
+
+# Наибольшее число id в ?ids= для пакетного чтения списков и авторов
+# в пакетной подписке.
+BATCH_IDS_LIMIT = int(os.getenv('BATCH_IDS_LIMIT', 100))
+
+# Ответы меньше этого размера в байтах не сжимаются.
+COMPRESSION_MIN_SIZE = int(os.getenv('COMPRESSION_MIN_SIZE', 1024))
+
 NAME_SHOPPING_CART_PDF = 'shopping_cart.pdf'
 
+SHOPPING_LIST_ASYNC = (
+    os.getenv('SHOPPING_LIST_ASYNC', 'false').lower() == 'true'
+)
+SHOPPING_LIST_RENDER_CONCURRENCY = int(
+    os.getenv('SHOPPING_LIST_RENDER_CONCURRENCY', 2)
+)
+SHOPPING_LIST_RENDER_TIMEOUT = int(
+    os.getenv('SHOPPING_LIST_RENDER_TIMEOUT', 30)
+)
+# Задание в работе дольше стольких секунд считается брошенным упавшим
+# воркером и снова попадает в очередь; должно превышать таймаут рендера.
+SHOPPING_LIST_JOB_STALE = int(os.getenv('SHOPPING_LIST_JOB_STALE', 300))
+# Через сколько секунд после завершения задание и его PDF удаляются.
+SHOPPING_LIST_JOB_TTL = int(os.getenv('SHOPPING_LIST_JOB_TTL', 24 * 60 * 60))
+
+# Должна совпадать с конфигурацией GIN-индекса в миграции recipes 0003.
+SEARCH_CONFIG = 'russian'
+SEARCH_RESULTS_LIMIT = int(os.getenv('SEARCH_RESULTS_LIMIT', 1000))
+
+SIMILAR_RECIPES_TOP = int(os.getenv('SIMILAR_RECIPES_TOP', 10))
+
+# Рецепты авторов, у которых подписчиков больше FEED_FANOUT_LIMIT,
+# не раскладываются по лентам, а подмешиваются при чтении.
+FEED_FANOUT_LIMIT = int(os.getenv('FEED_FANOUT_LIMIT', 10000))
+FEED_BACKFILL = int(os.getenv('FEED_BACKFILL', 50))
+FEED_PULL_AUTHORS_TTL = int(os.getenv('FEED_PULL_AUTHORS_TTL', 300))
+
+# /api/sync/: изменений за один ответ и сколько секунд запись журнала
+# выжидает, прежде чем попасть в ответ: транзакция с меньшим id может
+# зафиксироваться позже, и клиент не должен перескочить её токеном.
+SYNC_CHANGES_LIMIT = int(os.getenv('SYNC_CHANGES_LIMIT', 500))
+SYNC_SETTLE_SECONDS = float(os.getenv('SYNC_SETTLE_SECONDS', 2))
+
+TRENDING_HALF_LIFE_DAYS = float(os.getenv('TRENDING_HALF_LIFE_DAYS', 7))
+TRENDING_MIN_SCORE = float(os.getenv('TRENDING_MIN_SCORE', 0.01))
+
 DJOSER = {
     'HIDE_USERS': False,
     'LOGIN_FIELD': 'email',
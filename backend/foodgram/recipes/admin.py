@@ -1,13 +1,18 @@
 from django.contrib import admin
 from django.contrib.auth.models import Group
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
 from rest_framework.authtoken.models import TokenProxy
 
+from api.pagination import EstimatedCountPaginator
+
 from .models import (Favorite, Ingredient, IngredientToRecipe, Recipe,
                      ShopList, Tag)
 
 
 class IngredientInline(admin.TabularInline):
     model = IngredientToRecipe
+    autocomplete_fields = ('ingredient',)
 
 
 @admin.register(Recipe)
@@ -15,24 +20,41 @@ class RecipeAdmin(admin.ModelAdmin):
     """ Админ панель управления рецептами """
     list_display = ('name', 'author', 'cooking_time',
                     'in_favorite',)
-    list_filter = ('name', 'author', 'tags')
-    search_fields = ('name', 'author', 'tags')
+    list_filter = ('tags',)
+    list_select_related = ('author',)
+    search_fields = ('name', 'author__username')
+    autocomplete_fields = ('author',)
     inlines = (IngredientInline,)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     empty_value_display = '-пусто-'
     verbose_name = 'Рецепт'
     verbose_name_plural = 'Рецепты'
 
+    def get_queryset(self, request):
+        # Подзапрос считается только для строк страницы, в отличие
+        # от GROUP BY по всей таблице.
+        return super().get_queryset(request).annotate(
+            favorites_count=Coalesce(Subquery(
+                Favorite.objects.filter(recipe=OuterRef('pk')).order_by()
+                .values('recipe').annotate(count=Count('*'))
+                .values('count'),
+                output_field=IntegerField()
+            ), 0)
+        )
+
+    @admin.display(description='В избранном', ordering='favorites_count')
     def in_favorite(self, obj: Recipe):
-        return obj.favorites.count()
-
-    in_favorite.short_description = 'В избранном'
+        return obj.favorites_count
 
 
 class IngredientAdmin(admin.ModelAdmin):
     """ Админ панель управления ингредиентами """
     list_display = ('id', 'name', 'measurement_unit')
     search_fields = ('name', )
-    list_filter = ('name', )
+    list_filter = ('measurement_unit', )
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     empty_value_display = '-пусто-'
 
 
@@ -45,16 +67,22 @@ class TagAdmin(admin.ModelAdmin):
 class FavoriteAdmin(admin.ModelAdmin):
     """ Админ панель управления подписками """
     list_display = ('user', 'recipe')
-    list_filter = ('user', 'recipe')
-    search_fields = ('user', 'recipe')
+    list_select_related = ('user', 'recipe')
+    search_fields = ('user__username', 'recipe__name')
+    autocomplete_fields = ('user', 'recipe')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     empty_value_display = '-пусто-'
 
 
 class ShoplistAdmin(admin.ModelAdmin):
     """ Админ панель списка покупок """
     list_display = ('recipe', 'user')
-    list_filter = ('recipe', 'user')
-    search_fields = ('user', )
+    list_select_related = ('recipe', 'user')
+    search_fields = ('user__username', )
+    autocomplete_fields = ('recipe', 'user')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     empty_value_display = '-пусто-'
 
 
@@ -0,0 +1,73 @@
+from django.db import transaction
+from django.db.models import F
+
+from .models import MediaBlob
+from .storage import recipe_image_storage
+
+
+def acquire(name, content=None):
+    """Учитывает ещё одну ссылку рецепта на файл. content - только что
+       загруженное содержимое: _save вернул имя существующего файла до
+       всяких блокировок, и release мог успеть его удалить, поэтому под
+       блокировкой строки файл проверяется и при нужде пишется заново."""
+    with transaction.atomic():
+        blob, _ = MediaBlob.objects.select_for_update().get_or_create(
+            name=name
+        )
+        MediaBlob.objects.filter(pk=blob.pk).update(
+            references=F('references') + 1
+        )
+        if content is not None and not recipe_image_storage.exists(name):
+            recipe_image_storage.restore(name, content)
+
+
+def acquire_many(counts):
+    """acquire для пачки: {файл: число новых ссылок}."""
+    counts = {name: count for name, count in counts.items() if name}
+    if not counts:
+        return
+    with transaction.atomic():
+        MediaBlob.objects.bulk_create(
+            [MediaBlob(name=name) for name in counts], ignore_conflicts=True
+        )
+        by_count = {}
+        for name, count in counts.items():
+            by_count.setdefault(count, []).append(name)
+        for count, names in by_count.items():
+            MediaBlob.objects.filter(name__in=names).update(
+                references=F('references') + count
+            )
+
+
+def release(name):
+    """Снимает ссылку; файл без ссылок удаляется после фиксации
+       транзакции. Файлы, загруженные до учёта ссылок, не трогаются -
+       их убирает команда gc_media."""
+    with transaction.atomic():
+        blob = MediaBlob.objects.select_for_update().filter(
+            name=name
+        ).first()
+        if blob is None:
+            return
+        MediaBlob.objects.filter(pk=blob.pk).update(
+            references=F('references') - 1
+        )
+        if blob.references > 1:
+            return
+    transaction.on_commit(lambda: delete_unreferenced(name))
+
+
+def delete_unreferenced(name):
+    """Удаляет файл, если на него так и не появилось ссылок. Строка
+       с нулём ссылок живёт до этой проверки: параллельная загрузка
+       того же содержимого успевает взять ссылку, и файл остаётся."""
+    with transaction.atomic():
+        blob = MediaBlob.objects.select_for_update().filter(
+            name=name, references=0
+        ).first()
+        if blob is None:
+            return
+        # Файл удаляется под блокировкой строки: acquire, ждущий её,
+        # затем увидит, что файла нет, и запишет загруженный заново.
+        recipe_image_storage.delete(name)
+        blob.delete()
@@ -0,0 +1,92 @@
+"""Журнал изменений для /api/sync/.
+
+Записи добавляются сигналами в той же транзакции, что и изменение.
+Клиент передаёт id последней полученной записи и читает следующие
+диапазоном по индексу (user, id): публичные записи с user IS NULL
+и свои. compact() удаляет записи, перекрытые более новыми о том же
+объекте: последняя запись несёт итоговое состояние, поэтому токены
+клиентов после сжатия остаются действительными.
+"""
+from datetime import timedelta
+
+from django.db.models import Exists, OuterRef, QuerySet
+from django.utils import timezone
+
+from foodgram.settings import SYNC_CHANGES_LIMIT, SYNC_SETTLE_SECONDS
+from users.models import User
+
+from .models import Change
+
+
+def record(kind, object_id, deleted=False, user_id=None):
+    Change.objects.create(
+        kind=kind, object_id=object_id, deleted=deleted, user_id=user_id
+    )
+
+
+def record_many(kind, object_ids, user_id=None):
+    """Для массовых вставок, которые не шлют сигналов."""
+    Change.objects.bulk_create(
+        Change(kind=kind, object_id=object_id, user_id=user_id)
+        for object_id in object_ids
+    )
+
+
+def owner_deleted(origin, user_id):
+    """Строка удаляется вместе с владельцем: его записи журнала уже
+       удалены каскадом, и новая сослалась бы на удаляемого
+       пользователя."""
+    if isinstance(origin, User):
+        return origin.pk == user_id
+    if isinstance(origin, QuerySet) and origin.model is User:
+        return origin.filter(pk=user_id).exists()
+    return False
+
+
+def latest_token():
+    settled = timezone.now() - timedelta(seconds=SYNC_SETTLE_SECONDS)
+    return Change.objects.filter(created__lte=settled).order_by(
+        '-id'
+    ).values_list('id', flat=True).first() or 0
+
+
+def changes_since(user, since, limit=SYNC_CHANGES_LIMIT):
+    """Записи после since по возрастанию id, не больше limit.
+
+    Возвращает (записи, новый токен, есть ли ещё). Выдача обрывается
+    на первой записи моложе SYNC_SETTLE_SECONDS; она придёт в одном из
+    следующих запросов.
+    """
+    settled = timezone.now() - timedelta(seconds=SYNC_SETTLE_SECONDS)
+    owners = [Change.objects.filter(user__isnull=True)]
+    if user.is_authenticated:
+        owners.append(Change.objects.filter(user=user))
+    rows = []
+    for queryset in owners:
+        rows += queryset.filter(id__gt=since).order_by('id').values_list(
+            'id', 'kind', 'object_id', 'deleted', 'created'
+        )[:limit + 1]
+    rows.sort()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    for position, row in enumerate(rows):
+        if row[4] > settled:
+            rows, has_more = rows[:position], False
+            break
+    return rows, rows[-1][0] if rows else since, has_more
+
+
+def compact():
+    """Удаляет записи, за которыми есть более новые о том же объекте
+       того же пользователя. Возвращает число удалённых записей."""
+    newer = Change.objects.filter(
+        kind=OuterRef('kind'), object_id=OuterRef('object_id'),
+        id__gt=OuterRef('id')
+    )
+    deleted, _ = Change.objects.filter(user__isnull=True).filter(
+        Exists(newer.filter(user__isnull=True))
+    ).delete()
+    personal, _ = Change.objects.filter(user__isnull=False).filter(
+        Exists(newer.filter(user=OuterRef('user')))
+    ).delete()
+    return deleted + personal
@@ -0,0 +1,127 @@
+from heapq import merge
+from itertools import islice
+
+from django.core.cache import cache
+from django.db.models import Count, F, Q, Window
+from django.db.models.functions import RowNumber
+
+from foodgram.settings import (FEED_BACKFILL, FEED_FANOUT_LIMIT,
+                               FEED_PULL_AUTHORS_TTL)
+from users.models import Follow
+
+from .models import FeedEntry, Recipe
+
+PULL_AUTHORS_KEY = 'feed:pull_authors'
+FANOUT_BATCH_SIZE = 5000
+
+
+def pull_authors():
+    """Авторы с большим числом подписчиков, чьи рецепты
+       подмешиваются в ленту при чтении, а не при записи."""
+    authors = cache.get(PULL_AUTHORS_KEY)
+    if authors is None:
+        authors = frozenset(Follow.objects.values('author').annotate(
+            followers=Count('id')
+        ).filter(
+            followers__gt=FEED_FANOUT_LIMIT
+        ).values_list('author', flat=True))
+        cache.set(PULL_AUTHORS_KEY, authors, FEED_PULL_AUTHORS_TTL)
+    return authors
+
+
+def fan_out(recipe):
+    """Раскладывает новый рецепт по лентам подписчиков автора."""
+    if recipe.author_id in pull_authors():
+        return
+    followers = Follow.objects.filter(
+        author_id=recipe.author_id
+    ).values_list('username_id', flat=True).iterator(
+        chunk_size=FANOUT_BATCH_SIZE
+    )
+    entries = (
+        FeedEntry(user_id=user_id, recipe_id=recipe.id,
+                  author_id=recipe.author_id, pub_date=recipe.pub_date)
+        for user_id in followers
+    )
+    while True:
+        batch = list(islice(entries, FANOUT_BATCH_SIZE))
+        if not batch:
+            break
+        FeedEntry.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def backfill(follow):
+    """Добавляет в ленту последние рецепты автора после подписки."""
+    backfill_authors(follow.username_id, [follow.author_id])
+
+
+def backfill_authors(user_id, author_ids):
+    """То же для нескольких авторов: последние FEED_BACKFILL рецептов
+       каждого выбираются одним запросом."""
+    author_ids = set(author_ids) - pull_authors()
+    if not author_ids:
+        return
+    recipes = Recipe.objects.filter(author_id__in=author_ids).annotate(
+        row=Window(
+            RowNumber(), partition_by=F('author'),
+            order_by=F('pub_date').desc()
+        )
+    ).filter(row__lte=FEED_BACKFILL).values_list(
+        'id', 'author_id', 'pub_date'
+    )
+    FeedEntry.objects.bulk_create(
+        [
+            FeedEntry(user_id=user_id, recipe_id=recipe_id,
+                      author_id=author_id, pub_date=pub_date)
+            for recipe_id, author_id, pub_date in recipes
+        ],
+        ignore_conflicts=True
+    )
+
+
+def unfollow(follow):
+    FeedEntry.objects.filter(
+        user_id=follow.username_id, author_id=follow.author_id
+    ).delete()
+
+
+def read_feed(user, limit, position=None):
+    """Возвращает позиции (pub_date, id рецепта) следующей страницы ленты.
+
+    Лента пользователя читается одним диапазоном индекса, рецепты
+    популярных авторов из подписок выбираются отдельно и сливаются
+    с ней по дате публикации.
+    """
+    entries = FeedEntry.objects.filter(user=user)
+    if position:
+        pub_date, recipe_id = position
+        entries = entries.filter(
+            Q(pub_date__lt=pub_date)
+            | Q(pub_date=pub_date, recipe_id__lt=recipe_id)
+        )
+    streams = [entries.order_by('-pub_date', '-recipe_id').values_list(
+        'pub_date', 'recipe_id'
+    )[:limit]]
+    authors = pull_authors()
+    if authors:
+        pulled = Recipe.objects.filter(
+            author__in=Follow.objects.filter(
+                username=user, author__in=authors
+            ).values('author')
+        )
+        if position:
+            pulled = pulled.filter(
+                Q(pub_date__lt=pub_date)
+                | Q(pub_date=pub_date, id__lt=recipe_id)
+            )
+        streams.append(pulled.order_by('-pub_date', '-id').values_list(
+            'pub_date', 'id'
+        )[:limit])
+    page, seen = [], set()
+    for item in merge(*streams, reverse=True):
+        if item[1] not in seen:
+            seen.add(item[1])
+            page.append(item)
+        if len(page) == limit:
+            break
+    return page
@@ -0,0 +1,141 @@
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from pathlib import PurePosixPath
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+
+from foodgram.settings import IMAGE_VARIANTS_WORKERS
+
+from .changes import record
+from .models import Change, Recipe
+
+VARIANTS = (('card', 480), ('detail', 960), ('retina', 1920))
+FORMATS = (
+    ('webp', 'WEBP', {'quality': 80, 'method': 4}),
+    ('jpeg', 'JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+)
+VARIANTS_DIR = 'recipes/image/variants'
+
+executor = None
+
+
+def variants_dir(recipe_id):
+    return f'{VARIANTS_DIR}/{recipe_id}'
+
+
+def generate_variants(recipe_id):
+    """Создаёт копии изображения рецепта под размеры карточки,
+       страницы рецепта и экранов высокой плотности в WebP и JPEG."""
+    # Pillow нужен только здесь; сериализаторам хватает srcset.
+    from PIL import Image, ImageOps
+
+    recipe = Recipe.objects.only('id', 'image').get(id=recipe_id)
+    with recipe.image.open('rb') as source:
+        image = ImageOps.exif_transpose(Image.open(source))
+        image.load()
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+    stem = PurePosixPath(recipe.image.name).stem
+    variants, widths = {}, set()
+    for name, width in VARIANTS:
+        width = min(width, image.width)
+        if width in widths:
+            continue
+        widths.add(width)
+        resized = image.resize(
+            (width, max(round(image.height * width / image.width), 1)),
+            Image.LANCZOS
+        ) if width < image.width else image
+        for extension, image_format, options in FORMATS:
+            output = BytesIO()
+            resized.save(output, image_format, **options)
+            path = default_storage.save(
+                f'{variants_dir(recipe.id)}/{stem}-{name}.{extension}',
+                ContentFile(output.getvalue())
+            )
+            variants.setdefault(extension, {})[name] = {
+                'path': path, 'width': width
+            }
+    paths = [
+        variant['path']
+        for sizes in variants.values() for variant in sizes.values()
+    ]
+    with transaction.atomic():
+        updated = Recipe.objects.filter(
+            id=recipe.id, image=recipe.image.name
+        ).update(image_variants=variants)
+        if updated:
+            # srcset рецепта изменился, клиентам нужно его перечитать.
+            record(Change.RECIPE, recipe.id)
+    if not updated:
+        # Изображение заменили, пока шла генерация.
+        for path in paths:
+            default_storage.delete(path)
+        return None
+    remove_stale_variants(recipe.id, paths)
+    return variants
+
+
+def remove_stale_variants(recipe_id, kept):
+    directory = variants_dir(recipe_id)
+    try:
+        _, files = default_storage.listdir(directory)
+    except FileNotFoundError:
+        return
+    for name in files:
+        if f'{directory}/{name}' not in kept:
+            default_storage.delete(f'{directory}/{name}')
+
+
+def process(recipe_id):
+    """Генерирует копии; если изображение не читается, рецепт
+       помечается обработанным без копий."""
+    from PIL import Image
+
+    try:
+        return generate_variants(recipe_id)
+    except Recipe.DoesNotExist:
+        return None
+    except (OSError, ValueError, Image.DecompressionBombError):
+        Recipe.objects.filter(id=recipe_id).update(image_variants={})
+        raise
+
+
+def _process_in_background(recipe_id):
+    from PIL import Image
+
+    try:
+        process(recipe_id)
+    except (OSError, ValueError, Image.DecompressionBombError):
+        pass
+    finally:
+        connection.close()
+
+
+def schedule(recipe_id):
+    """Ставит генерацию копий в пул потоков процесса."""
+    global executor
+    if executor is None:
+        executor = ThreadPoolExecutor(
+            max_workers=IMAGE_VARIANTS_WORKERS,
+            thread_name_prefix='recipe-images'
+        )
+    executor.submit(_process_in_background, recipe_id)
+
+
+def srcset(variants, build_url=None):
+    """Значения srcset для каждого формата или None, пока копии
+       ещё не готовы."""
+    if not variants:
+        return None
+    build_url = build_url or (lambda url: url)
+    return {
+        extension: ', '.join(
+            f'{build_url(default_storage.url(variant["path"]))} '
+            f'{variant["width"]}w'
+            for variant in sizes.values()
+        )
+        for extension, sizes in variants.items()
+    }
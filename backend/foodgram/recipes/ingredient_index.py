@@ -0,0 +1,91 @@
+import heapq
+from array import array
+from bisect import bisect_left, insort
+from collections import Counter
+from threading import Lock
+
+from foodgram.settings import SEARCH_RESULTS_LIMIT
+
+from .models import IngredientToRecipe
+
+
+class IngredientIndex:
+    """Индекс ингредиент -> отсортированный массив id рецептов.
+
+    Позволяет подобрать рецепты по имеющимся продуктам без соединения
+    таблиц: списки рецептов для каждого ингредиента объединяются в памяти.
+    """
+
+    def __init__(self):
+        self.postings = {}
+        self.recipes = {}
+        self.is_built = False
+        self.lock = Lock()
+
+    def build(self):
+        rows = IngredientToRecipe.objects.order_by(
+            'recipe_id'
+        ).values_list('recipe_id', 'ingredient_id').iterator(chunk_size=10000)
+        postings, recipes = {}, {}
+        for recipe_id, ingredient_id in rows:
+            ingredients = recipes.setdefault(recipe_id, set())
+            if ingredient_id in ingredients:
+                continue
+            ingredients.add(ingredient_id)
+            postings.setdefault(ingredient_id, array('q')).append(recipe_id)
+        with self.lock:
+            self.postings = postings
+            self.recipes = {
+                recipe_id: tuple(ingredients)
+                for recipe_id, ingredients in recipes.items()
+            }
+            self.is_built = True
+
+    def update(self, recipe_id):
+        ingredients = tuple(set(IngredientToRecipe.objects.filter(
+            recipe_id=recipe_id
+        ).values_list('ingredient_id', flat=True)))
+        with self.lock:
+            self._remove(recipe_id)
+            for ingredient_id in ingredients:
+                insort(
+                    self.postings.setdefault(ingredient_id, array('q')),
+                    recipe_id
+                )
+            if ingredients:
+                self.recipes[recipe_id] = ingredients
+
+    def remove(self, recipe_id):
+        with self.lock:
+            self._remove(recipe_id)
+
+    def _remove(self, recipe_id):
+        for ingredient_id in self.recipes.pop(recipe_id, ()):
+            posting = self.postings[ingredient_id]
+            del posting[bisect_left(posting, recipe_id)]
+            if not posting:
+                del self.postings[ingredient_id]
+
+    def match(self, ingredients, max_missing=None,
+              limit=SEARCH_RESULTS_LIMIT):
+        """Возвращает id рецептов, отсортированные по доле имеющихся
+           ингредиентов, а при равенстве - по числу недостающих."""
+        if not self.is_built:
+            self.build()
+        hits = Counter()
+        with self.lock:
+            for ingredient_id in set(ingredients):
+                hits.update(self.postings.get(ingredient_id, ()))
+            candidates = []
+            for recipe_id, found in hits.items():
+                total = len(self.recipes[recipe_id])
+                missing = total - found
+                if max_missing is None or missing <= max_missing:
+                    candidates.append((found / total, -missing, recipe_id))
+        return [
+            recipe_id
+            for _, _, recipe_id in heapq.nlargest(limit, candidates)
+        ]
+
+
+ingredient_index = IngredientIndex()
@@ -0,0 +1,90 @@
+"""Правила инвалидации кеша для моделей рецептов и пользователей.
+
+Помимо тегов модели и объекта ('recipes.recipe', 'recipes.recipe:5'):
+- связи рецепта с тегами и ингредиентами - карточка рецепта;
+- переименование тега или ингредиента - все рецепты;
+- рецепт - список рецептов автора 'users.user:<id>:recipes';
+- избранное и корзина - 'users.user:<id>:favorites' и ':shopping_cart';
+- подписка - ':subscriptions' подписчика и ':followers' автора.
+m2m-операции (tags.set, add, remove) идут через модели связей, поэтому
+отдельный обработчик m2m_changed не нужен.
+"""
+from foodgram.invalidation import bus, register
+from users.models import Follow, User
+
+from .ingredient_index import ingredient_index
+from .models import (Favorite, Ingredient, IngredientToRecipe, Recipe,
+                     ShopList, Tag, TagToRecipe)
+from .search import recipe_index
+
+RECIPE_TAG = 'recipes.recipe:'
+
+
+def recipe_tags(pk, recipe_id):
+    return ('recipes.recipe', f'{RECIPE_TAG}{recipe_id}')
+
+
+def all_recipes(pk):
+    return ('recipes.recipe',)
+
+
+def user_tag(section):
+    return lambda pk, user_id: (f'users.user:{user_id}:{section}',)
+
+
+register(User)
+register(Recipe, ('pk', 'author_id'),
+         lambda pk, author_id: (f'users.user:{author_id}:recipes',),
+         families=('users.user',))
+register(Tag, tags=all_recipes, families=('recipes.recipe',))
+register(Ingredient, tags=all_recipes, families=('recipes.recipe',))
+register(TagToRecipe, ('pk', 'recipe_id'), recipe_tags,
+         families=('recipes.recipe',))
+register(IngredientToRecipe, ('pk', 'recipe_id'), recipe_tags,
+         families=('recipes.recipe',))
+register(Favorite, ('pk', 'user_id'), user_tag('favorites'),
+         families=('users.user',))
+register(ShopList, ('pk', 'user_id'), user_tag('shopping_cart'),
+         families=('users.user',))
+register(Follow, ('pk', 'username_id', 'author_id'),
+         lambda pk, username_id, author_id: (
+             f'users.user:{username_id}:subscriptions',
+             f'users.user:{author_id}:followers',
+         ),
+         families=('users.user',))
+
+
+def refresh_indexes(tags):
+    """Индексы в памяти следят за рецептами по публикациям шины: так
+       их обновляют и массовые операции, и изменения в других воркерах."""
+    if not (recipe_index.is_built or ingredient_index.is_built):
+        return
+    if f'{RECIPE_TAG}*' in tags:
+        # Массовое обновление без списка строк: индексы строятся заново.
+        if recipe_index.is_built:
+            recipe_index.build()
+        if ingredient_index.is_built:
+            ingredient_index.build()
+        return
+    recipe_ids = {
+        int(tag[len(RECIPE_TAG):]) for tag in tags
+        if tag.startswith(RECIPE_TAG)
+    }
+    if not recipe_ids:
+        return
+    recipes = Recipe.objects.only('id', 'name', 'text').prefetch_related(
+        'ingredients'
+    ).in_bulk(recipe_ids)
+    for recipe_id in recipe_ids:
+        recipe = recipes.get(recipe_id)
+        if recipe is None:
+            recipe_index.remove(recipe_id)
+            ingredient_index.remove(recipe_id)
+            continue
+        if recipe_index.is_built:
+            recipe_index.add(recipe)
+        if ingredient_index.is_built:
+            ingredient_index.update(recipe_id)
+
+
+bus.subscribe(refresh_indexes)
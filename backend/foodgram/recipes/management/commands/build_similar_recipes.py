@@ -0,0 +1,115 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from foodgram.settings import SIMILAR_RECIPES_TOP
+from recipes.models import Recipe, SimilarRecipe
+from recipes.similarity import feature_matrix, nearest_neighbours
+
+
+class Command(BaseCommand):
+    help = ('Пересчёт таблицы похожих рецептов. По умолчанию '
+            'пересчитываются только новые и изменённые рецепты.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full', action='store_true',
+            help='Пересчитать похожие рецепты для всего каталога.'
+        )
+        parser.add_argument('--top', type=int, default=SIMILAR_RECIPES_TOP)
+        parser.add_argument('--batch-size', type=int, default=512)
+
+    def handle(self, *args, **options):
+        top = options['top']
+        # Рецепты отмечаются рассчитанными до чтения признаков:
+        # изменение во время пересчёта снова снимет отметку, и рецепт
+        # попадёт в следующий запуск.
+        pending = Recipe._base_manager.all()
+        if not options['full']:
+            pending = pending.filter(similar_computed=False)
+        pending = set(pending.values_list('id', flat=True).iterator())
+        self.mark(pending, True)
+        try:
+            changed = self.build(pending, top, options)
+        except BaseException:
+            self.mark(pending, False)
+            raise
+        self.stdout.write(self.style.SUCCESS(
+            f'Пересчитано рецептов: {len(changed)}'
+        ))
+
+    def build(self, pending, top, options):
+        recipe_ids, matrix = feature_matrix()
+        rows = [
+            row for row, recipe_id in enumerate(recipe_ids)
+            if recipe_id in pending
+        ]
+        changed = {int(recipe_ids[row]) for row in rows}
+        reverse = []
+        neighbours = nearest_neighbours(
+            matrix, rows, top, options['batch_size']
+        )
+        batch, lonely = [], []
+        for row, similar_rows, scores in neighbours:
+            recipe_id = int(recipe_ids[row])
+            if not len(similar_rows):
+                lonely.append(recipe_id)
+            for similar_row, score in zip(similar_rows, scores):
+                similar_id = int(recipe_ids[similar_row])
+                batch.append(SimilarRecipe(
+                    recipe_id=recipe_id, similar_id=similar_id,
+                    score=float(score)
+                ))
+                if similar_id not in changed:
+                    reverse.append(SimilarRecipe(
+                        recipe_id=similar_id, similar_id=recipe_id,
+                        score=float(score)
+                    ))
+            if len(batch) >= options['batch_size'] * top:
+                self.save(batch)
+                batch = []
+        # У рецептов без соседей удаляются прежние, уже неверные.
+        self.save(batch, lonely)
+        if not options['full']:
+            self.merge_reverse(changed, reverse, top)
+        return changed
+
+    @staticmethod
+    def mark(recipe_ids, computed, chunk_size=500):
+        recipe_ids = list(recipe_ids)
+        for start in range(0, len(recipe_ids), chunk_size):
+            Recipe._base_manager.filter(
+                id__in=recipe_ids[start:start + chunk_size]
+            ).update(similar_computed=computed)
+
+    @staticmethod
+    def save(batch, recipe_ids=()):
+        with transaction.atomic():
+            SimilarRecipe.objects.filter(
+                recipe_id__in={item.recipe_id for item in batch}
+                | set(recipe_ids)
+            ).delete()
+            SimilarRecipe.objects.bulk_create(batch, batch_size=5000)
+
+    @staticmethod
+    def merge_reverse(changed, reverse, top):
+        """Добавляет пересчитанные рецепты в списки их соседей
+           и оставляет у каждого соседа только top лучших."""
+        with transaction.atomic():
+            SimilarRecipe.objects.filter(
+                similar_id__in=changed
+            ).exclude(recipe_id__in=changed).delete()
+            SimilarRecipe.objects.bulk_create(
+                reverse, batch_size=5000, ignore_conflicts=True
+            )
+            affected = {item.recipe_id for item in reverse}
+            rows = SimilarRecipe.objects.filter(
+                recipe_id__in=affected
+            ).order_by('recipe_id', '-score').values_list('id', 'recipe_id')
+            extra, kept, current = [], 0, None
+            for pk, recipe_id in rows.iterator():
+                if recipe_id != current:
+                    current, kept = recipe_id, 0
+                kept += 1
+                if kept > top:
+                    extra.append(pk)
+            SimilarRecipe.objects.filter(id__in=extra).delete()
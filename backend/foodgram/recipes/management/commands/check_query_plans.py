@@ -0,0 +1,176 @@
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from recipes.models import (Change, Favorite, Ingredient, IngredientToRecipe,
+                            Recipe, RecipeScore, ShopList, Tag, TagToRecipe)
+from recipes.shopping_list import shopping_list_ingredients
+from users.models import Follow, User
+
+LARGE_TABLES = {
+    model._meta.db_table for model in (
+        Recipe, TagToRecipe, IngredientToRecipe, Favorite, ShopList,
+        Follow, User, Change,
+    )
+}
+# Полный просмотр таблицы: в PostgreSQL - Seq Scan, в SQLite - SCAN
+# без USING INDEX. Алиасы подзапросов SQLite выводит как "tbl AS U0".
+FULL_SCAN = {
+    'postgresql': re.compile(r'Seq Scan on (\w+)'),
+    'sqlite': re.compile(r'^SCAN (\w+)(?!.*\bUSING\b)'),
+}
+
+
+def scenarios(tags, author):
+    yield 'список рецептов', '/api/recipes/'
+    yield 'фильтр по тегам', '/api/recipes/?' + '&'.join(
+        f'tags={tag.slug}' for tag in tags
+    )
+    yield 'фильтр по автору', f'/api/recipes/?author={author.id}'
+    yield 'избранное', '/api/recipes/?is_favorited=1'
+    yield 'корзина', '/api/recipes/?is_in_shopping_cart=1'
+    yield 'поиск', '/api/recipes/?search=рецепт'
+    yield 'популярное', '/api/recipes/?ordering=trending'
+    yield 'страница рецепта', f'/api/recipes/{author.recipes.first().id}/'
+    yield 'подписки', '/api/users/subscriptions/?recipes_limit=3'
+    yield 'синхронизация', '/api/sync/?since=0'
+
+
+class Command(BaseCommand):
+    help = ('Выполняет запросы горячих эндпоинтов API, снимает EXPLAIN '
+            'каждого SELECT и завершается с ошибкой, если в плане есть '
+            'полный просмотр большой таблицы.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--seed', type=int, default=0,
+            help='Создать на время проверки столько рецептов; '
+                 'транзакция затем откатывается.'
+        )
+        parser.add_argument('--show', action='store_true',
+                            help='Вывести планы всех запросов.')
+
+    def handle(self, *args, **options):
+        pattern = FULL_SCAN.get(connection.vendor)
+        if pattern is None:
+            raise CommandError(
+                f'Разбор планов {connection.vendor} не поддерживается'
+            )
+        self.show = options['show']
+        with transaction.atomic():
+            if options['seed']:
+                self.seed(options['seed'])
+            if connection.vendor == 'postgresql':
+                # На маленькой базе планировщик и так выберет Seq Scan;
+                # при запрете он останется лишь там, где нет индекса.
+                with connection.cursor() as cursor:
+                    cursor.execute('SET LOCAL enable_seqscan = off')
+            failures = self.check_plans(pattern)
+            transaction.set_rollback(True)
+        if failures:
+            raise CommandError(
+                f'Полный просмотр больших таблиц в запросах: {failures}'
+            )
+        self.stdout.write(self.style.SUCCESS('Полных просмотров нет'))
+
+    def check_plans(self, pattern):
+        follow = Follow.objects.select_related('username').first()
+        user = follow.username if follow else User.objects.first()
+        if user is None or not Recipe.objects.exists():
+            raise CommandError('База пуста, запустите с --seed')
+        author = Recipe.objects.first().author
+        tags = Tag.objects.all()[:2]
+        client = APIClient(SERVER_NAME='localhost')
+        client.force_authenticate(user)
+        checks = [
+            (name, lambda path=path: client.get(path))
+            for name, path in scenarios(tags, author)
+        ]
+        checks.append((
+            'сводный список покупок',
+            lambda: list(shopping_list_ingredients(user))
+        ))
+        failures = 0
+        for name, request in checks:
+            # Первый вызов строит индексы в памяти процесса (поиск,
+            # ингредиенты) полным чтением; в план попадает второй.
+            request()
+            with CaptureQueriesContext(connection) as context:
+                response = request()
+            if getattr(response, 'status_code', 200) >= 400:
+                raise CommandError(f'{name}: ответ {response.status_code}')
+            scans = set()
+            for query in context.captured_queries:
+                if not query['sql'].lstrip().upper().startswith('SELECT'):
+                    continue
+                plan = self.explain(query['sql'])
+                if self.show:
+                    self.stdout.write(f'{name}: {query["sql"]}\n{plan}\n')
+                scans.update(
+                    table for table in re.findall(pattern, plan)
+                    if table in LARGE_TABLES
+                )
+            if scans:
+                failures += 1
+                self.stdout.write(self.style.ERROR(
+                    f'{name}: {", ".join(sorted(scans))}'
+                ))
+            else:
+                self.stdout.write(f'{name}: OK')
+        return failures
+
+    def explain(self, sql):
+        with connection.cursor() as cursor:
+            if connection.vendor == 'sqlite':
+                cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+                return '\n'.join(row[-1] for row in cursor.fetchall())
+            cursor.execute(f'EXPLAIN {sql}')
+            return '\n'.join(row[0] for row in cursor.fetchall())
+
+    def seed(self, count):
+        users = User.objects.bulk_create(
+            User(username=f'plan{i}', email=f'plan{i}@example.com',
+                 first_name='План', last_name=str(i))
+            for i in range(max(count // 10, 2))
+        )
+        tags = Tag.objects.bulk_create(
+            Tag(name=f'План {i}', color=f'#0000{i:02}', slug=f'plan-{i}')
+            for i in range(5)
+        )
+        ingredients = Ingredient.objects.bulk_create(
+            Ingredient(name=f'План {i}', measurement_unit='г')
+            for i in range(50)
+        )
+        recipes = Recipe.objects.bulk_create(
+            Recipe(author=users[i % len(users)], name=f'Рецепт {i}',
+                   text=f'Рецепт {i}', cooking_time=10,
+                   image='recipes/image/plan.png', image_variants={})
+            for i in range(count)
+        )
+        TagToRecipe.objects.bulk_create(
+            TagToRecipe(tag=tags[(i + j) % len(tags)], recipe=recipe)
+            for i, recipe in enumerate(recipes) for j in range(2)
+        )
+        IngredientToRecipe.objects.bulk_create(
+            IngredientToRecipe(
+                recipe=recipe,
+                ingredient=ingredients[(i + j) % len(ingredients)],
+                amount=100
+            )
+            for i, recipe in enumerate(recipes) for j in range(5)
+        )
+        RecipeScore.objects.bulk_create(
+            RecipeScore(recipe=recipe, score=i)
+            for i, recipe in enumerate(recipes[:count // 2])
+        )
+        user, *authors = users
+        Follow.objects.bulk_create(
+            Follow(username=user, author=author) for author in authors
+        )
+        for model in (Favorite, ShopList):
+            model.objects.bulk_create(
+                model(user=user, recipe=recipe) for recipe in recipes[::7]
+            )
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from recipes.changes import compact
+
+
+class Command(BaseCommand):
+    help = ('Сжатие журнала изменений /api/sync/: удаление записей, '
+            'перекрытых более новыми о том же объекте.')
+
+    def handle(self, *args, **kwargs):
+        deleted = compact()
+        self.stdout.write(self.style.SUCCESS(f'Удалено записей: {deleted}'))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from recipes.trending import compact
+
+
+class Command(BaseCommand):
+    help = 'Удаление затухшей популярности рецептов.'
+
+    def handle(self, *args, **kwargs):
+        deleted = compact()
+        self.stdout.write(self.style.SUCCESS(f'Удалено записей: {deleted}'))
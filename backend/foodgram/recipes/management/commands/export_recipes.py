@@ -0,0 +1,36 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from recipes.transfer import EXPORT_CHUNK_SIZE, export_lines
+
+
+class Command(BaseCommand):
+    help = ('Выгрузка рецептов в NDJSON: одна строка - рецепт с тегами, '
+            'ингредиентами, автором и путём к изображению.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--output', default='-',
+            help='Файл для выгрузки, по умолчанию stdout.'
+        )
+        parser.add_argument('--chunk-size', type=int,
+                            default=EXPORT_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        if options['output'] == '-':
+            self.export(sys.stdout.buffer, options['chunk_size'])
+            return
+        with open(options['output'], 'wb') as output:
+            exported = self.export(output, options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Выгружено рецептов: {exported}'
+        ))
+
+    @staticmethod
+    def export(output, chunk_size):
+        exported = 0
+        for line in export_lines(chunk_size=chunk_size):
+            output.write(line)
+            exported += 1
+        return exported
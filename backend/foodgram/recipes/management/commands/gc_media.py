@@ -0,0 +1,123 @@
+import os
+import shutil
+import time
+from itertools import islice
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes.images import VARIANTS_DIR
+from recipes.models import MediaBlob, Recipe
+from recipes.storage import recipe_image_storage
+
+IMAGE_DIR = Recipe._meta.get_field('image').upload_to.rstrip('/')
+
+
+def scan(root, skip):
+    """Обходит каталог без построения полного списка файлов."""
+    directories = [root]
+    while directories:
+        with os.scandir(directories.pop()) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    if entry.path != skip:
+                        directories.append(entry.path)
+                elif entry.is_file(follow_symlinks=False):
+                    yield entry
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+class Command(BaseCommand):
+    help = ('Удаление из MEDIA_ROOT изображений рецептов и их копий, '
+            'на которые не ссылается ни один рецепт.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true')
+        parser.add_argument(
+            '--min-age', type=int, default=3600,
+            help='Не трогать файлы моложе заданного числа секунд: '
+                 'они могут принадлежать незавершённой загрузке.'
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        self.dry_run = options['dry_run']
+        self.deadline = time.time() - options['min_age']
+        root = recipe_image_storage.path(IMAGE_DIR)
+        variants = recipe_image_storage.path(VARIANTS_DIR)
+        removed = 0
+        if os.path.isdir(root):
+            for batch in batched(scan(root, variants), options['batch_size']):
+                removed += self.collect_images(batch)
+        if os.path.isdir(variants):
+            directories = (
+                entry for entry in os.scandir(variants)
+                if entry.is_dir() and entry.name.isdigit()
+            )
+            for batch in batched(directories, options['batch_size']):
+                removed += self.collect_variants(batch)
+        self.stdout.write(self.style.SUCCESS(
+            f'{"Найдено" if self.dry_run else "Удалено"} '
+            f'лишних файлов и каталогов: {removed}'
+        ))
+
+    def expired(self, entry):
+        return entry.stat(follow_symlinks=False).st_mtime < self.deadline
+
+    def collect_images(self, entries):
+        names = {
+            os.path.relpath(entry.path, recipe_image_storage.location)
+            .replace(os.sep, '/'): entry
+            for entry in entries if self.expired(entry)
+        }
+        referenced = set(Recipe.objects.filter(
+            image__in=names
+        ).values_list('image', flat=True))
+        candidates = [name for name in names if name not in referenced]
+        with transaction.atomic():
+            # Рецепт, ещё не зафиксированный при проверке выше, уже взял
+            # ссылку в MediaBlob: под блокировкой строк такие файлы
+            # пропускаются, а acquire дождётся конца этой транзакции.
+            acquired = {
+                name for name, references
+                in MediaBlob.objects.select_for_update().filter(
+                    name__in=candidates
+                ).values_list('name', 'references')
+                if references > 0
+            }
+            orphans = [name for name in candidates if name not in acquired]
+            for name in orphans:
+                self.stdout.write(name)
+                if not self.dry_run:
+                    try:
+                        os.remove(names[name].path)
+                    except FileNotFoundError:
+                        pass
+            if not self.dry_run:
+                MediaBlob.objects.filter(
+                    name__in=orphans, references=0
+                ).delete()
+        return len(orphans)
+
+    def collect_variants(self, entries):
+        directories = {
+            int(entry.name): entry for entry in entries
+            if self.expired(entry)
+        }
+        existing = set(Recipe.objects.filter(
+            id__in=directories
+        ).values_list('id', flat=True))
+        orphans = [
+            entry for recipe_id, entry in directories.items()
+            if recipe_id not in existing
+        ]
+        for entry in orphans:
+            self.stdout.write(f'{VARIANTS_DIR}/{entry.name}/')
+            if not self.dry_run:
+                shutil.rmtree(entry.path)
+        return len(orphans)
@@ -0,0 +1,56 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes.transfer import IMPORT_BATCH_SIZE, import_lines
+
+
+class Command(BaseCommand):
+    help = ('Загрузка рецептов из NDJSON, выгруженного export_recipes. '
+            'Каждая пачка загружается в своей транзакции; рецепты, '
+            'которые уже есть у автора, пропускаются, поэтому прерванную '
+            'загрузку можно повторить.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('input', help='Файл NDJSON или - для stdin.')
+        parser.add_argument('--batch-size', type=int,
+                            default=IMPORT_BATCH_SIZE)
+        parser.add_argument(
+            '--id-map',
+            help='Записать сюда пары "id в дампе<TAB>id в базе".'
+        )
+
+    def handle(self, *args, **options):
+        source = (sys.stdin.buffer if options['input'] == '-'
+                  else open(options['input'], 'rb'))
+        id_map = open(options['id_map'], 'w') if options['id_map'] else None
+        total = created = 0
+        skipped = []
+        try:
+            for ids, batch_created, batch_skipped in import_lines(
+                source, options['batch_size']
+            ):
+                total += len(ids) + len(batch_skipped)
+                created += batch_created
+                skipped += batch_skipped
+                if id_map:
+                    id_map.writelines(f'{old}\t{new}\n' for old, new in ids)
+        except (ValueError, KeyError, TypeError) as error:
+            raise CommandError(
+                f'Ошибка в дампе после {total} рецептов: {error!r}'
+            )
+        finally:
+            if source is not sys.stdin.buffer:
+                source.close()
+            if id_map:
+                id_map.close()
+        if skipped:
+            self.stderr.write(self.style.WARNING(
+                f'Пропущено рецептов без изображения в хранилище: '
+                f'{len(skipped)}, id в дампе: '
+                f'{", ".join(map(str, skipped))}'
+            ))
+        self.stdout.write(self.style.SUCCESS(
+            f'Рецептов в дампе: {total}, создано: {created}, '
+            f'уже были: {total - created - len(skipped)}'
+        ))
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+
+from recipes.images import process
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = ('Генерация уменьшенных копий изображений рецептов, '
+            'для которых они ещё не созданы.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all', action='store_true',
+            help='Пересоздать копии для всех рецептов.'
+        )
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.order_by('id')
+        if not options['all']:
+            recipes = recipes.filter(image_variants__isnull=True)
+        processed = 0
+        for recipe_id in recipes.values_list('id', flat=True).iterator():
+            try:
+                process(recipe_id)
+            except Exception as e:
+                self.stderr.write(self.style.ERROR(
+                    f'Рецепт {recipe_id}: {e}'
+                ))
+                continue
+            processed += 1
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано рецептов: {processed}'
+        ))
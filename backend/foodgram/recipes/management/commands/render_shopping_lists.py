@@ -0,0 +1,92 @@
+import time
+from multiprocessing import Pool, TimeoutError
+
+from django.core.management.base import BaseCommand
+
+from foodgram.settings import (SHOPPING_LIST_RENDER_CONCURRENCY,
+                               SHOPPING_LIST_RENDER_TIMEOUT)
+from recipes.shopping_list import (claim, cleanup, complete, render_pdf,
+                                   shopping_list_ingredients)
+
+# Не чаще раза в столько секунд простаивающий воркер удаляет
+# устаревшие задания и их PDF.
+CLEANUP_INTERVAL = 60
+
+
+class Command(BaseCommand):
+    help = 'Воркер фоновой генерации PDF со списками покупок.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--concurrency', type=int,
+            default=SHOPPING_LIST_RENDER_CONCURRENCY,
+            help='Число процессов, рендерящих PDF одновременно.'
+        )
+        parser.add_argument(
+            '--timeout', type=int, default=SHOPPING_LIST_RENDER_TIMEOUT,
+            help='Максимальное время рендеринга одного списка, секунд.'
+        )
+        parser.add_argument(
+            '--poll-interval', type=float, default=1.0,
+            help='Пауза между опросами пустой очереди, секунд.'
+        )
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Обработать очередь и завершиться.'
+        )
+
+    def handle(self, *args, **options):
+        concurrency = options['concurrency']
+        # multiprocessing.Pool, а не ProcessPoolExecutor: зависший
+        # рендер нельзя отменить, его процесс нужно убить.
+        pool = Pool(concurrency)
+        last_cleanup = 0
+        try:
+            while True:
+                jobs = claim(concurrency)
+                if not jobs:
+                    if time.monotonic() - last_cleanup > CLEANUP_INTERVAL:
+                        cleanup()
+                        last_cleanup = time.monotonic()
+                    if options['once']:
+                        break
+                    time.sleep(options['poll_interval'])
+                    continue
+                results = [
+                    (job, pool.apply_async(render_pdf, (
+                        list(shopping_list_ingredients(job.user_id)),
+                    )))
+                    for job in jobs
+                ]
+                deadline = time.monotonic() + options['timeout']
+                finished = [
+                    self.finish(job, result, deadline)
+                    for job, result in results
+                ]
+                if not all(finished):
+                    # Остальные задания пачки уже готовы, так что
+                    # terminate() останавливает только зависшие рендеры.
+                    pool.terminate()
+                    pool.join()
+                    pool = Pool(concurrency)
+        finally:
+            pool.terminate()
+            pool.join()
+
+    def finish(self, job, result, deadline):
+        """Сохраняет результат задания; False - рендер не уложился
+           в таймаут и всё ещё занимает процесс пула."""
+        in_time = True
+        try:
+            content = result.get(
+                timeout=max(deadline - time.monotonic(), 0)
+            )
+        except TimeoutError:
+            in_time = False
+            complete(job, error='Превышено время генерации')
+        except Exception as error:
+            complete(job, error=str(error) or type(error).__name__)
+        else:
+            complete(job, content)
+        self.stdout.write(f'Задание {job.id}: {job.status}')
+        return in_time
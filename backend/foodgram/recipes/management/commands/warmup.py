@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes.warmup import warmup
+
+
+class Command(BaseCommand):
+    help = ('Прогрев: регистрирует шрифты PDF, загружает URLconf, '
+            'открывает соединения с базой и строит индексы в памяти. '
+            'Показывает время каждого шага.')
+
+    def handle(self, *args, **options):
+        failed = 0
+        for name, seconds, error in warmup():
+            if error is None:
+                self.stdout.write(f'{name}: {seconds * 1000:.1f} ms')
+            else:
+                failed += 1
+                self.stderr.write(self.style.ERROR(f'{name}: {error}'))
+        if failed:
+            raise CommandError(f'Шагов с ошибкой: {failed}')
@@ -0,0 +1,32 @@
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations
+
+INDEX = GinIndex(
+    SearchVector('name', weight='A', config='russian')
+    + SearchVector('text', weight='B', config='russian'),
+    name='recipe_search_vector_idx',
+)
+
+
+def add_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.add_index(apps.get_model('recipes', 'Recipe'), INDEX)
+
+
+def remove_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.remove_index(apps.get_model('recipes', 'Recipe'), INDEX)
+
+
+class Migration(migrations.Migration):
+    """GIN-индекс полнотекстового поиска создаётся только в PostgreSQL,
+       для остальных СУБД используется индекс в памяти процесса."""
+
+    dependencies = [
+        ('recipes', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(add_search_index, remove_search_index),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 4.2.30 on 2026-10-18 23:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0007_shoppinglistjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='image_variants',
+            field=models.JSONField(blank=True, editable=False, null=True, verbose_name='Уменьшенные копии изображения'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(condition=models.Q(('image_variants__isnull', True)), fields=['id'], name='recipe_image_pending_idx'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 4.2.30 on 2026-10-18 23:40
+
+from django.db import migrations, models
+from django.db.models import Min
+
+
+def remove_duplicates(apps, schema_editor):
+    TagToRecipe = apps.get_model('recipes', 'TagToRecipe')
+    kept = TagToRecipe.objects.values('tag', 'recipe').annotate(
+        kept_id=Min('id')
+    ).values('kept_id')
+    TagToRecipe.objects.exclude(id__in=kept).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0009_mediablob'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='tagtorecipe',
+            constraint=models.UniqueConstraint(fields=('tag', 'recipe'), name='unique_tag_recipe'),
+        ),
+    ]
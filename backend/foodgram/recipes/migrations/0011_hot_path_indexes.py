@@ -0,0 +1,33 @@
+# Generated by Django 4.2.30 on 2026-10-18 23:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0010_tagtorecipe_unique'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='favorite',
+            index=models.Index(fields=['user', 'recipe'], name='favorite_user_recipe_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ingredienttorecipe',
+            index=models.Index(fields=['recipe', 'ingredient'], name='ingredient_recipe_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['author', '-pub_date'], name='recipe_author_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['-pub_date', 'id'], name='recipe_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='shoplist',
+            index=models.Index(fields=['user', 'recipe'], name='shoplist_user_recipe_idx'),
+        ),
+    ]
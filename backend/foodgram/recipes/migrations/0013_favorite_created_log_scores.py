@@ -0,0 +1,43 @@
+# Generated by Django 4.2.30 on 2026-10-19 00:19
+
+from datetime import datetime, timezone
+from math import log
+
+from django.conf import settings
+from django.db import migrations, models
+import django.utils.timezone
+
+# Эпоха прежнего прямого затухания: счёт был Σ w·exp(λ·(t - эпоха)).
+OLD_EPOCH = datetime(2024, 1, 1, tzinfo=timezone.utc).timestamp()
+
+
+def scores_to_log(apps, schema_editor):
+    """Переводит счёт в ln Σ w·exp(λ·t) без эпохи."""
+    RecipeScore = apps.get_model('recipes', 'RecipeScore')
+    RecipeScore.objects.filter(score__lte=0).delete()
+    shift = log(2) / (settings.TRENDING_HALF_LIFE_DAYS * 86400) * OLD_EPOCH
+    scores = list(RecipeScore.objects.all())
+    for score in scores:
+        score.score = log(score.score) + shift
+    RecipeScore.objects.bulk_update(scores, ['score'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0012_change_log'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='favorite',
+            name='created',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False, verbose_name='Дата добавления'),
+        ),
+        migrations.AddField(
+            model_name='shoplist',
+            name='created',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False, verbose_name='Дата добавления'),
+        ),
+        migrations.RunPython(scores_to_log, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-19 00:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0013_favorite_created_log_scores'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='shoppinglistjob',
+            name='claimed',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Взято в работу'),
+        ),
+    ]
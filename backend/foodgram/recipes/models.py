@@ -1,8 +1,12 @@
 from django.core.validators import MaxValueValidator, MinValueValidator
 from django.db import models
+from django.utils import timezone
 
+from foodgram.invalidation import InvalidatingQuerySet
 from users.models import User
 
+from .storage import recipe_image_storage
+
 
 class Tag(models.Model):
     """Теги рецептов."""
@@ -12,6 +16,8 @@ class Tag(models.Model):
     )
     slug = models.SlugField('Слаг', unique=True)
 
+    objects = InvalidatingQuerySet.as_manager()
+
     class Meta:
         ordering = ('name',)
         verbose_name = 'тег'
@@ -26,6 +32,8 @@ class Ingredient(models.Model):
     name = models.CharField('Название', max_length=100, db_index=True)
     measurement_unit = models.CharField('Еденица измерения', max_length=30)
 
+    objects = InvalidatingQuerySet.as_manager()
+
     class Meta:
         ordering = ('-id',)
         verbose_name = 'Ингредиент'
@@ -53,7 +61,14 @@ class Recipe(models.Model):
             MaxValueValidator(600)
         ]
     )
-    image = models.ImageField('Изображение', upload_to='recipes/image/')
+    image = models.ImageField(
+        'Изображение', upload_to='recipes/image/',
+        storage=recipe_image_storage
+    )
+    image_variants = models.JSONField(
+        'Уменьшенные копии изображения', null=True, blank=True,
+        editable=False
+    )
     author = models.ForeignKey(
         User, on_delete=models.CASCADE, verbose_name='автор',
         related_name='recipes'
@@ -73,6 +88,13 @@ class Recipe(models.Model):
         verbose_name='Дата публикации',
         auto_now_add=True
     )
+    # Сбрасывается при изменении ингредиентов и тегов: такие рецепты
+    # пересчитывает инкрементальный build_similar_recipes.
+    similar_computed = models.BooleanField(
+        'Похожие рецепты рассчитаны', default=False, editable=False
+    )
+
+    objects = InvalidatingQuerySet.as_manager()
 
     class Meta:
         ordering = ('-pub_date',)
@@ -84,6 +106,17 @@ class Recipe(models.Model):
                 name='unique_text_author'
             )
         ]
+        indexes = [
+            models.Index(
+                fields=['id'],
+                condition=models.Q(image_variants__isnull=True),
+                name='recipe_image_pending_idx'
+            ),
+            models.Index(
+                fields=['author', '-pub_date'], name='recipe_author_date_idx'
+            ),
+            models.Index(fields=['-pub_date', 'id'], name='recipe_date_idx'),
+        ]
 
     def __str__(self):
         return self.name[:10]
@@ -98,9 +131,17 @@ class TagToRecipe(models.Model):
         Recipe, on_delete=models.CASCADE, verbose_name='рецепт',
     )
 
+    objects = InvalidatingQuerySet.as_manager()
+
     class Meta:
         verbose_name = 'тег'
         verbose_name_plural = 'Теги'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['tag', 'recipe'],
+                name='unique_tag_recipe'
+            )
+        ]
 
     def __str__(self):
         return f'{self.tag} + {self.recipe}'
@@ -119,6 +160,13 @@ class FavoriteShoppingCart(models.Model):
         on_delete=models.CASCADE,
         verbose_name='Рецепт',
     )
+    # Нужна, чтобы при удалении вычесть из популярности ровно вклад
+    # добавления.
+    created = models.DateTimeField(
+        'Дата добавления', default=timezone.now, editable=False
+    )
+
+    objects = InvalidatingQuerySet.as_manager()
 
     class Meta:
         abstract = True
@@ -134,6 +182,11 @@ class Favorite(FavoriteShoppingCart):
         default_related_name = 'favorites'
         verbose_name = 'Избранное'
         verbose_name_plural = 'Избранное'
+        indexes = [
+            models.Index(
+                fields=['user', 'recipe'], name='favorite_user_recipe_idx'
+            )
+        ]
 
         def __str__(self):
             return (f' рецепт {Favorite.recipe}'
@@ -147,6 +200,11 @@ class ShopList(FavoriteShoppingCart):
         default_related_name = 'shopping_list'
         verbose_name = 'Корзина'
         verbose_name_plural = 'Корзина'
+        indexes = [
+            models.Index(
+                fields=['user', 'recipe'], name='shoplist_user_recipe_idx'
+            )
+        ]
 
     def __str__(self):
         return (f' рецепт {ShopList.recipe}'
@@ -169,9 +227,220 @@ class IngredientToRecipe(models.Model):
         default=1
     )
 
+    objects = InvalidatingQuerySet.as_manager()
+
     class Meta:
         verbose_name = 'ингредиент'
         verbose_name_plural = 'ингредиенты'
+        indexes = [
+            models.Index(
+                fields=['recipe', 'ingredient'],
+                name='ingredient_recipe_idx'
+            )
+        ]
 
     def __str__(self):
         return f'{self.ingredient} + {self.recipe}'
+
+
+class SimilarRecipe(models.Model):
+    """Предрассчитанные похожие рецепты (top-K по косинусной близости)."""
+    recipe = models.ForeignKey(
+        Recipe, on_delete=models.CASCADE, verbose_name='рецепт',
+        related_name='similar_recipes'
+    )
+    similar = models.ForeignKey(
+        Recipe, on_delete=models.CASCADE, verbose_name='похожий рецепт',
+        related_name='similar_for'
+    )
+    score = models.FloatField('Близость')
+
+    class Meta:
+        ordering = ('-score',)
+        verbose_name = 'похожий рецепт'
+        verbose_name_plural = 'Похожие рецепты'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['recipe', 'similar'],
+                name='unique_similar_recipe'
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=['recipe', '-score'],
+                name='similar_recipe_score_idx'
+            )
+        ]
+
+    def __str__(self):
+        return f'{self.recipe} ~ {self.similar}'
+
+
+class FeedEntry(models.Model):
+    """Лента подписок: рецепты авторов, на которых подписан пользователь.
+
+    Заполняется при публикации рецепта (fan-out on write).
+    """
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, verbose_name='Пользователь',
+        related_name='feed'
+    )
+    recipe = models.ForeignKey(
+        Recipe, on_delete=models.CASCADE, verbose_name='Рецепт',
+        related_name='+'
+    )
+    author = models.ForeignKey(
+        User, on_delete=models.CASCADE, verbose_name='Автор',
+        related_name='+'
+    )
+    pub_date = models.DateTimeField('Дата публикации')
+
+    class Meta:
+        verbose_name = 'запись ленты'
+        verbose_name_plural = 'Лента подписок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'recipe'],
+                name='unique_feed_entry'
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date', '-recipe'],
+                name='feed_user_pub_date_idx'
+            ),
+            models.Index(
+                fields=['user', 'author'],
+                name='feed_user_author_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.user} :: {self.recipe}'
+
+
+class RecipeScore(models.Model):
+    """Популярность рецепта с экспоненциальным затуханием.
+
+    Хранится логарифм «прямого» затухания: ln Σ wᵢ·exp(λ·tᵢ), см.
+    recipes.trending. Порядок рецептов по такому счёту совпадает
+    с порядком по затухающему.
+    """
+    recipe = models.OneToOneField(
+        Recipe, on_delete=models.CASCADE, primary_key=True,
+        verbose_name='рецепт', related_name='score'
+    )
+    score = models.FloatField('Популярность', default=0)
+
+    class Meta:
+        verbose_name = 'популярность рецепта'
+        verbose_name_plural = 'Популярность рецептов'
+        indexes = [
+            models.Index(
+                fields=['-score', 'recipe'],
+                name='recipe_score_idx'
+            )
+        ]
+
+    def __str__(self):
+        return f'{self.recipe}: {self.score}'
+
+
+class ShoppingListJob(models.Model):
+    """Задание на фоновую генерацию PDF со списком покупок."""
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUSES = (
+        (PENDING, 'В очереди'),
+        (RUNNING, 'Выполняется'),
+        (DONE, 'Готово'),
+        (FAILED, 'Ошибка'),
+    )
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, verbose_name='Пользователь',
+        related_name='shopping_list_jobs'
+    )
+    status = models.CharField(
+        'Статус', max_length=10, choices=STATUSES, default=PENDING
+    )
+    file = models.FileField('Файл', upload_to='shopping_lists/', blank=True)
+    error = models.TextField('Ошибка', blank=True)
+    created = models.DateTimeField('Создано', auto_now_add=True)
+    # Когда воркер взял задание; зависшее дольше
+    # SHOPPING_LIST_JOB_STALE задание забирает другой воркер.
+    claimed = models.DateTimeField('Взято в работу', null=True, blank=True)
+    finished = models.DateTimeField('Завершено', null=True, blank=True)
+
+    class Meta:
+        ordering = ('created',)
+        verbose_name = 'задание списка покупок'
+        verbose_name_plural = 'Задания списков покупок'
+        indexes = [
+            models.Index(
+                fields=['status', 'created'],
+                name='shopping_list_job_status_idx'
+            )
+        ]
+
+    def __str__(self):
+        return f'{self.user} :: {self.status}'
+
+
+class MediaBlob(models.Model):
+    """Число рецептов, ссылающихся на файл изображения в хранилище."""
+    name = models.CharField('Путь', max_length=255, unique=True)
+    references = models.PositiveIntegerField('Число ссылок', default=0)
+
+    class Meta:
+        verbose_name = 'файл изображения'
+        verbose_name_plural = 'Файлы изображений'
+
+    def __str__(self):
+        return f'{self.name} ({self.references})'
+
+
+class Change(models.Model):
+    """Журнал изменений для синхронизации клиентов, только добавление.
+
+    Публичные изменения (рецепты) пишутся без пользователя, личные
+    (избранное, корзина, подписки) - с владельцем строки. id записи
+    служит токеном синхронизации.
+    """
+    RECIPE = 'recipe'
+    FAVORITE = 'favorite'
+    SHOPPING_CART = 'shopping_cart'
+    SUBSCRIPTION = 'subscription'
+    KINDS = (
+        (RECIPE, 'Рецепт'),
+        (FAVORITE, 'Избранное'),
+        (SHOPPING_CART, 'Корзина'),
+        (SUBSCRIPTION, 'Подписка'),
+    )
+    kind = models.CharField('Тип', max_length=16, choices=KINDS)
+    object_id = models.PositiveBigIntegerField(
+        'id рецепта или автора'
+    )
+    deleted = models.BooleanField('Удалено', default=False)
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, verbose_name='Пользователь',
+        related_name='+', null=True, blank=True, db_index=False
+    )
+    created = models.DateTimeField('Создано', auto_now_add=True)
+
+    class Meta:
+        ordering = ('id',)
+        verbose_name = 'изменение'
+        verbose_name_plural = 'Журнал изменений'
+        indexes = [
+            models.Index(fields=['user', 'id'], name='change_user_idx'),
+            models.Index(
+                fields=['kind', 'object_id', 'user'],
+                name='change_object_idx'
+            ),
+        ]
+
+    def __str__(self):
+        action = 'удалено' if self.deleted else 'изменено'
+        return f'{self.id}: {self.kind} {self.object_id} {action}'
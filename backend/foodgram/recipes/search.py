@@ -0,0 +1,161 @@
+import heapq
+import re
+from bisect import bisect_left, insort
+from math import log
+from threading import Lock
+
+from django.contrib.postgres.search import (SearchQuery, SearchRank,
+                                            SearchVector)
+from django.db import connection
+from django.db.models import Exists, OuterRef, Q
+
+from foodgram.settings import SEARCH_CONFIG, SEARCH_RESULTS_LIMIT
+
+from .models import Ingredient, IngredientToRecipe, Recipe
+from .utils import filter_in_order
+
+TOKEN_RE = re.compile(r'\w+')
+FIELD_WEIGHTS = (('name', 3.0), ('ingredients', 2.0), ('text', 1.0))
+
+
+def tokenize(text):
+    """Разбивает текст на нормализованные слова."""
+    return TOKEN_RE.findall(text.lower().replace('ё', 'е'))
+
+
+def recipe_search_vector():
+    """Выражение tsvector, по которому построен GIN-индекс в PostgreSQL."""
+    return (
+        SearchVector('name', weight='A', config=SEARCH_CONFIG)
+        + SearchVector('text', weight='B', config=SEARCH_CONFIG)
+    )
+
+
+class InvertedIndex:
+    """Инвертированный индекс рецептов в памяти процесса.
+
+    Используется, когда база данных не PostgreSQL. Строится лениво
+    при первом поиске и обновляется по публикациям шины инвалидации
+    (recipes.invalidation).
+    """
+
+    def __init__(self):
+        self.postings = {}
+        self.documents = {}
+        self.vocabulary = []
+        self.is_built = False
+        self.lock = Lock()
+
+    @staticmethod
+    def document(recipe):
+        ingredients = ' '.join(
+            ingredient.name for ingredient in recipe.ingredients.all()
+        )
+        texts = {'name': recipe.name, 'text': recipe.text,
+                 'ingredients': ingredients}
+        weights = {}
+        for field, weight in FIELD_WEIGHTS:
+            for token in tokenize(texts[field]):
+                weights[token] = weights.get(token, 0) + weight
+        return weights
+
+    def build(self):
+        recipes = Recipe.objects.only('id', 'name', 'text').prefetch_related(
+            'ingredients'
+        ).order_by().iterator(chunk_size=2000)
+        with self.lock:
+            self.postings, self.documents, self.vocabulary = {}, {}, []
+            for recipe in recipes:
+                self._add(recipe.id, self.document(recipe))
+            self.is_built = True
+
+    def add(self, recipe):
+        weights = self.document(recipe)
+        with self.lock:
+            self._remove(recipe.id)
+            self._add(recipe.id, weights)
+
+    def remove(self, recipe_id):
+        with self.lock:
+            self._remove(recipe_id)
+
+    def _add(self, recipe_id, weights):
+        for token, weight in weights.items():
+            posting = self.postings.get(token)
+            if posting is None:
+                posting = self.postings[token] = {}
+                insort(self.vocabulary, token)
+            posting[recipe_id] = weight
+        self.documents[recipe_id] = tuple(weights)
+
+    def _remove(self, recipe_id):
+        for token in self.documents.pop(recipe_id, ()):
+            posting = self.postings[token]
+            del posting[recipe_id]
+            if not posting:
+                del self.postings[token]
+                del self.vocabulary[bisect_left(self.vocabulary, token)]
+
+    def _expand(self, prefix):
+        position = bisect_left(self.vocabulary, prefix)
+        while (position < len(self.vocabulary)
+               and self.vocabulary[position].startswith(prefix)):
+            yield self.vocabulary[position]
+            position += 1
+
+    def search(self, query, limit=SEARCH_RESULTS_LIMIT):
+        """Возвращает id рецептов, содержащих все слова запроса,
+           в порядке убывания релевантности (tf-idf)."""
+        if not self.is_built:
+            self.build()
+        scores = None
+        with self.lock:
+            total = len(self.documents) or 1
+            for token in tokenize(query):
+                token_scores = {}
+                for term in self._expand(token):
+                    posting = self.postings[term]
+                    idf = log(1 + total / len(posting))
+                    for recipe_id, weight in posting.items():
+                        score = weight * idf
+                        if score > token_scores.get(recipe_id, 0):
+                            token_scores[recipe_id] = score
+                if scores is None:
+                    scores = token_scores
+                else:
+                    scores = {
+                        recipe_id: score + token_scores[recipe_id]
+                        for recipe_id, score in scores.items()
+                        if recipe_id in token_scores
+                    }
+                if not scores:
+                    return []
+        if not scores:
+            return []
+        return heapq.nlargest(limit, scores, key=scores.get)
+
+
+recipe_index = InvertedIndex()
+
+
+def search_postgres(queryset, query):
+    search_query = SearchQuery(query, config=SEARCH_CONFIG)
+    condition = Q(search_vector=search_query)
+    ingredients = list(Ingredient.objects.filter(
+        name__istartswith=query
+    ).values_list('id', flat=True)[:SEARCH_RESULTS_LIMIT])
+    if ingredients:
+        condition |= Q(Exists(IngredientToRecipe.objects.filter(
+            recipe=OuterRef('pk'), ingredient__in=ingredients
+        )))
+    return queryset.annotate(
+        search_vector=recipe_search_vector(),
+        search_rank=SearchRank(recipe_search_vector(), search_query),
+    ).filter(condition).order_by('-search_rank', '-pub_date')
+
+
+def search_recipes(queryset, query):
+    """Полнотекстовый поиск по названию, описанию и ингредиентам."""
+    if connection.vendor == 'postgresql':
+        return search_postgres(queryset, query)
+    return filter_in_order(queryset, recipe_index.search(query))
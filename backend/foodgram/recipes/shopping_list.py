@@ -0,0 +1,146 @@
+from datetime import timedelta
+from io import BytesIO
+from uuid import uuid4
+
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.db.models import Q, Sum
+from django.utils import timezone
+
+from foodgram.settings import SHOPPING_LIST_JOB_STALE, SHOPPING_LIST_JOB_TTL
+
+from .models import IngredientToRecipe, ShoppingListJob
+
+FONT_NAME = 'DejaVuSerif'
+
+
+def shopping_list_ingredients(user):
+    """Суммарное количество ингредиентов рецептов из корзины."""
+    return IngredientToRecipe.objects.filter(
+        recipe__shopping_list__user=user
+    ).values(
+        'ingredient__name', 'ingredient__measurement_unit'
+    ).order_by(
+        'ingredient__name'
+    ).annotate(ingredient_total=Sum('amount'))
+
+
+def register_fonts():
+    """Регистрирует шрифт один раз на процесс. reportlab импортируется
+       здесь, а не при загрузке модуля: он нужен только для PDF."""
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.ttfonts import TTFont
+
+    if FONT_NAME not in pdfmetrics.getRegisteredFontNames():
+        pdfmetrics.registerFont(TTFont(FONT_NAME, f'{FONT_NAME}.ttf'))
+
+
+def create_pdf(ingredients, output):
+    from reportlab.pdfgen import canvas
+
+    register_fonts()
+    pdf_file = canvas.Canvas(output)
+    begin_position_x, begin_position_y = 30, 730
+    pdf_file.setFont(FONT_NAME, 25)
+    pdf_file.setTitle('Список покупок')
+    pdf_file.drawString(
+        begin_position_x, begin_position_y + 40, 'Список покупок: ')
+    pdf_file.setFont(FONT_NAME, 18)
+    for number, item in enumerate(ingredients, start=1):
+        if begin_position_y < 100:
+            begin_position_y = 730
+            pdf_file.showPage()
+            pdf_file.setFont(FONT_NAME, 18)
+        pdf_file.drawString(
+            begin_position_x,
+            begin_position_y,
+            f'{number}: {item["ingredient__name"]} - '
+            f'{item["ingredient_total"]}'
+            f'{item["ingredient__measurement_unit"]}'
+        )
+        begin_position_y -= 30
+    pdf_file.showPage()
+    return pdf_file.save()
+
+
+def render_pdf(ingredients):
+    """Рендерит PDF в байты; выполняется в дочернем процессе воркера."""
+    output = BytesIO()
+    create_pdf(ingredients, output)
+    return output.getvalue()
+
+
+def enqueue(user):
+    """Ставит генерацию списка покупок в очередь, переиспользуя
+       незавершённое задание пользователя."""
+    with transaction.atomic():
+        job = ShoppingListJob.objects.select_for_update().filter(
+            user=user,
+            status__in=(ShoppingListJob.PENDING, ShoppingListJob.RUNNING)
+        ).first()
+        return job or ShoppingListJob.objects.create(user=user)
+
+
+def claim(limit):
+    """Забирает из очереди до limit заданий для текущего воркера, в том
+       числе брошенные: взятые упавшим воркером и так и не завершённые."""
+    now = timezone.now()
+    abandoned = Q(status=ShoppingListJob.RUNNING) & (
+        Q(claimed__lt=now - timedelta(seconds=SHOPPING_LIST_JOB_STALE))
+        | Q(claimed__isnull=True)
+    )
+    with transaction.atomic():
+        jobs = list(ShoppingListJob.objects.select_for_update(
+            skip_locked=True
+        ).filter(
+            Q(status=ShoppingListJob.PENDING) | abandoned
+        ).order_by('created')[:limit])
+        ShoppingListJob.objects.filter(
+            id__in=[job.id for job in jobs]
+        ).update(status=ShoppingListJob.RUNNING, claimed=now)
+    for job in jobs:
+        job.status = ShoppingListJob.RUNNING
+        job.claimed = now
+    return jobs
+
+
+def complete(job, content=None, error=''):
+    """Сохраняет PDF или ошибку задания. Если задание, сочтённое
+       брошенным, уже забрал другой воркер, результат отбрасывается."""
+    if content is not None:
+        job.file.save(f'{uuid4().hex}.pdf', ContentFile(content),
+                      save=False)
+    job.status = (ShoppingListJob.FAILED if error
+                  else ShoppingListJob.DONE)
+    job.error = error
+    job.finished = timezone.now()
+    saved = ShoppingListJob.objects.filter(
+        id=job.id, status=ShoppingListJob.RUNNING, claimed=job.claimed
+    ).update(
+        status=job.status, error=job.error, file=job.file.name,
+        finished=job.finished
+    )
+    if not saved and job.file:
+        job.file.delete(save=False)
+    return bool(saved)
+
+
+def cleanup():
+    """Удаляет задания, завершённые раньше SHOPPING_LIST_JOB_TTL, вместе
+       с их PDF. Возвращает число удалённых заданий."""
+    expired = ShoppingListJob.objects.filter(
+        status__in=(ShoppingListJob.DONE, ShoppingListJob.FAILED),
+        finished__lt=timezone.now() - timedelta(
+            seconds=SHOPPING_LIST_JOB_TTL
+        )
+    )
+    jobs = list(expired.only('id', 'file'))
+    deleted, _ = ShoppingListJob.objects.filter(
+        id__in=[job.id for job in jobs]
+    ).delete()
+    # Файлы - после строк: задание без файла не должно вести
+    # редиректом на удалённый PDF.
+    for job in jobs:
+        if job.file:
+            job.file.delete(save=False)
+    return deleted
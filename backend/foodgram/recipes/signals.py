@@ -0,0 +1,137 @@
+from django.db import transaction
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_save)
+from django.dispatch import receiver
+
+from foodgram.settings import IMAGE_VARIANTS_INLINE
+from users.models import Follow
+
+from .blobs import acquire, release
+from .changes import owner_deleted, record
+from .feed import backfill, fan_out, unfollow
+from .images import schedule
+from .models import (Change, Favorite, IngredientToRecipe, Recipe, ShopList,
+                     TagToRecipe)
+
+
+@receiver(post_save, sender=Recipe)
+def process_image(sender, instance, **kwargs):
+    """Копии изображения создаются вне запроса: ответ не ждёт
+       перекодирования."""
+    if IMAGE_VARIANTS_INLINE and instance.image_variants is None:
+        transaction.on_commit(lambda: schedule(instance.pk))
+
+
+@receiver(post_save, sender=Recipe)
+def publish_to_feeds(sender, instance, created, **kwargs):
+    if created:
+        transaction.on_commit(lambda: fan_out(instance))
+
+
+@receiver(post_save, sender=Follow)
+def backfill_feed(sender, instance, created, **kwargs):
+    if created:
+        transaction.on_commit(lambda: backfill(instance))
+
+
+@receiver(post_delete, sender=Follow)
+def clear_feed(sender, instance, **kwargs):
+    unfollow(instance)
+
+
+def reset_similar_recipes(recipe_ids):
+    """Рецепты с изменёнными ингредиентами или тегами попадут
+       в следующий инкрементальный пересчёт build_similar_recipes.
+       Прежние похожие показываются до пересчёта. _base_manager:
+       флаг не входит в кешируемые ответы."""
+    Recipe._base_manager.filter(
+        id__in=recipe_ids, similar_computed=True
+    ).update(similar_computed=False)
+
+
+@receiver(post_save, sender=IngredientToRecipe)
+@receiver(post_save, sender=TagToRecipe)
+@receiver(post_delete, sender=IngredientToRecipe)
+@receiver(post_delete, sender=TagToRecipe)
+def features_changed(sender, instance, **kwargs):
+    reset_similar_recipes([instance.recipe_id])
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def features_set(sender, instance, action, reverse, pk_set, **kwargs):
+    """add() и set() создают строки связей bulk_create без post_save."""
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        reset_similar_recipes([instance.pk])
+    elif pk_set:
+        reset_similar_recipes(pk_set)
+
+
+@receiver(pre_save, sender=Recipe)
+def remember_image(sender, instance, **kwargs):
+    instance._previous_image = Recipe.objects.filter(
+        pk=instance.pk
+    ).values_list('image', flat=True).first() if instance.pk else None
+    # Новая загрузка ещё не записана в хранилище: её содержимое нужно
+    # acquire, если совпавший по хешу файл удалят до фиксации.
+    instance._uploaded_image = (
+        instance.image.file
+        if instance.image and not instance.image._committed else None
+    )
+
+
+@receiver(post_save, sender=Recipe)
+def count_image_references(sender, instance, **kwargs):
+    previous = getattr(instance, '_previous_image', None)
+    if instance.image.name == previous:
+        return
+    if instance.image.name:
+        acquire(instance.image.name,
+                getattr(instance, '_uploaded_image', None))
+    if previous:
+        release(previous)
+
+
+@receiver(post_delete, sender=Recipe)
+def release_image(sender, instance, **kwargs):
+    if instance.image.name:
+        release(instance.image.name)
+
+
+@receiver(post_save, sender=Recipe)
+def log_recipe_saved(sender, instance, **kwargs):
+    record(Change.RECIPE, instance.pk)
+
+
+@receiver(post_delete, sender=Recipe)
+def log_recipe_deleted(sender, instance, **kwargs):
+    record(Change.RECIPE, instance.pk, deleted=True)
+
+
+USER_CHANGES = {
+    Favorite: (Change.FAVORITE, 'user_id', 'recipe_id'),
+    ShopList: (Change.SHOPPING_CART, 'user_id', 'recipe_id'),
+    Follow: (Change.SUBSCRIPTION, 'username_id', 'author_id'),
+}
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_save, sender=ShopList)
+@receiver(post_save, sender=Follow)
+def log_user_row_saved(sender, instance, created, **kwargs):
+    if created:
+        kind, owner, target = USER_CHANGES[sender]
+        record(kind, getattr(instance, target),
+               user_id=getattr(instance, owner))
+
+
+@receiver(post_delete, sender=Favorite)
+@receiver(post_delete, sender=ShopList)
+@receiver(post_delete, sender=Follow)
+def log_user_row_deleted(sender, instance, origin=None, **kwargs):
+    kind, owner, target = USER_CHANGES[sender]
+    if not owner_deleted(origin, getattr(instance, owner)):
+        record(kind, getattr(instance, target), deleted=True,
+               user_id=getattr(instance, owner))
@@ -0,0 +1,66 @@
+import numpy as np
+from scipy import sparse
+
+from .models import IngredientToRecipe, Recipe, TagToRecipe
+
+TAG_WEIGHT = 0.5
+
+
+def feature_matrix():
+    """Разреженная матрица рецепт x (ингредиенты + теги)
+       с нормированными строками."""
+    recipe_ids = np.fromiter(
+        Recipe.objects.order_by('id').values_list(
+            'id', flat=True
+        ).iterator(chunk_size=10000),
+        dtype=np.int64,
+    )
+    positions = {recipe_id: row for row, recipe_id in enumerate(recipe_ids)}
+    columns = {}
+    rows, cols, values = [], [], []
+    features = (
+        (IngredientToRecipe.objects.values_list(
+            'recipe_id', 'ingredient_id'), 'ingredient', 1.0),
+        (TagToRecipe.objects.values_list(
+            'recipe_id', 'tag_id'), 'tag', TAG_WEIGHT),
+    )
+    for queryset, kind, weight in features:
+        pairs = queryset.order_by().iterator(chunk_size=10000)
+        for recipe_id, feature_id in pairs:
+            # Рецепт создан уже после чтения списка: он попадёт
+            # в следующий пересчёт.
+            if recipe_id not in positions:
+                continue
+            rows.append(positions[recipe_id])
+            cols.append(columns.setdefault((kind, feature_id), len(columns)))
+            values.append(weight)
+    matrix = sparse.csr_matrix(
+        (values, (rows, cols)),
+        shape=(len(recipe_ids), len(columns)),
+        dtype=np.float32,
+    )
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1))).ravel()
+    norms[norms == 0] = 1
+    return recipe_ids, sparse.diags(1 / norms).dot(matrix).tocsr()
+
+
+def nearest_neighbours(matrix, rows, top, batch_size):
+    """Косинусная близость строк rows со всеми рецептами пачками.
+
+    Возвращает тройки (строка, строки соседей, близость) для top-K
+    ближайших рецептов, не считая самого рецепта.
+    """
+    transposed = matrix.T.tocsc()
+    for start in range(0, len(rows), batch_size):
+        batch = rows[start:start + batch_size]
+        product = matrix[batch].dot(transposed).tocsr()
+        for offset, row in enumerate(batch):
+            begin, end = product.indptr[offset], product.indptr[offset + 1]
+            neighbours = product.indices[begin:end]
+            scores = product.data[begin:end]
+            mask = (neighbours != row) & (scores > 0)
+            neighbours, scores = neighbours[mask], scores[mask]
+            if len(scores) > top:
+                best = np.argpartition(-scores, top)[:top]
+                neighbours, scores = neighbours[best], scores[best]
+            yield row, neighbours, scores
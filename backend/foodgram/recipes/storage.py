@@ -0,0 +1,71 @@
+import hashlib
+import os
+import posixpath
+import tempfile
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """Хранилище, где имя файла - SHA-256 его содержимого.
+
+    Хеш считается по мере записи загрузки во временный файл, поэтому
+    одинаковые изображения хранятся один раз: повторная загрузка того же
+    содержимого возвращает уже существующее имя.
+    """
+
+    def get_available_name(self, name, max_length=None):
+        return name
+
+    def write_temporary(self, directory, content):
+        """Пишет content во временный файл каталога; возвращает его путь
+           и SHA-256 содержимого."""
+        os.makedirs(self.path(directory), exist_ok=True)
+        digest = hashlib.sha256()
+        with tempfile.NamedTemporaryFile(
+            dir=self.path(directory), prefix='.upload-', delete=False
+        ) as temporary:
+            if hasattr(content, 'seek'):
+                content.seek(0)
+            for chunk in content.chunks():
+                digest.update(chunk)
+                temporary.write(chunk)
+        return temporary.name, digest.hexdigest()
+
+    def move(self, temporary, name):
+        full_path = self.path(name)
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        os.replace(temporary, full_path)
+        if self.file_permissions_mode is not None:
+            os.chmod(full_path, self.file_permissions_mode)
+
+    def _save(self, name, content):
+        directory = posixpath.dirname(name)
+        extension = posixpath.splitext(name)[1].lower()
+        temporary, hexdigest = self.write_temporary(directory, content)
+        name = posixpath.join(directory, hexdigest[:2], hexdigest + extension)
+        full_path = self.path(name)
+        if os.path.exists(full_path):
+            os.remove(temporary)
+            # Повторно загруженный файл снова молод: gc_media с --min-age
+            # не удалит его до фиксации рецепта, который на него сошлётся.
+            try:
+                os.utime(full_path)
+                return name
+            except FileNotFoundError:
+                # Удалён между проверкой и обновлением - пишется заново.
+                temporary, _ = self.write_temporary(directory, content)
+        self.move(temporary, name)
+        return name
+
+    def restore(self, name, content):
+        """Записывает content под прежним именем, если файл успели
+           удалить после того, как _save вернул имя существующего."""
+        directory = posixpath.dirname(name)
+        temporary, _ = self.write_temporary(directory, content)
+        self.move(temporary, name)
+
+
+recipe_image_storage = ContentAddressedStorage()
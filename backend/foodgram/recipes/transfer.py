@@ -0,0 +1,251 @@
+"""Выгрузка и загрузка рецептов в NDJSON: одна строка - один рецепт.
+
+Связанные объекты записываются естественными ключами: автор - почтой
+и именем пользователя, теги - слагом, ингредиенты - названием и единицей
+измерения, поэтому дамп переносится между базами с другими id. Чтение
+и запись идут пачками, память не зависит от размера дампа.
+"""
+from collections import Counter
+
+import orjson
+from django.db import transaction
+from django.db.models import Prefetch
+from django.utils.dateparse import parse_datetime
+
+from foodgram.settings import IMAGE_VARIANTS_INLINE
+from users.models import User
+
+from .blobs import acquire_many
+from .feed import fan_out
+from .images import schedule
+from .models import (Change, Ingredient, IngredientToRecipe, Recipe, Tag,
+                     TagToRecipe)
+from .storage import recipe_image_storage
+
+EXPORT_CHUNK_SIZE = 2000
+IMPORT_BATCH_SIZE = 1000
+
+
+def export_queryset(queryset=None):
+    if queryset is None:
+        queryset = Recipe.objects.all()
+    return queryset.order_by('id').select_related('author').prefetch_related(
+        Prefetch('tags', queryset=Tag.objects.order_by('id')),
+        Prefetch(
+            'ingredienttorecipe',
+            queryset=IngredientToRecipe.objects.select_related(
+                'ingredient'
+            ).order_by('id')
+        ),
+    )
+
+
+def recipe_record(recipe):
+    author = recipe.author
+    return {
+        'id': recipe.id,
+        'name': recipe.name,
+        'text': recipe.text,
+        'cooking_time': recipe.cooking_time,
+        'pub_date': recipe.pub_date,
+        'image': recipe.image.name,
+        'author': {
+            'email': author.email,
+            'username': author.username,
+            'first_name': author.first_name,
+            'last_name': author.last_name,
+        },
+        'tags': [
+            {'slug': tag.slug, 'name': tag.name, 'color': tag.color}
+            for tag in recipe.tags.all()
+        ],
+        'ingredients': [
+            {
+                'name': item.ingredient.name,
+                'measurement_unit': item.ingredient.measurement_unit,
+                'amount': item.amount,
+            }
+            for item in recipe.ingredienttorecipe.all()
+        ],
+    }
+
+
+def export_lines(queryset=None, chunk_size=EXPORT_CHUNK_SIZE):
+    """Строки NDJSON в байтах; связанные данные выбираются на каждую
+       пачку из chunk_size рецептов."""
+    for recipe in export_queryset(queryset).iterator(chunk_size=chunk_size):
+        yield orjson.dumps(recipe_record(recipe)) + b'\n'
+
+
+def read_records(lines):
+    for number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            yield orjson.loads(line)
+        except orjson.JSONDecodeError as error:
+            raise ValueError(f'Строка {number}: {error}') from error
+
+
+def batches(records, size):
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def resolve_authors(records):
+    """{почта: id}; недостающие пользователи создаются без пароля."""
+    authors = {record['author']['email']: record['author']
+               for record in records}
+    found = dict(User.objects.filter(
+        email__in=authors
+    ).values_list('email', 'id'))
+    by_username = dict(User.objects.filter(
+        username__in=[
+            author['username'] for email, author in authors.items()
+            if email not in found
+        ]
+    ).values_list('username', 'id'))
+    missing = []
+    for email, author in authors.items():
+        if email in found:
+            continue
+        if author['username'] in by_username:
+            found[email] = by_username[author['username']]
+            continue
+        user = User(**author)
+        user.set_unusable_password()
+        missing.append(user)
+    for user in User.objects.bulk_create(missing):
+        found[user.email] = user.id
+    return found
+
+
+def resolve_tags(records):
+    """{слаг: id}; недостающие теги создаются, если не заняты
+       название или цвет."""
+    tags = {tag['slug']: tag for record in records for tag in record['tags']}
+    found = dict(Tag.objects.filter(slug__in=tags).values_list('slug', 'id'))
+    missing = [Tag(**tag) for slug, tag in tags.items() if slug not in found]
+    if missing:
+        Tag.objects.bulk_create(missing, ignore_conflicts=True)
+        found.update(Tag.objects.filter(
+            slug__in=[tag.slug for tag in missing]
+        ).values_list('slug', 'id'))
+    return found
+
+
+def resolve_ingredients(records):
+    """{(название, единица): id}; недостающие ингредиенты создаются."""
+    keys = {
+        (item['name'], item['measurement_unit'])
+        for record in records for item in record['ingredients']
+    }
+    found = {}
+    for ingredient_id, name, unit in Ingredient.objects.filter(
+        name__in={name for name, _ in keys}
+    ).order_by('-id').values_list('id', 'name', 'measurement_unit'):
+        if (name, unit) in keys:
+            found[name, unit] = ingredient_id
+    missing = [
+        Ingredient(name=name, measurement_unit=unit)
+        for name, unit in keys if (name, unit) not in found
+    ]
+    for ingredient in Ingredient.objects.bulk_create(missing):
+        found[ingredient.name, ingredient.measurement_unit] = ingredient.id
+    return found
+
+
+def missing_images(records):
+    """Пути изображений дампа, которых нет в хранилище этой базы:
+       дамп переносит только путь, файлы копируются отдельно."""
+    names = {record['image'] for record in records}
+    return {
+        name for name in names
+        if not name or not recipe_image_storage.exists(name)
+    }
+
+
+def import_batch(records):
+    """Загружает пачку в одной транзакции. Рецепт, который уже есть
+       у автора (тот же текст), не дублируется, а рецепт, чьего
+       изображения нет в хранилище, пропускается. Возвращает
+       [(id в дампе, id в базе)], число созданных рецептов и id
+       пропущенных в дампе."""
+    missing = missing_images(records)
+    skipped = []
+    with transaction.atomic():
+        authors = resolve_authors(records)
+        tags = resolve_tags(records)
+        ingredients = resolve_ingredients(records)
+        existing = {
+            (author_id, text): recipe_id
+            for recipe_id, author_id, text in Recipe.objects.filter(
+                author_id__in=set(authors.values()),
+                text__in={record['text'] for record in records},
+            ).values_list('id', 'author_id', 'text')
+        }
+        new, pending = [], {}
+        for record in records:
+            key = (authors[record['author']['email']], record['text'])
+            if key in existing or key in pending:
+                continue
+            if record['image'] in missing:
+                skipped.append(record['id'])
+                continue
+            pending[key] = record
+            new.append(Recipe(
+                author_id=key[0], name=record['name'], text=record['text'],
+                cooking_time=record['cooking_time'], image=record['image'],
+            ))
+        Recipe.objects.bulk_create(new)
+        for recipe, record in zip(new, pending.values()):
+            # auto_now_add перезаписывает дату при создании.
+            recipe.pub_date = parse_datetime(record['pub_date'])
+            existing[recipe.author_id, recipe.text] = recipe.id
+        Recipe.objects.bulk_update(new, ['pub_date'])
+        TagToRecipe.objects.bulk_create(
+            TagToRecipe(recipe=recipe, tag_id=tags[tag['slug']])
+            for recipe, record in zip(new, pending.values())
+            for tag in record['tags'] if tag['slug'] in tags
+        )
+        IngredientToRecipe.objects.bulk_create(
+            IngredientToRecipe(
+                recipe=recipe, amount=item['amount'],
+                ingredient_id=ingredients[
+                    item['name'], item['measurement_unit']
+                ],
+            )
+            for recipe, record in zip(new, pending.values())
+            for item in record['ingredients']
+        )
+        # Сигналы при bulk_create не срабатывают: журнал синхронизации
+        # и счётчики ссылок на изображения пополняются здесь.
+        Change.objects.bulk_create(
+            Change(kind=Change.RECIPE, object_id=recipe.id) for recipe in new
+        )
+        acquire_many(Counter(recipe.image.name for recipe in new))
+    # Остальное, что для нового рецепта делают сигналы, - после
+    # фиксации пачки, как и у них.
+    for recipe in new:
+        fan_out(recipe)
+        if IMAGE_VARIANTS_INLINE:
+            schedule(recipe.id)
+    ids = []
+    for record in records:
+        key = (authors[record['author']['email']], record['text'])
+        if key in existing:
+            ids.append((record['id'], existing[key]))
+    return ids, len(new), skipped
+
+
+def import_lines(lines, batch_size=IMPORT_BATCH_SIZE):
+    """Загружает рецепты из строк NDJSON пачками; отдаёт результат
+       import_batch для каждой пачки."""
+    for batch in batches(read_records(lines), batch_size):
+        yield import_batch(batch)
@@ -0,0 +1,69 @@
+"""Популярность рецептов с экспоненциальным затуханием.
+
+Счёт хранится в логарифмах: score = ln Σ wᵢ·exp(λ·tᵢ), t - секунды Unix.
+Затухающая популярность в момент now равна exp(score - λ·now), поэтому
+порядок по score совпадает с порядком по ней, а события складываются
+атомарным UPDATE без перечитывания. В отличие от прямого затухания
+с фиксированной эпохой, exp(λ·t) не вычисляется отдельно и не
+переполняется ни при каком периоде полураспада, и эпоху не нужно
+переносить.
+"""
+from math import log
+
+from django.db.models import F, Value
+from django.db.models.functions import Exp, Greatest, Least, Ln
+from django.utils import timezone
+
+from foodgram.settings import TRENDING_HALF_LIFE_DAYS, TRENDING_MIN_SCORE
+
+from .models import RecipeScore
+
+DECAY_RATE = log(2) / (TRENDING_HALF_LIFE_DAYS * 24 * 60 * 60)
+EVENT_WEIGHTS = {'favorite': 1.0, 'shoplist': 0.5}
+# Ниже exp() в PostgreSQL падает с ошибкой потери значимости.
+EXP_FLOOR = -700.0
+# Остаток после вычитания всего счёта: ln даёт «ноль» вместо ошибки.
+MIN_FRACTION = 1e-300
+
+
+def event_log_weight(model, moment):
+    """ln(w·exp(λ·t)) события в момент moment."""
+    return (log(EVENT_WEIGHTS[model._meta.model_name])
+            + DECAY_RATE * moment.timestamp())
+
+
+def bump(recipe_id, model, added=True, created=None):
+    """Учитывает добавление рецепта в избранное или корзину либо
+       удаление записи, добавленной в момент created: вычитается
+       ровно её вклад, а не вес события в момент удаления."""
+    scores = RecipeScore.objects.filter(recipe_id=recipe_id)
+    if not added:
+        event = Value(event_log_weight(model, created))
+        scores.update(score=F('score') + Ln(Greatest(
+            1.0 - Exp(Greatest(Least(event - F('score'), 0.0), EXP_FLOOR)),
+            MIN_FRACTION
+        )))
+        return
+    event = event_log_weight(model, timezone.now())
+    top = Greatest(F('score'), Value(event))
+    added_score = top + Ln(
+        Exp(Greatest(F('score') - top, EXP_FLOOR))
+        + Exp(Greatest(Value(event) - top, EXP_FLOOR))
+    )
+    if scores.update(score=added_score):
+        return
+    _, created = RecipeScore.objects.get_or_create(
+        recipe_id=recipe_id, defaults={'score': event}
+    )
+    if not created:
+        scores.update(score=added_score)
+
+
+def compact():
+    """Удаляет счёт рецептов, чья популярность затухла ниже
+       TRENDING_MIN_SCORE. Возвращает число удалённых записей."""
+    deleted, _ = RecipeScore.objects.filter(
+        score__lt=log(TRENDING_MIN_SCORE)
+        + DECAY_RATE * timezone.now().timestamp()
+    ).delete()
+    return deleted
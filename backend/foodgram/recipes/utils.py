@@ -0,0 +1,14 @@
+from django.db.models import Case, IntegerField, When
+
+
+def filter_in_order(queryset, ids):
+    """Ограничивает выборку объектами из ids в том же порядке."""
+    if not ids:
+        return queryset.none()
+    return queryset.filter(id__in=ids).annotate(
+        position=Case(
+            *(When(id=pk, then=position)
+              for position, pk in enumerate(ids)),
+            output_field=IntegerField(),
+        )
+    ).order_by('position')
@@ -0,0 +1,78 @@
+"""Прогрев воркера до первого запроса.
+
+Вызывается хуком post_worker_init профилей gunicorn и командой warmup.
+Шаги независимы: ошибка одного (например, недоступна база) не мешает
+остальным и не роняет воркер - первый запрос просто сделает их сам.
+"""
+import time
+
+from django.db import connection, connections
+from django.urls import get_resolver
+
+from foodgram.invalidation import bus
+
+from .ingredient_index import ingredient_index
+from .models import Ingredient, Tag
+from .search import recipe_index
+from .shopping_list import register_fonts
+
+
+def load_urlconf():
+    """Импортирует URLconf, а с ним вьюсеты и сериализаторы API."""
+    get_resolver().url_patterns
+
+
+def open_connections():
+    """Открывает соединения со всеми базами. С пулом соединение
+       остаётся в нём для запросов; без пула проверяет доступность."""
+    for alias in connections:
+        connections[alias].ensure_connection()
+
+
+def prime_tags_and_ingredients():
+    list(Tag.objects.all())
+    Ingredient.objects.exists()
+    if not ingredient_index.is_built:
+        ingredient_index.build()
+
+
+def build_search_index():
+    if connection.vendor != 'postgresql' and not recipe_index.is_built:
+        recipe_index.build()
+
+
+STEPS = (
+    ('шрифты PDF', register_fonts),
+    ('URLconf и вьюсеты', load_urlconf),
+    ('соединения с базой', open_connections),
+    ('теги и индекс ингредиентов', prime_tags_and_ingredients),
+    ('поисковый индекс', build_search_index),
+)
+
+
+def warmup():
+    """Выполняет шаги прогрева; возвращает [(шаг, секунды, ошибка)]."""
+    results = []
+    for name, step in STEPS:
+        start = time.perf_counter()
+        try:
+            step()
+        except Exception as error:
+            results.append((name, time.perf_counter() - start, error))
+        else:
+            results.append((name, time.perf_counter() - start, None))
+    # Соединения потока прогрева не достанутся запросам: закрываем их
+    # (с пулом - возвращаем в пул).
+    connections.close_all()
+    return results
+
+
+def warmup_worker(log):
+    """Хук post_worker_init: подписка на инвалидацию от других воркеров
+       и прогрев с записью в лог gunicorn."""
+    bus.listen()
+    for name, seconds, error in warmup():
+        if error is None:
+            log.info('Прогрев: %s за %.1f ms', name, seconds * 1000)
+        else:
+            log.warning('Прогрев: %s не выполнен: %s', name, error)
@@ -1,45 +1,73 @@
 from django.contrib import admin
+from django.urls import reverse
+from django.utils.html import format_html
+
+from api.pagination import EstimatedCountPaginator, estimated_count
 
 from .models import Follow, User
 from recipes.models import ShopList, Favorite
 
 
-class FollowInline(admin.TabularInline):
-    model = Follow
-    extra = 0
-    fk_name = 'username'
-
-
-class ShopListInline(admin.TabularInline):
-    model = ShopList
-    extra = 1
-
-
-class FavoriteInline(admin.TabularInline):
-    model = Favorite
-    extra = 0
-
-
 class UserAdmin(admin.ModelAdmin):
-    inlines = (FollowInline, ShopListInline, FavoriteInline)
     list_display = (
         'username', 'first_name', 'last_name', 'email',
     )
-    search_fields = ('username',)
-    list_filter = ('username', 'email')
+    search_fields = ('username', 'email')
+    readonly_fields = ('subscriptions', 'favorites', 'shopping_cart')
     ordering = ('username',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     empty_value_display = '-пусто-'
     verbose_name = 'Пользователь'
     verbose_name_plural = 'Пользователи'
 
+    def formfield_for_manytomany(self, db_field, request=None, **kwargs):
+        if db_field.name == 'user_permissions':
+            kwargs['queryset'] = db_field.remote_field.model.objects.all(
+            ).select_related('content_type')
+        return super().formfield_for_manytomany(db_field, request, **kwargs)
+
+    # Вместо встроенных форм без ограничения числа строк - ссылки на
+    # постраничные списки подписок, избранного и корзины пользователя.
+    def related_link(self, obj, model, field):
+        if obj.pk is None:
+            return self.empty_value_display
+        url = reverse(
+            f'admin:{model._meta.app_label}_{model._meta.model_name}'
+            '_changelist'
+        )
+        count, approximate = estimated_count(
+            model.objects.filter(**{field: obj})
+        )
+        return format_html(
+            '<a href="{}?{}__id__exact={}">{}: {}{}</a>',
+            url, field, obj.pk, model._meta.verbose_name_plural,
+            '~' if approximate else '', count
+        )
+
+    @admin.display(description='Подписки')
+    def subscriptions(self, obj):
+        return self.related_link(obj, Follow, 'username')
+
+    @admin.display(description='Избранное')
+    def favorites(self, obj):
+        return self.related_link(obj, Favorite, 'user')
+
+    @admin.display(description='Корзина')
+    def shopping_cart(self, obj):
+        return self.related_link(obj, ShopList, 'user')
+
 
 class FollowAdmin(admin.ModelAdmin):
     list_display = (
         'username', 'author'
     )
-    search_fields = ('username',)
-    list_filter = ('username', 'author')
+    list_select_related = ('username', 'author')
+    search_fields = ('username__username', 'author__username')
+    autocomplete_fields = ('username', 'author')
     ordering = ('username',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     empty_value_display = '-пусто-'
 
 
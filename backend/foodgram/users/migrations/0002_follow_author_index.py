@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-18 23:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='follow',
+            index=models.Index(fields=['author', 'username'], name='follow_author_idx'),
+        ),
+    ]
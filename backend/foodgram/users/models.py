@@ -2,6 +2,8 @@ from django.contrib.auth.models import AbstractUser
 from django.core.exceptions import ValidationError
 from django.db import models
 
+from foodgram.invalidation import InvalidatingQuerySet
+
 
 class User(AbstractUser):
     """Модель пользователя."""
@@ -34,6 +36,8 @@ class Follow(models.Model):
         verbose_name='Подписчик'
     )
 
+    objects = InvalidatingQuerySet.as_manager()
+
     class Meta:
         verbose_name = 'Подписка'
         verbose_name_plural = 'Подписки'
@@ -46,6 +50,11 @@ class Follow(models.Model):
                 name="unique_follow",
             ),
         )
+        indexes = (
+            models.Index(
+                fields=('author', 'username'), name='follow_author_idx'
+            ),
+        )
 
     def __str__(self):
         return f'{self.username} follows {self.author}'
@@ -1,17 +1,37 @@
 import djoser.serializers
 
-from django.shortcuts import get_object_or_404
-from rest_framework import status
-from rest_framework.serializers import ModelSerializer
+from rest_framework.serializers import ModelSerializer, Serializer
 from rest_framework.exceptions import ValidationError
-from rest_framework.fields import SerializerMethodField
+from rest_framework.fields import (IntegerField, ListField,
+                                   SerializerMethodField)
 from rest_framework.validators import UniqueTogetherValidator
 
+from api.fieldsets import SparseFieldsetMixin
+from foodgram.settings import BATCH_IDS_LIMIT
+from recipes.images import srcset
 from recipes.models import Recipe
 from users.models import User
 
 
-class UserSerializer(djoser.serializers.UserSerializer):
+def recipes_limit(query_params):
+    """Проверенный ?recipes_limit= списка подписок или None; неверный
+       параметр - ошибка 400, а не пустой или обрезанный список."""
+    limit = query_params.get('recipes_limit')
+    if not limit:
+        return None
+    try:
+        limit = int(limit)
+    except ValueError:
+        limit = 0
+    if limit < 1:
+        raise ValidationError({'recipes_limit': [
+            'Должно быть положительным целым числом.'
+        ]})
+    return limit
+
+
+class UserSerializer(SparseFieldsetMixin,
+                     djoser.serializers.UserSerializer):
     """ Сериализатор пользователя """
     is_subscribed = SerializerMethodField(read_only=True)
 
@@ -27,6 +47,8 @@ class UserSerializer(djoser.serializers.UserSerializer):
         ]
 
     def get_is_subscribed(self, obj):
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         request = self.context.get('request')
         if self.context.get('request').user.is_anonymous:
             return False
@@ -44,12 +66,21 @@ class UserCreateSerializer(djoser.serializers.UserCreateSerializer):
 
 
 class RecipeBriefSerializer(ModelSerializer):
+    image_srcset = SerializerMethodField()
+
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'image_srcset', 'cooking_time')
 
+    def get_image_srcset(self, obj):
+        request = self.context.get('request')
+        return srcset(
+            obj.image_variants, request and request.build_absolute_uri
+        )
 
-class SubscribeListSerializer(djoser.serializers.UserSerializer):
+
+class SubscribeListSerializer(SparseFieldsetMixin,
+                              djoser.serializers.UserSerializer):
     """ Сериализатор для получения подписок """
     recipes_count = SerializerMethodField()
     recipes = SerializerMethodField()
@@ -68,33 +99,32 @@ class SubscribeListSerializer(djoser.serializers.UserSerializer):
         read_only_fields = ('email', 'username',
                             'first_name', 'last_name')
 
-    def validate(self, data):
-        author_id = self.context.get(
-            'request').parser_context.get('kwargs').get('id')
-        author = get_object_or_404(User, id=author_id)
-        user = self.context.get('request').user
-        if user.follower.filter(author=author_id).exists():
-            raise ValidationError(
-                detail='Подписка уже существует',
-                code=status.HTTP_400_BAD_REQUEST,
-            )
-        if user == author:
-            raise ValidationError(
-                detail='Нельзя подписаться на самого себя',
-                code=status.HTTP_400_BAD_REQUEST,
-            )
-        return data
-
     def get_recipes_count(self, obj):
+        if hasattr(obj, 'recipes_count'):
+            return obj.recipes_count
         return obj.recipes.count()
 
     def get_recipes(self, obj):
         request = self.context.get('request')
-        limit = request.GET.get('recipes_limit')
+        limit = recipes_limit(request.GET)
         recipes = obj.recipes.all()
         if limit:
-            recipes = recipes[: int(limit)]
+            recipes = recipes[:limit]
         serializer = RecipeBriefSerializer(
             recipes, many=True, read_only=True
         )
         return serializer.data
+
+
+class SubscribeManySerializer(Serializer):
+    """ Сериализатор пакетной подписки на авторов """
+    authors = ListField(
+        child=IntegerField(min_value=1), allow_empty=False,
+        max_length=BATCH_IDS_LIMIT
+    )
+
+    def validate_authors(self, value):
+        value = list(dict.fromkeys(value))
+        if self.context['request'].user.id in value:
+            raise ValidationError('Нельзя подписаться на самого себя')
+        return value
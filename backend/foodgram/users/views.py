@@ -1,21 +1,56 @@
-from django.shortcuts import get_object_or_404
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Exists, F, OuterRef, Prefetch, Window
+from django.db.models.functions import RowNumber
 from djoser.views import UserViewSet
 from rest_framework import status
 from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound, ValidationError
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
 
+from api.fieldsets import SparseFieldsetViewMixin
+from api.mixins import BatchListMixin, ReplicaReadMixin
 from api.pagination import CustomPagination
+from recipes.changes import record_many
+from recipes.feed import backfill_authors
+from recipes.models import Change, Recipe
+from recipes.utils import filter_in_order
 
 from .models import Follow, User
-from .serializers import SubscribeListSerializer, UserSerializer
+from .serializers import (SubscribeListSerializer, SubscribeManySerializer,
+                          UserSerializer, recipes_limit)
 
 
-class UserViewSet(UserViewSet):
+def subscribe_error(message):
+    """Ошибка в том же виде, что отдавала валидация сериализатора."""
+    return ValidationError({api_settings.NON_FIELD_ERRORS_KEY: [message]})
+
+
+def lock_subscriptions(user):
+    """Подписки пользователя создаются по одной транзакции за раз: так
+       пакетная подписка знает, какие строки вставила именно она."""
+    User.objects.select_for_update().filter(pk=user.pk).values_list(
+        'pk'
+    ).first()
+
+
+class UserViewSet(ReplicaReadMixin, BatchListMixin, SparseFieldsetViewMixin,
+                  UserViewSet):
     queryset = User.objects.all()
     serializer_class = UserSerializer
     pagination_class = CustomPagination
 
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        user = self.request.user
+        if (self.request.method == 'GET' and user.is_authenticated
+                and self.wants('is_subscribed')):
+            queryset = queryset.annotate(is_subscribed=Exists(
+                Follow.objects.filter(username=user, author=OuterRef('pk'))
+            ))
+        return queryset
+
     @action(
         methods=('get',),
         detail=False,
@@ -25,6 +60,46 @@ class UserViewSet(UserViewSet):
         serializer = self.get_serializer(request.user)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
+    def with_recipes(self, queryset):
+        """Число и последние рецепты авторов для SubscribeListSerializer:
+           один запрос и предвыборка рецептов вместо запросов на автора."""
+        # Проверяется до создания подписки: неверный параметр
+        # не оставит её созданной.
+        limit = recipes_limit(self.request.GET)
+        if self.wants('recipes_count', SubscribeListSerializer):
+            queryset = queryset.annotate(
+                recipes_count=Count('recipes', distinct=True)
+            )
+        if self.wants('recipes', SubscribeListSerializer):
+            recipes = Recipe.objects.only(
+                'id', 'author', 'name', 'image', 'image_variants',
+                'cooking_time'
+            )
+            if limit:
+                recipes = recipes.annotate(row=Window(
+                    RowNumber(), partition_by=F('author'),
+                    order_by=F('pub_date').desc()
+                )).filter(row__lte=limit)
+            queryset = queryset.prefetch_related(
+                Prefetch('recipes', queryset=recipes)
+            )
+        return queryset
+
+    def authors(self, ids):
+        """Авторы в порядке ids с рецептами и признаком подписки."""
+        return list(filter_in_order(self.with_recipes(
+            User.objects.annotate(is_subscribed=Exists(Follow.objects.filter(
+                username=self.request.user, author=OuterRef('pk')
+            )))
+        ), ids))
+
+    def subscribed_response(self, authors, many=False):
+        serializer = SubscribeListSerializer(
+            authors, many=many, context={'request': self.request},
+            fields=self.requested_fields(SubscribeListSerializer)
+        )
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
     @action(
         detail=True,
         methods=['POST', 'DELETE'],
@@ -32,28 +107,80 @@ class UserViewSet(UserViewSet):
     )
     def subscribe(self, request, id):
         user = request.user
-        author = get_object_or_404(User, pk=id)
-
-        if request.method == 'POST':
-            serializer = SubscribeListSerializer(
-                author, data=request.data, context={'request': request}
-            )
-            serializer.is_valid(raise_exception=True)
-            Follow.objects.create(username=user, author=author)
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
-
         if request.method == 'DELETE':
-            get_object_or_404(
-                Follow, username=user, author=author
+            deleted, _ = Follow.objects.filter(
+                username=user, author_id=id
             ).delete()
+            if not deleted:
+                raise NotFound('Подписка не найдена.')
             return Response(status=status.HTTP_204_NO_CONTENT)
 
+        if str(user.id) == str(id):
+            raise subscribe_error('Нельзя подписаться на самого себя')
+        authors = self.authors([id])
+        if not authors:
+            raise NotFound('Автор не найден.')
+        if authors[0].is_subscribed:
+            raise subscribe_error('Подписка уже существует')
+        try:
+            with transaction.atomic():
+                lock_subscriptions(user)
+                Follow.objects.create(username=user, author_id=id)
+        except IntegrityError:
+            # Параллельный запрос подписал раньше: решает unique_follow.
+            raise subscribe_error('Подписка уже существует')
+        return self.subscribed_response(authors[0])
+
+    @action(
+        detail=False,
+        methods=['POST'],
+        url_path='subscribe',
+        url_name='subscribe_many',
+        permission_classes=(IsAuthenticated,)
+    )
+    def subscribe_many(self, request):
+        """Подписка на несколько авторов сразу; уже существующие
+           подписки пропускаются."""
+        user = request.user
+        serializer = SubscribeManySerializer(
+            data=request.data, context={'request': request}
+        )
+        serializer.is_valid(raise_exception=True)
+        ids = serializer.validated_data['authors']
+        authors = self.authors(ids)
+        missing = set(ids) - {author.id for author in authors}
+        if missing:
+            raise ValidationError({'authors': [
+                'Нет пользователей с id: '
+                + ', '.join(map(str, sorted(missing)))
+            ]})
+        new = [author.id for author in authors if not author.is_subscribed]
+        with transaction.atomic():
+            # Чтение выше могло устареть: новые подписки определяются
+            # повторно под блокировкой, до вставки.
+            lock_subscriptions(user)
+            existing = set(Follow.objects.filter(
+                username=user, author_id__in=new
+            ).values_list('author_id', flat=True))
+            new = [pk for pk in new if pk not in existing]
+            Follow.objects.bulk_create(
+                [Follow(username=user, author_id=pk) for pk in new],
+                ignore_conflicts=True
+            )
+            # Сигналы при bulk_create не срабатывают: журнал
+            # синхронизации и лента пополняются здесь.
+            record_many(Change.SUBSCRIPTION, new, user_id=user.id)
+            transaction.on_commit(lambda: backfill_authors(user.id, new))
+        return self.subscribed_response(authors, many=True)
+
     @action(detail=False, permission_classes=(IsAuthenticated,))
     def subscriptions(self, request):
-        user = request.user
-        queryset = User.objects.filter(following__username=user)
+        queryset = self.with_recipes(
+            User.objects.filter(following__username=request.user)
+        )
         pages = self.paginate_queryset(queryset)
         serializer = SubscribeListSerializer(
-            pages, many=True, context={'request': request}
+            pages, many=True, context={'request': request},
+            fields=self.requested_fields(SubscribeListSerializer)
         )
         return self.get_paginated_response(serializer.data)